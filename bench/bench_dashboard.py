@@ -0,0 +1,494 @@
+#!/usr/bin/env python3
+"""
+Banc de mesure du dashboard, hors Pi.
+
+Le dashboard (dashboard/__init__.py) tourne dans un dossier temporaire, sur
+des données synthétiques réalistes (monitor.log + archives, historique 7 jours,
+journal d'événements) et une couche de commandes factice : ping, qmicli, ip,
+systemctl, lsusb, sudo... répondent comme sur le Pi après une latence réglable.
+
+Scénarios : /, /diagnostics, /backup/create (jusqu'à la fin du job),
+restauration d'un snapshot et d'un zip uploadé.
+
+Usage (depuis la racine du dépôt) :
+    python3 bench/bench_dashboard.py                     # mesure + comparaison
+    python3 bench/bench_dashboard.py --save              # ajoute le résultat à bench/history.jsonl
+    python3 bench/bench_dashboard.py --latency 0.2 --latency-for qmicli=1.5
+    python3 bench/bench_dashboard.py --baseline a1b2c3d --threshold 15
+
+Code retour 1 si un scénario régresse de plus de --threshold % (p50 ou p95)
+par rapport à la référence (dernier résultat enregistré d'un autre commit).
+"""
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import random
+import argparse
+import tempfile
+import threading
+import subprocess
+import contextlib
+from datetime import datetime
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_HOME = os.path.join(REPO_DIR, "home", "xavier")
+HISTORY_FILE = os.path.join(REPO_DIR, "bench", "history.jsonl")
+
+# Fichiers / dossiers du Pi recopiés dans le dossier temporaire
+COPY_FILES = ("config.json", "monitor_failover.py", "run_dashboard.py", "send_sms.py", "connect_4g.sh")
+COPY_TREES = ("dashboard", "failoverpi")
+
+# Écart absolu minimal (ms) pour parler de régression (bruit de mesure)
+MIN_DELTA_MS = 2.0
+
+ADMIN = ("bench", "bench-password")
+
+_real_run = subprocess.run
+_real_popen = subprocess.Popen
+
+
+# ----------------------------------------------------------------------
+#  Couche de commandes factice
+# ----------------------------------------------------------------------
+QMI_SIGNAL = """[/dev/cdc-wdm0] Successfully got signal strength
+Current:
+        Network 'lte': '-71 dBm'
+RSRQ:
+        Network 'lte': '-9 dB'"""
+
+PING_OK = """PING 8.8.8.8 (8.8.8.8) from 192.168.0.10 eth0: 56(84) bytes of data.
+64 bytes from 8.8.8.8: icmp_seq=1 ttl=117 time=11.9 ms
+
+--- 8.8.8.8 ping statistics ---
+1 packets transmitted, 1 received, 0% packet loss, time 0ms
+rtt min/avg/max/mdev = 11.873/11.873/11.873/0.000 ms"""
+
+
+class FakeCommands:
+    """
+    Remplace subprocess.run / subprocess.Popen : chaque commande répond après
+    `latency` secondes (ou la latence propre à son programme).
+    """
+
+    def __init__(self, latency: float, per_program: dict):
+        self.latency = latency
+        self.per_program = per_program
+        self.calls = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _argv(cmd):
+        argv = cmd.split() if isinstance(cmd, str) else [str(a) for a in cmd]
+        while argv and argv[0] in ("sudo", "timeout"):
+            argv = argv[1:]
+        return argv
+
+    def respond(self, cmd):
+        argv = self._argv(cmd)
+        prog = os.path.basename(argv[0]) if argv else "?"
+        with self._lock:
+            self.calls[prog] = self.calls.get(prog, 0) + 1
+        time.sleep(self.per_program.get(prog, self.latency))
+        args = " ".join(argv[1:])
+        if prog == "ping":
+            return 0, PING_OK, ""
+        if prog == "qmicli":
+            if "--nas-get-signal-strength" in args:
+                return 0, QMI_SIGNAL, ""
+            if "--uim-get-card-status" in args:
+                return 0, "Card state: 'present'", ""
+            return 0, "", ""
+        if prog == "ip":
+            return 0, "2: eth0: <BROADCAST,MULTICAST,UP,LOWER_UP> mtu 1500 state UP\n    inet 192.168.0.10/24", ""
+        if prog == "systemctl":
+            return 0, "active" if "is-active" in args else "", ""
+        if prog == "lsusb":
+            return 0, "Bus 001 Device 004: ID 1e0e:9001 Qualcomm / Option SimTech, Incorporation", ""
+        if prog == "which":
+            return 0, f"/usr/bin/{argv[1] if len(argv) > 1 else ''}", ""
+        if prog in ("python3", "python"):
+            return 0, "SMS envoyé", ""
+        return 0, "", ""
+
+    def run(self, cmd, *args, check=False, text=None, universal_newlines=None, **kwargs):
+        rc, out, err = self.respond(cmd)
+        if not (text or universal_newlines):
+            out, err = out.encode(), err.encode()
+        if check and rc != 0:
+            raise subprocess.CalledProcessError(rc, cmd, out, err)
+        return subprocess.CompletedProcess(cmd, rc, out, err)
+
+    def popen(self, cmd, *args, **kwargs):
+        return FakePopen(self, cmd)
+
+    def install(self):
+        subprocess.run = self.run
+        subprocess.Popen = self.popen
+
+
+class FakePopen:
+    """Processus lancé en arrière-plan (reboot modem, relance de service) : terminé d'office."""
+
+    def __init__(self, fake: FakeCommands, cmd):
+        self.args = cmd
+        self.pid = 0
+        threading.Thread(target=fake.respond, args=(cmd,), daemon=True).start()
+        self.returncode = 0
+
+    def poll(self):
+        return 0
+
+    def wait(self, timeout=None):
+        return 0
+
+    def communicate(self, input=None, timeout=None):
+        return "", ""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+# ----------------------------------------------------------------------
+#  Données synthétiques
+# ----------------------------------------------------------------------
+def _fmt(epoch: float) -> str:
+    return datetime.fromtimestamp(epoch).strftime("%d/%m/%Y %H:%M:%S")
+
+
+def make_home(days: int, interval: int, seed: int) -> str:
+    """Copie du code + monitor.log (dernier jour, les autres archivés), historique, journal."""
+    home = tempfile.mkdtemp(prefix="failoverpi-bench-")
+    for name in COPY_FILES:
+        shutil.copy2(os.path.join(SRC_HOME, name), home)
+    for tree in COPY_TREES:
+        shutil.copytree(os.path.join(SRC_HOME, tree), os.path.join(home, tree),
+                        ignore=shutil.ignore_patterns("__pycache__"))
+    sys.path.insert(0, home)
+    from failoverpi import logs as logstore
+
+    rnd = random.Random(seed)
+    log_file = os.path.join(home, "monitor.log")
+    events = []
+
+    def event(ts, event_type, prev, new):
+        events.append({"id": len(events) + 1, "ts": round(ts, 3), "time": _fmt(ts), "type": event_type,
+                       "link": "freebox", "prev": prev, "new": new, "duration": None})
+
+    now = time.time()
+    t = now - days * 86400
+    freebox = True
+    history = []
+    day_end = t + 86400
+    out = open(log_file, "w", encoding="utf-8")
+    while t < now:
+        # Une coupure Freebox de 2 à 40 min tous les ~2 jours
+        if freebox and rnd.random() < interval / (2 * 86400):
+            freebox = False
+            out.write(f"[{_fmt(t)}] Perte de connexion Internet Freebox\n")
+            out.write(f"[{_fmt(t)}] [SMS] OK : +33600000000\n")
+            out.write(f"[{_fmt(t)}] Failover 4G actif (bascule sur 4G)\n")
+            event(t, "freebox_lost", "up", "down")
+            restore_at = t + rnd.randint(120, 2400)
+        elif not freebox and t >= restore_at:
+            freebox = True
+            out.write(f"[{_fmt(t)}] Connexion Internet Freebox rétablie\n")
+            event(t, "freebox_restored", "down", "up")
+        out.write(
+            f"[{_fmt(t)}] [STATUS] Freebox LAN=OK Internet={'OK' if freebox else 'KO'} / 4G=OK\n"
+        )
+        history.append((int(t), 1 if freebox else 0))
+        t += interval
+        if t >= day_end and t < now - 3600:
+            out.close()
+            logstore.rotate(log_file, "gz")
+            out = open(log_file, "a", encoding="utf-8")
+            day_end += 86400
+    out.close()
+    with open(os.path.join(home, "events.jsonl"), "w") as f:
+        for e in events:
+            f.write(json.dumps(e, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+    # Historique au pas du dashboard (30 s), 7 jours max
+    with open(os.path.join(home, "status_history.json"), "w") as f:
+        pts = [p for p in history if p[0] >= now - 7 * 86400]
+        json.dump({"times": [datetime.fromtimestamp(e).strftime("%H:%M") for e, _ in pts],
+                   "states": [s for _, s in pts], "epochs": [e for e, _ in pts]}, f)
+    return home
+
+
+def publish_monitor(home: str):
+    """Instantané du monitor (comme sur le Pi) pour la carte d'état."""
+    from failoverpi.shm import SharedSnapshot, MONITOR_SNAPSHOT
+    SharedSnapshot(MONITOR_SNAPSHOT).publish({
+        "check_interval": 86400, "route": "freebox", "route_since": int(time.time()),
+        "links": {"lan": {"up": True, "rtt_ms": 0.8}, "freebox": {"up": True, "rtt_ms": 11.9},
+                  "4g": {"up": True, "rtt_ms": 48.3}},
+        "last_transition": None, "counters": {}, "sms_queue": 0, "spans": {},
+    })
+
+
+# ----------------------------------------------------------------------
+#  Scénarios
+# ----------------------------------------------------------------------
+def login(app):
+    c = app.test_client()
+    c.post("/login", data={"username": ADMIN[0], "password": ADMIN[1]})
+    return c
+
+
+def run_job(app, client, method, url, **kwargs):
+    """Soumet une action longue et attend la fin du job ; lève une erreur si elle échoue."""
+    r = client.open(url, method=method, headers={"Accept": "application/json"}, **kwargs)
+    if r.status_code != 202:
+        raise RuntimeError(f"{url} : HTTP {r.status_code}")
+    jobs = app.extensions["jobs"]
+    job = jobs.get(r.get_json()["id"])
+    while not job.done:
+        jobs.wait(job, job.version, 5)
+    if job.status != "done":
+        raise RuntimeError(f"{url} : {job.error}")
+
+
+def scenarios(app, home):
+    from dashboard.snapshots import SnapshotStore
+    store = SnapshotStore(app.config["SNAPSHOT_DIR"])
+
+    def get(url):
+        def fn(client):
+            r = client.get(url)
+            if r.status_code != 200:
+                raise RuntimeError(f"{url} : HTTP {r.status_code}")
+        return fn
+
+    def backup_create(client):
+        run_job(app, client, "GET", "/backup/create")
+
+    def latest_snapshot():
+        snaps = store.list()
+        if not snaps:
+            run_job(app, login(app), "GET", "/backup/create")
+            snaps = store.list()
+        return snaps[0]["id"]
+
+    def touch_files():
+        # Quelques fichiers modifiés : la restauration a du travail réel
+        for rel in ("config.json", "dashboard/metrics.py", "failoverpi/timing.py"):
+            with open(os.path.join(home, rel), "a") as f:
+                f.write("\n")
+
+    def restore_snapshot(client):
+        touch_files()
+        run_job(app, client, "GET", f"/backup/snapshot/{latest_snapshot()}/restore")
+
+    export = {}
+
+    def restore_upload(client):
+        if "zip" not in export:
+            export["zip"] = client.get("/backup/export?logs=tail").get_data()
+        touch_files()
+        run_job(app, client, "POST", "/restore",
+                data={"backup_file": (io.BytesIO(export["zip"]), "bench.zip")},
+                content_type="multipart/form-data")
+
+    # nom -> (fonction, parallélisable)
+    return {
+        "index": (get("/"), True),
+        "diagnostics": (get("/diagnostics"), True),
+        "backup_create": (backup_create, False),
+        "restore_snapshot": (restore_snapshot, False),
+        "restore_upload": (restore_upload, False),
+    }
+
+
+def measure(app, fn, iterations: int, threads: int, parallel: bool):
+    from failoverpi.timing import Histogram
+    hist = Histogram()
+    lock = threading.Lock()
+    client = login(app)
+    fn(client)  # échauffement (templates, caches)
+
+    workers = threads if parallel else 1
+    per_worker = max(1, iterations // workers)
+
+    def worker():
+        c = login(app) if workers > 1 else client
+        for _ in range(per_worker):
+            t0 = time.perf_counter()
+            fn(c)
+            dt = time.perf_counter() - t0
+            with lock:
+                hist.record(dt * 1_000_000)
+
+    t0 = time.perf_counter()
+    pool = [threading.Thread(target=worker) for _ in range(workers)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    wall = time.perf_counter() - t0
+    s = hist.summary()
+    return {
+        "count": s["count"],
+        "p50_ms": s["p50_ms"],
+        "p95_ms": s["p95_ms"],
+        "max_ms": s["max_ms"],
+        "mean_ms": s["mean_ms"],
+        "rps": round(s["count"] / wall, 2) if wall else 0.0,
+        "threads": workers,
+    }
+
+
+# ----------------------------------------------------------------------
+#  Historique / comparaison
+# ----------------------------------------------------------------------
+def git_commit() -> str:
+    try:
+        rev = _real_run(["git", "-C", REPO_DIR, "rev-parse", "--short", "HEAD"],
+                        capture_output=True, text=True, timeout=10).stdout.strip()
+        dirty = _real_run(["git", "-C", REPO_DIR, "status", "--porcelain", "--untracked-files=no"],
+                          capture_output=True, text=True, timeout=30).stdout.strip()
+        return f"{rev}-dirty" if rev and dirty else (rev or "inconnu")
+    except Exception:
+        return "inconnu"
+
+
+def load_history() -> list:
+    entries = []
+    try:
+        with open(HISTORY_FILE, "r") as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    continue
+    except OSError:
+        pass
+    return entries
+
+
+def pick_baseline(history: list, commit: str, ref: str = None):
+    for entry in reversed(history):
+        if ref:
+            if entry["commit"].startswith(ref):
+                return entry
+        elif entry["commit"] != commit:
+            return entry
+    return None
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Liste des régressions (scénario, mesure, avant, après, %)."""
+    regressions = []
+    for name, cur in results.items():
+        old = baseline["results"].get(name)
+        if not old:
+            continue
+        for key in ("p50_ms", "p95_ms"):
+            before, after = old.get(key) or 0, cur.get(key) or 0
+            if before and after - before > MIN_DELTA_MS and after > before * (1 + threshold / 100):
+                regressions.append((name, key, before, after, round((after / before - 1) * 100, 1)))
+    return regressions
+
+
+def format_table(results: dict, baseline) -> str:
+    cols = ("count", "p50_ms", "p95_ms", "max_ms", "rps")
+    lines = [f"{'Scénario':<20}" + "".join(f"{c:>10}" for c in cols) + f"{'Δ p50':>10}"]
+    lines.append("-" * len(lines[0]))
+    for name, r in results.items():
+        delta = ""
+        old = baseline["results"].get(name) if baseline else None
+        if old and old.get("p50_ms"):
+            delta = f"{(r['p50_ms'] / old['p50_ms'] - 1) * 100:+.0f}%"
+        lines.append(f"{name:<20}" + "".join(f"{r[c]:>10}" for c in cols) + f"{delta:>10}")
+    return "\n".join(lines)
+
+
+# ----------------------------------------------------------------------
+#  Main
+# ----------------------------------------------------------------------
+def parse_latencies(items) -> dict:
+    out = {}
+    for item in items or []:
+        prog, _, value = item.partition("=")
+        out[prog] = float(value)
+    return out
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description="Banc de mesure du dashboard Failover-Pi (hors Pi)")
+    p.add_argument("--latency", type=float, default=0.05, help="latence par commande système (s)")
+    p.add_argument("--latency-for", action="append", metavar="PROG=S",
+                   help="latence propre à un programme (ex: qmicli=1.5)")
+    p.add_argument("--iterations", type=int, default=20, help="requêtes par scénario")
+    p.add_argument("--threads", type=int, default=4, help="clients simultanés (pages)")
+    p.add_argument("--days", type=int, default=7, help="jours de monitor.log synthétique")
+    p.add_argument("--only", action="append", help="scénario(s) à lancer")
+    p.add_argument("--threshold", type=float, default=20.0, help="régression tolérée (%%)")
+    p.add_argument("--baseline", help="commit de référence (défaut : dernier autre commit enregistré)")
+    p.add_argument("--save", action="store_true", help="ajouter le résultat à bench/history.jsonl")
+    p.add_argument("--json", action="store_true", help="sortie JSON")
+    p.add_argument("--keep", action="store_true", help="garder le dossier temporaire")
+    args = p.parse_args(argv)
+
+    commit = git_commit()
+    home = make_home(args.days, 60, seed=42)
+    os.environ["FAILOVERPI_HOME"] = home
+    os.environ["FAILOVERPI_SHM"] = os.path.join(home, "shm")
+    try:
+        publish_monitor(home)
+        fake = FakeCommands(args.latency, parse_latencies(args.latency_for))
+        fake.install()
+
+        # Le dashboard recopie chaque ligne de log sur stdout : on ne garde que le rapport
+        with contextlib.redirect_stdout(io.StringIO()):
+            from dashboard import app
+            app.testing = True
+            app.test_client().post("/setup", data={"username": ADMIN[0], "password": ADMIN[1]})
+
+            results = {}
+            for name, (fn, parallel) in scenarios(app, home).items():
+                if args.only and name not in args.only:
+                    continue
+                results[name] = measure(app, fn, args.iterations, args.threads, parallel)
+    finally:
+        subprocess.run, subprocess.Popen = _real_run, _real_popen
+        if not args.keep:
+            shutil.rmtree(home, ignore_errors=True)
+
+    history = load_history()
+    baseline = pick_baseline(history, commit, args.baseline)
+    regressions = compare(results, baseline, args.threshold) if baseline else []
+    entry = {
+        "commit": commit,
+        "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "latency": args.latency,
+        "iterations": args.iterations,
+        "results": results,
+        "commands": fake.calls,
+    }
+    if args.save:
+        os.makedirs(os.path.dirname(HISTORY_FILE), exist_ok=True)
+        with open(HISTORY_FILE, "a") as f:
+            f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+
+    if args.json:
+        print(json.dumps(dict(entry, baseline=baseline and baseline["commit"], regressions=regressions), indent=1))
+    else:
+        print(f"Commit {commit} — latence commandes {args.latency * 1000:.0f} ms"
+              + (f" — référence {baseline['commit']}" if baseline else " — pas de référence"))
+        print(format_table(results, baseline))
+        if args.keep:
+            print(f"Dossier conservé : {home}")
+        for name, key, before, after, pct in regressions:
+            print(f"RÉGRESSION {name} {key} : {before} ms -> {after} ms (+{pct}%)")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,10 +7,20 @@ app = Flask(__name__)
 from .config import set_app_config
 set_app_config(app)
 
+# Durée des requêtes (subprocess / io / template), requêtes lentes journalisées.
+# Avant les gardes : les redirections vers /login sont mesurées aussi.
+from .perf import register_perf
+from .utils import log
+register_perf(app, log=lambda msg: log(msg, app.config["LOG_FILE"]))
+
 # Authentification / gardes
 from .auth import register_auth_guards
 register_auth_guards(app)
 
+# Compression, ETags et cache navigateur (économie de data sur la 4G)
+from .delivery import register_delivery
+register_delivery(app)
+
 # Routes principales
 from .routes import register_routes
 register_routes(app)
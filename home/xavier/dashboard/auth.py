@@ -1,38 +1,139 @@
 import json
+import copy
+import time
 import hashlib
 import secrets
 import base64
 import os
+import threading
 from functools import wraps
 from flask import redirect, url_for, session, request
 
+from .perf import timed
+
 # Routes publiques
-ALLOWED_ENDPOINTS_NO_AUTH = {"setup", "login", "static"}
+# /metrics : scrapé par Prometheus, protégé par metrics_token (config.json) si défini
+ALLOWED_ENDPOINTS_NO_AUTH = {"setup", "login", "static", "metrics"}
 
 
 # ============================================================
 #  Gestion des utilisateurs
 # ============================================================
 
+class UserStore:
+    """
+    Copie en mémoire de .dashboard_users.json, indexée par nom d'utilisateur.
+
+    Le fichier n'est relu que si son inode / mtime / taille change ; ce contrôle
+    (un stat()) est lui-même limité à une fois par STAT_TTL secondes, le coût
+    d'une requête authentifiée se résume donc à une recherche dans un dict.
+    """
+
+    STAT_TTL = 1.0
+
+    def __init__(self, users_db: str):
+        self.users_db = users_db
+        self._lock = threading.Lock()
+        self._sig = None
+        self._checked_at = 0.0
+        self._data = {"users": []}
+        self._by_name = {}
+        self._admins = 0
+        self._loaded = False
+
+    def _signature(self):
+        try:
+            st = os.stat(self.users_db)
+        except OSError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _index(self, data):
+        users = data.get("users", []) if isinstance(data, dict) else []
+        self._data = {"users": users}
+        self._by_name = {u.get("username"): u for u in users}
+        self._admins = sum(1 for u in users if u.get("role") == "admin")
+
+    @timed("io")
+    def _refresh_locked(self):
+        now = time.monotonic()
+        if self._loaded and now - self._checked_at < self.STAT_TTL:
+            return
+        self._checked_at = now
+        sig = self._signature()
+        if self._loaded and sig == self._sig:
+            return
+        data = {"users": []}
+        if sig is not None:
+            try:
+                with open(self.users_db, "r") as f:
+                    data = json.load(f)
+            except Exception:
+                data = {"users": []}
+        self._index(data)
+        self._sig = sig
+        self._loaded = True
+
+    def data(self):
+        """Contenu complet (copie modifiable, à repasser à save())."""
+        with self._lock:
+            self._refresh_locked()
+            return copy.deepcopy(self._data)
+
+    def get(self, username):
+        with self._lock:
+            self._refresh_locked()
+            u = self._by_name.get(username)
+            return dict(u) if u else None
+
+    def admin_count(self):
+        with self._lock:
+            self._refresh_locked()
+            return self._admins
+
+    @timed("io")
+    def save(self, data):
+        """Écriture atomique (tmp + fsync + rename) puis mise à jour du cache."""
+        tmp = f"{self.users_db}.{os.getpid()}.tmp"
+        try:
+            fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            with self._lock:
+                os.replace(tmp, self.users_db)
+                self._index(copy.deepcopy(data))
+                self._sig = self._signature()
+                self._checked_at = time.monotonic()
+                self._loaded = True
+            return True
+        except Exception:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            return False
+
+
+_STORES = {}
+_STORES_LOCK = threading.Lock()
+
+
+def get_user_store(users_db: str) -> UserStore:
+    with _STORES_LOCK:
+        store = _STORES.get(users_db)
+        if store is None:
+            store = _STORES[users_db] = UserStore(users_db)
+        return store
+
+
 def load_users(users_db: str):
-    if not os.path.exists(users_db):
-        return {"users": []}
-    try:
-        with open(users_db, "r") as f:
-            return json.load(f)
-    except Exception:
-        return {"users": []}
+    return get_user_store(users_db).data()
 
 
 def save_users(data, users_db: str):
-    try:
-        tmp = users_db + ".tmp"
-        with open(tmp, "w") as f:
-            json.dump(data, f, indent=2)
-        os.replace(tmp, users_db)
-        return True
-    except Exception:
-        return False
+    return get_user_store(users_db).save(data)
 
 
 # ============================================================
@@ -62,21 +163,18 @@ def check_password(stored: str, plain: str) -> bool:
 # ============================================================
 
 def admin_exists(users_db: str):
-    data = load_users(users_db)
-    return any(u.get("role") == "admin" for u in data.get("users", []))
+    return get_user_store(users_db).admin_count() > 0
 
 
 def verify_credentials(username, password, users_db: str):
-    data = load_users(users_db)
-    for u in data.get("users", []):
-        if u.get("username") == username and check_password(u.get("password", ""), password):
-            return u
+    u = get_user_store(users_db).get(username)
+    if u and check_password(u.get("password", ""), password):
+        return u
     return None
 
 
 def count_admins(users_db: str):
-    data = load_users(users_db)
-    return sum(1 for u in data.get("users", []) if u.get("role") == "admin")
+    return get_user_store(users_db).admin_count()
 
 
 # ============================================================
@@ -134,6 +232,7 @@ def register_auth_guards(app):
             blocked_endpoints = {
                 # Diagnostics avancés
                 "diagnostics",
+                "performance",
 
                 # Backups / restore
                 "backup",
@@ -0,0 +1,162 @@
+import os
+import json
+import hashlib
+import zipfile
+from typing import Iterator, List, Tuple
+
+from .config import BASE_HOME
+
+# Fichiers racine sauvegardés (chemins relatifs à BASE_HOME)
+ROOT_FILES = (
+    "config.json",
+    "monitor_failover.py",
+    "run_dashboard.py",
+    "run_failover_pi.py",
+    "send_sms.py",
+    "connect_4g.sh",
+    "status_history.json",
+    "events.jsonl",
+    "monitor.log",
+    ".dashboard_users.json",
+)
+
+# Dossiers sauvegardés récursivement
+TREES = ("dashboard", "failoverpi")
+
+# Fichiers de log : exclus, tronqués ou complets selon la demande
+LOG_FILES = {"monitor.log"}
+
+# Politique par défaut pour les logs dans un export : fin du fichier seulement
+LOG_TAIL_BYTES = 256 * 1024
+
+# Taille des blocs lus / envoyés
+CHUNK_SIZE = 64 * 1024
+
+LOG_POLICIES = ("none", "tail", "full")
+
+# Entrée ajoutée en fin d'archive : sha256 de chaque fichier, vérifié à la restauration
+MANIFEST_NAME = "failoverpi-manifest.json"
+
+
+def backup_files(base_home: str = BASE_HOME, logs: str = "full") -> List[Tuple[str, str]]:
+    """
+    Liste (chemin, nom dans l'archive) des fichiers à sauvegarder.
+    logs : "none" (exclus), "tail" (tronqués) ou "full".
+    Les fichiers de log tronqués sont repérés par is_log() au moment d'écrire.
+    """
+    files = []
+    for name in ROOT_FILES:
+        if name in LOG_FILES and logs == "none":
+            continue
+        full = os.path.join(base_home, name)
+        if os.path.exists(full):
+            files.append((full, f"home/xavier/{name}"))
+    for sub in TREES:
+        tree = os.path.join(base_home, sub)
+        if not os.path.isdir(tree):
+            continue
+        for root, _, names in os.walk(tree):
+            if ".git" in root or "__pycache__" in root:
+                continue
+            for f in names:
+                full = os.path.join(root, f)
+                files.append((full, os.path.join("home/xavier", os.path.relpath(full, base_home))))
+    return files
+
+
+def is_log(arcname: str) -> bool:
+    return os.path.basename(arcname) in LOG_FILES
+
+
+def _open_source(path: str, arcname: str, logs: str):
+    """Ouvre le fichier source, positionné sur la fin (à une ligne près) si log tronqué."""
+    f = open(path, "rb")
+    if logs == "tail" and is_log(arcname):
+        size = os.fstat(f.fileno()).st_size
+        if size > LOG_TAIL_BYTES:
+            f.seek(size - LOG_TAIL_BYTES)
+            f.readline()  # on repart sur une ligne complète
+    return f
+
+
+def zip_params(level: int):
+    level = max(0, min(9, int(level)))
+    if level == 0:
+        return zipfile.ZIP_STORED, None
+    return zipfile.ZIP_DEFLATED, level
+
+
+# ----------------------------------------------------------------------
+#  Export en streaming (aucune écriture sur la carte SD)
+# ----------------------------------------------------------------------
+class StreamBuffer:
+    """
+    Sortie non « seekable » pour zipfile : les octets produits sont accumulés
+    puis vidés par le générateur après chaque bloc. zipfile passe alors en mode
+    « data descriptor » (tailles/CRC écrits après chaque entrée).
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._pos = 0
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_backup_zip(files, level: int = 6, logs: str = "tail") -> Iterator[bytes]:
+    """
+    Génère l'archive ZIP à la volée, bloc par bloc : une seule lecture
+    séquentielle des fichiers, mémoire bornée (~CHUNK_SIZE + tampon deflate).
+    """
+    compression, compresslevel = zip_params(level)
+    buf = StreamBuffer()
+    hashes = {}
+    with zipfile.ZipFile(buf, "w", compression, compresslevel=compresslevel) as z:
+        for full, arc in files:
+            try:
+                src = _open_source(full, arc, logs)
+            except OSError:
+                continue
+            with src:
+                size = os.fstat(src.fileno()).st_size
+                info = zipfile.ZipInfo.from_file(full, arc)
+                info.compress_type = compression
+                # Comme ZipFile.write() : le niveau n'est pas repris d'office d'un ZipInfo
+                info._compresslevel = compresslevel
+                h = hashlib.sha256()
+                with z.open(info, "w", force_zip64=size > zipfile.ZIP64_LIMIT) as dst:
+                    for chunk in iter(lambda: src.read(CHUNK_SIZE), b""):
+                        h.update(chunk)
+                        dst.write(chunk)
+                        data = buf.drain()
+                        if data:
+                            yield data
+                hashes[arc] = h.hexdigest()
+            data = buf.drain()
+            if data:
+                yield data
+        write_manifest(z, hashes)
+    # Manifest + répertoire central
+    data = buf.drain()
+    if data:
+        yield data
+
+
+def write_manifest(z: zipfile.ZipFile, hashes: dict):
+    """Ajoute MANIFEST_NAME (nom dans l'archive -> sha256) à une archive ouverte en écriture."""
+    z.writestr(MANIFEST_NAME, json.dumps({"files": hashes}, indent=1))
@@ -1,5 +1,9 @@
 import os
 
+# Racine de l'installation (surchargeable pour le banc de mesure hors Pi, cf. bench/)
+BASE_HOME = os.environ.get("FAILOVERPI_HOME", "/home/xavier")
+
+
 def set_app_config(app):
     """
     Charge toutes les constantes essentielles du dashboard.
@@ -10,14 +14,22 @@ def set_app_config(app):
     app.secret_key = os.environ.get("DASH_SECRET_KEY") or os.urandom(32)
 
     # Fichiers du système
-    app.config['SMS_SCRIPT'] = "/home/xavier/send_sms.py"
-    app.config['LOG_FILE'] = "/home/xavier/monitor.log"
-    app.config['CONFIG_FILE'] = "/home/xavier/config.json"
-    app.config['USERS_DB'] = "/home/xavier/.dashboard_users.json"
+    app.config['BASE_HOME'] = BASE_HOME
+    app.config['SMS_SCRIPT'] = os.path.join(BASE_HOME, "send_sms.py")
+    # Mode combiné (run_failover_pi.py, failover-pi.service) : monitor et dashboard
+    # dans le même processus, SMS envoyés sans relancer send_sms.py
+    app.config['COMBINED'] = os.environ.get("FAILOVERPI_COMBINED") == "1"
+    app.config['LOG_FILE'] = os.path.join(BASE_HOME, "monitor.log")
+    app.config['CONFIG_FILE'] = os.path.join(BASE_HOME, "config.json")
+    app.config['USERS_DB'] = os.path.join(BASE_HOME, ".dashboard_users.json")
+    app.config['HISTORY_FILE'] = os.path.join(BASE_HOME, "status_history.json")
+    app.config['EVENTS_FILE'] = os.path.join(BASE_HOME, "events.jsonl")
+    app.config['SLA_FILE'] = os.path.join(BASE_HOME, "sla_daily.json")
 
     # Répertoires pour Backup & Restore
-    app.config['BACKUP_DIR'] = "/home/xavier/backups"
-    app.config['UPLOAD_DIR'] = "/home/xavier/restore_tmp"
+    app.config['BACKUP_DIR'] = os.path.join(BASE_HOME, "backups")
+    app.config['UPLOAD_DIR'] = os.path.join(BASE_HOME, "restore_tmp")
+    app.config['SNAPSHOT_DIR'] = os.path.join(BASE_HOME, "backups", "snapshots")
 
     # Création automatique des dossiers si manquants
     os.makedirs(app.config['BACKUP_DIR'], exist_ok=True)
@@ -0,0 +1,199 @@
+import os
+import gzip
+import hashlib
+import threading
+from flask import request
+
+try:
+    import brotli  # optionnel (paquet python3-brotli)
+except ImportError:
+    brotli = None
+
+
+# Types de contenu qui valent la peine d'être compressés
+COMPRESSIBLE_TYPES = {
+    "text/html",
+    "text/css",
+    "text/plain",
+    "text/javascript",
+    "application/javascript",
+    "application/json",
+    "image/svg+xml",
+}
+
+# En dessous, l'en-tête gzip coûte plus qu'il ne rapporte
+MIN_COMPRESS_SIZE = 512
+
+# Fichiers statiques plus gros : on les laisse en streaming tels quels
+MAX_INLINE_STATIC = 1024 * 1024
+
+# Cache navigateur des fichiers statiques versionnés (?v=<hash>)
+STATIC_MAX_AGE = 365 * 24 * 3600
+
+
+# ============================================================
+#  Octets servis par route (coût sur la 4G)
+# ============================================================
+
+class TrafficStats:
+    """Compteurs en mémoire par endpoint depuis le démarrage du dashboard."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+
+    def record(self, endpoint, raw_bytes, sent_bytes, not_modified):
+        with self._lock:
+            r = self._routes.setdefault(
+                endpoint, {"requests": 0, "raw_bytes": 0, "sent_bytes": 0, "not_modified": 0}
+            )
+            r["requests"] += 1
+            r["raw_bytes"] += raw_bytes
+            r["sent_bytes"] += sent_bytes
+            r["not_modified"] += 1 if not_modified else 0
+
+    def snapshot(self):
+        """Liste triée par octets envoyés (décroissant)."""
+        with self._lock:
+            rows = [dict(endpoint=k, **v) for k, v in self._routes.items()]
+        rows.sort(key=lambda r: r["sent_bytes"], reverse=True)
+        return rows
+
+
+TRAFFIC = TrafficStats()
+
+
+# ============================================================
+#  URLs statiques versionnées par contenu
+# ============================================================
+
+_static_hashes = {}
+_static_lock = threading.Lock()
+
+
+def static_hash(static_folder: str, filename: str) -> str:
+    """Empreinte courte du contenu d'un fichier statique (recalculée si mtime change)."""
+    path = os.path.join(static_folder, filename)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return ""
+    key = (st.st_mtime_ns, st.st_size)
+    with _static_lock:
+        cached = _static_hashes.get(path)
+        if cached and cached[0] == key:
+            return cached[1]
+    h = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(65536), b""):
+                h.update(chunk)
+    except OSError:
+        return ""
+    digest = h.hexdigest()[:12]
+    with _static_lock:
+        _static_hashes[path] = (key, digest)
+    return digest
+
+
+# ============================================================
+#  Négociation / compression
+# ============================================================
+
+def _pick_encoding():
+    accept = request.accept_encodings
+    if brotli is not None and accept["br"] > 0:
+        return "br"
+    if accept["gzip"] > 0:
+        return "gzip"
+    return None
+
+
+def _compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=5)
+    # mtime=0 : sortie déterministe pour un même contenu
+    return gzip.compress(data, compresslevel=6, mtime=0)
+
+
+def _is_compressible(response) -> bool:
+    return (response.mimetype or "") in COMPRESSIBLE_TYPES and "Content-Encoding" not in response.headers
+
+
+def _body_size(response) -> int:
+    if request.method == "HEAD" or response.status_code == 304:
+        return 0
+    if response.is_streamed or response.direct_passthrough:
+        return response.content_length or 0
+    return len(response.get_data())
+
+
+# ============================================================
+#  Enregistrement (after_request)
+# ============================================================
+
+def register_delivery(app):
+    static_folder = app.static_folder
+
+    @app.url_defaults
+    def add_static_version(endpoint, values):
+        if endpoint == "static" and "filename" in values and "v" not in values:
+            digest = static_hash(static_folder, values["filename"])
+            if digest:
+                values["v"] = digest
+
+    @app.after_request
+    def optimize_response(response):
+        endpoint = request.endpoint or "?"
+        raw = _body_size(response)
+
+        if endpoint == "static":
+            v = request.args.get("v")
+            if v and v == static_hash(static_folder, request.view_args.get("filename", "")):
+                response.cache_control.no_cache = None
+                response.cache_control.public = True
+                response.cache_control.max_age = STATIC_MAX_AGE
+                response.cache_control.immutable = True
+            else:
+                response.cache_control.no_cache = True
+        elif response.mimetype == "text/html":
+            # Pages personnalisées (session) : revalidation systématique via ETag
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+
+        eligible = (
+            request.method in ("GET", "HEAD")
+            and response.status_code == 200
+            and _is_compressible(response)
+        )
+        if eligible and response.direct_passthrough:
+            # Fichier statique : on le charge en mémoire pour le compresser
+            if (response.content_length or 0) <= MAX_INLINE_STATIC:
+                response.direct_passthrough = False
+                response.get_data()
+            else:
+                eligible = False
+        elif eligible and response.is_streamed:
+            # Générateur (streaming volontaire) : on n'y touche pas
+            eligible = False
+
+        if eligible:
+            data = response.get_data()
+            raw = len(data)
+            encoding = _pick_encoding() if raw >= MIN_COMPRESS_SIZE else None
+
+            base_etag, _ = response.get_etag()
+            if not base_etag:
+                base_etag = hashlib.sha256(data).hexdigest()[:32]
+            # ETag fort propre à chaque représentation (identité / gzip / br)
+            response.set_etag(f"{base_etag}-{encoding}" if encoding else base_etag)
+            response.vary.add("Accept-Encoding")
+
+            response.make_conditional(request)
+            if response.status_code == 200 and encoding:
+                response.set_data(_compress(data, encoding))
+                response.headers["Content-Encoding"] = encoding
+
+        sent = _body_size(response)
+        TRAFFIC.record(endpoint, raw if response.status_code != 304 else 0, sent, response.status_code == 304)
+        return response
@@ -0,0 +1,176 @@
+import time
+import secrets
+import threading
+from collections import OrderedDict
+
+# Nombre de workers (actions longues exécutées en parallèle au maximum)
+DEFAULT_WORKERS = 2
+
+# File d'attente max (au-delà, submit() refuse)
+MAX_PENDING = 20
+
+# Nombre de jobs terminés conservés pour consultation
+KEEP_FINISHED = 50
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class Job:
+    """Action longue exécutée en tâche de fond (backup, SMS, ...)."""
+
+    def __init__(self, kind: str, fn, args, key=None, redirect_url=None):
+        self.id = secrets.token_hex(8)
+        self.kind = kind
+        self.key = key
+        self.redirect_url = redirect_url
+        self.fn = fn
+        self.args = args
+        self.status = "queued"  # queued / running / done / error
+        self.progress = 0
+        self.message = "En attente…"
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.version = 0
+        self._runner = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("done", "error")
+
+    def update(self, progress=None, message=None):
+        """Appelé par la fonction du job pour publier son avancement."""
+        if progress is not None:
+            self.progress = max(0, min(100, int(progress)))
+        if message is not None:
+            self.message = message
+        if self._runner is not None:
+            self._runner._changed(self)
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": self.progress,
+            "message": self.message,
+            "result": self.result,
+            "error": self.error,
+            "redirect_url": self.redirect_url,
+            "created": int(self.created),
+            "duration": round((self.finished or time.time()) - (self.started or self.created), 2),
+            "v": self.version,
+        }
+
+
+class JobRunner:
+    """
+    Petit pool de workers en mémoire.
+
+    - au plus `workers` jobs en parallèle ;
+    - deux jobs partageant la même clé (ex: "sdcard", "modem") ne tournent
+      jamais en même temps : deux backups ne se disputent pas la carte SD,
+      deux envois SMS ne se disputent pas le port série ;
+    - un job identique (même type, même clé, mêmes arguments) déjà en attente
+      ou en cours est réutilisé au lieu d'en créer un second ; un job de même
+      type aux arguments différents (autre SMS, autre archive) est mis en file.
+    """
+
+    def __init__(self, workers: int = DEFAULT_WORKERS):
+        self._cond = threading.Condition()
+        self._jobs = OrderedDict()
+        self._pending = []
+        self._busy_keys = set()
+        self._workers = workers
+        self._threads = []
+
+    def _ensure_workers(self):
+        while len(self._threads) < self._workers:
+            t = threading.Thread(target=self._worker, name=f"job-worker-{len(self._threads)}", daemon=True)
+            self._threads.append(t)
+            t.start()
+
+    def submit(self, kind: str, fn, *args, key=None, redirect_url=None) -> Job:
+        """fn(job, *args) -> résultat (str/dict), exécutée par un worker."""
+        with self._cond:
+            for job in self._jobs.values():
+                if job.kind == kind and job.key == key and job.args == args and not job.done:
+                    return job
+            if len(self._pending) >= MAX_PENDING:
+                raise JobQueueFull()
+            job = Job(kind, fn, args, key=key, redirect_url=redirect_url)
+            job._runner = self
+            self._jobs[job.id] = job
+            self._pending.append(job)
+            self._trim()
+            self._ensure_workers()
+            self._cond.notify_all()
+            return job
+
+    def get(self, job_id: str):
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def pending_count(self) -> int:
+        """Jobs en attente d'un worker."""
+        with self._cond:
+            return len(self._pending)
+
+    def wait(self, job: Job, version: int, timeout: float):
+        """Attend un changement d'état du job (SSE / long-poll)."""
+        with self._cond:
+            self._cond.wait_for(lambda: job.version != version, timeout=timeout)
+
+    def _changed(self, job: Job):
+        with self._cond:
+            job.version += 1
+            self._cond.notify_all()
+
+    def _trim(self):
+        finished = [j for j in self._jobs.values() if j.done]
+        for j in finished[:max(0, len(finished) - KEEP_FINISHED)]:
+            del self._jobs[j.id]
+
+    def _next_runnable(self):
+        for i, job in enumerate(self._pending):
+            if job.key is None or job.key not in self._busy_keys:
+                return self._pending.pop(i)
+        return None
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                job = self._next_runnable()
+                while job is None:
+                    self._cond.wait()
+                    job = self._next_runnable()
+                if job.key is not None:
+                    self._busy_keys.add(job.key)
+                job.status = "running"
+                job.started = time.time()
+                job.message = "En cours…"
+                job.version += 1
+                self._cond.notify_all()
+
+            try:
+                result = job.fn(job, *job.args)
+                status, error = "done", None
+            except Exception as e:
+                result, status, error = None, "error", str(e)
+
+            with self._cond:
+                job.result = result
+                job.error = error
+                job.status = status
+                job.progress = 100 if status == "done" else job.progress
+                job.message = error or (result if isinstance(result, str) else "Terminé.")
+                job.finished = time.time()
+                job.version += 1
+                if job.key is not None:
+                    self._busy_keys.discard(job.key)
+                self._trim()
+                self._cond.notify_all()
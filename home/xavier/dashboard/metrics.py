@@ -0,0 +1,183 @@
+import time
+from typing import List, Optional
+
+from failoverpi.shm import monitor_alive
+
+# ----------------------------------------------------------------------
+#  EXPORT PROMETHEUS (format texte 0.0.4)
+#
+#  Tout vient d'états déjà en mémoire : instantané publié par le monitor
+#  (/dev/shm), cache du StatusService, compteurs du dashboard.
+#  Un scrape ne lance jamais de ping ni de qmicli.
+# ----------------------------------------------------------------------
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+PREFIX = "failoverpi_"
+
+# Quantiles exportés pour les résumés (clés de Histogram.summary())
+QUANTILES = (("0.5", "p50_ms"), ("0.95", "p95_ms"), ("0.99", "p99_ms"))
+
+ROUTES = ("freebox", "4g", "none")
+
+COUNTER_HELP = (
+    ("failovers", "Bascules de la route vers un lien de secours (4G, ...)"),
+    ("failbacks", "Retours de la route sur le lien principal (Freebox)"),
+    ("freebox_outages", "Pertes d'accès Internet Freebox"),
+    ("lte_outages", "Pertes de la connexion 4G"),
+    ("no_connection", "Passages à aucune connexion"),
+    ("brownouts", "Bascules 4G sur Freebox dégradée (perte, RTT, gigue)"),
+    ("lte_attempts", "Tentatives d'activation 4G"),
+    ("lte_attempts_failed", "Tentatives d'activation 4G échouées"),
+    ("sms_sent", "SMS envoyés par le monitor"),
+    ("sms_failed", "SMS en échec"),
+    ("modem_resets", "Disparitions du modem 4G de l'USB (reset, uevents)"),
+    ("quota_alerts", "Alertes de forfait data envoyées (seuils quota_alert_pct)"),
+    ("multipath_drops", "Liens retirés de la route multichemin entre deux cycles (porteuse, sonde rapide)"),
+)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _num(value) -> str:
+    if value is None:
+        return "NaN"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsWriter:
+    """Accumule les familles de métriques (HELP / TYPE puis échantillons)."""
+
+    def __init__(self):
+        self.lines: List[str] = []
+
+    def family(self, name: str, kind: str, help_text: str):
+        self.lines.append(f"# HELP {PREFIX}{name} {help_text}")
+        self.lines.append(f"# TYPE {PREFIX}{name} {kind}")
+
+    def sample(self, name: str, value, **labels):
+        if labels:
+            inner = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+            self.lines.append(f"{PREFIX}{name}{{{inner}}} {_num(value)}")
+        else:
+            self.lines.append(f"{PREFIX}{name} {_num(value)}")
+
+    def summary(self, name: str, stats: dict, **labels):
+        """Histogram.summary() (ms) -> résumé Prometheus en secondes."""
+        for q, key in QUANTILES:
+            self.sample(name, round(stats.get(key, 0) / 1000, 6), quantile=q, **labels)
+        self.sample(f"{name}_sum", round(stats.get("sum_ms", 0) / 1000, 6), **labels)
+        self.sample(f"{name}_count", stats.get("count", 0), **labels)
+
+    def render(self) -> str:
+        return "\n".join(self.lines) + "\n"
+
+
+def monitor_metrics(w: MetricsWriter, snap: Optional[dict]):
+    """Métriques issues de l'instantané publié par monitor_failover.py."""
+    age = None if not snap else max(0.0, time.time() - snap.get("published", 0))
+
+    w.family("monitor_up", "gauge", "1 si le monitor publie son état normalement")
+    w.sample("monitor_up", monitor_alive(snap))
+    w.family("monitor_snapshot_age_seconds", "gauge", "Âge du dernier état publié par le monitor")
+    w.sample("monitor_snapshot_age_seconds", None if age is None else round(age, 3))
+    if not snap:
+        return
+    w.family("monitor_start_time_seconds", "gauge", "Démarrage du monitor (epoch)")
+    w.sample("monitor_start_time_seconds", snap.get("started"))
+    w.family("monitor_snapshot_seq", "gauge", "Numéro de séquence de l'état publié")
+    w.sample("monitor_snapshot_seq", snap.get("seq", 0))
+
+    links = snap.get("links") or {}
+    w.family("link_up", "gauge", "État du lien (1 = OK) au dernier check")
+    for link, st in links.items():
+        w.sample("link_up", bool(st.get("up")), link=link)
+    w.family("link_rtt_seconds", "gauge", "RTT moyen du dernier ping du lien")
+    for link, st in links.items():
+        rtt = st.get("rtt_ms")
+        w.sample("link_rtt_seconds", None if rtt is None else round(rtt / 1000, 6), link=link)
+    probed = {link: st for link, st in links.items() if "probes_total" in st}
+    w.family("link_probes_ok", "gauge", "Sondes Internet réussies au dernier check (quorum)")
+    for link, st in probed.items():
+        w.sample("link_probes_ok", st["probes_ok"], link=link)
+    w.family("link_probes_total", "gauge", "Sondes Internet du lien (n du quorum k-sur-n)")
+    for link, st in probed.items():
+        w.sample("link_probes_total", st["probes_total"], link=link)
+    measured = {link: st for link, st in links.items() if "loss_pct" in st}
+    w.family("link_loss_ratio", "gauge", "Perte de paquets sur la fenêtre de qualité du lien")
+    for link, st in measured.items():
+        loss = st["loss_pct"]
+        w.sample("link_loss_ratio", None if loss is None else round(loss / 100, 6), link=link)
+    w.family("link_jitter_seconds", "gauge", "Gigue (variation du RTT) sur la fenêtre de qualité du lien")
+    for link, st in measured.items():
+        jitter = st.get("jitter_ms")
+        w.sample("link_jitter_seconds", None if jitter is None else round(jitter / 1000, 6), link=link)
+    weighted = {link: st for link, st in links.items() if "weight" in st}
+    w.family("link_weight", "gauge", "Poids du lien dans la route multichemin (0 = hors route)")
+    for link, st in weighted.items():
+        w.sample("link_weight", st["weight"], link=link)
+    data = snap.get("usage") or {}
+    w.family("link_data_bytes", "gauge", "Octets échangés (rx + tx) sur un lien facturé au volume")
+    for link, u in data.items():
+        for period in ("today", "month", "period"):
+            w.sample("link_data_bytes", u.get(period), link=link, period=period)
+    w.family("link_quota_bytes", "gauge", "Forfait data mensuel du lien")
+    for link, u in data.items():
+        w.sample("link_quota_bytes", u.get("quota"), link=link)
+    w.family("brownout", "gauge", "1 si le trafic passe par un lien de secours car le lien prioritaire est dégradé")
+    w.sample("brownout", bool(snap.get("brownout")))
+
+    route = snap.get("route")
+    w.family("active_route", "gauge", "Route active (1 pour la route en cours)")
+    names = [link for link in links if link != "lan"]
+    for r in (names + ["none"] if names else ROUTES):
+        w.sample("active_route", route == r, route=r)
+    w.family("active_route_since_seconds", "gauge", "Début de la route active (epoch)")
+    w.sample("active_route_since_seconds", snap.get("route_since"))
+
+    counters = snap.get("counters") or {}
+    for key, help_text in COUNTER_HELP:
+        w.family(f"{key}_total", "counter", help_text)
+        w.sample(f"{key}_total", counters.get(key, 0))
+
+    w.family("sms_queue_depth", "gauge", "SMS en attente du port série")
+    w.sample("sms_queue_depth", snap.get("sms_queue", 0))
+    w.family("sms_retry_depth", "gauge", "SMS en échec en attente du retour du modem")
+    w.sample("sms_retry_depth", snap.get("sms_retry", 0))
+    w.family("modem_present", "gauge", "1 si le modem 4G et ses nœuds (tty, cdc-wdm, wwan) sont présents")
+    w.sample("modem_present", snap.get("modem_present"))
+
+    spans = snap.get("spans") or {}
+    if "bring_up:4g" in spans:
+        w.family("lte_attempt_duration_seconds", "summary", "Durée des tentatives d'activation 4G (connect_4g.sh)")
+        w.summary("lte_attempt_duration_seconds", spans["bring_up:4g"])
+    bring_ups = {name.split(":", 1)[1]: stats for name, stats in spans.items() if name.startswith("bring_up:")}
+    if bring_ups:
+        w.family("link_bring_up_duration_seconds", "summary", "Durée des commandes de montage des liens (bring_up)")
+        for link, stats in bring_ups.items():
+            w.summary("link_bring_up_duration_seconds", stats, link=link)
+    w.family("monitor_span_duration_seconds", "summary", "Durées mesurées par le monitor (phases, commandes, pings)")
+    for name, stats in spans.items():
+        w.summary("monitor_span_duration_seconds", stats, span=name)
+
+
+def dashboard_metrics(w: MetricsWriter, status: dict, request_spans: dict, traffic: List[dict], jobs_pending: int):
+    """Métriques propres au dashboard (signal modem en cache, requêtes HTTP)."""
+    w.family("modem_rssi_dbm", "gauge", "RSSI du modem 4G (dernier échantillon du dashboard)")
+    w.sample("modem_rssi_dbm", (status.get("rssi") or None) if status.get("ready") else None)
+    w.family("modem_signal_percent", "gauge", "Qualité du signal 4G en %")
+    w.sample("modem_signal_percent", status.get("signal_percent") if status.get("ready") else None)
+
+    w.family("jobs_pending", "gauge", "Actions longues en attente (backup, SMS, restore)")
+    w.sample("jobs_pending", jobs_pending)
+
+    w.family("http_request_duration_seconds", "summary", "Durée de traitement des requêtes par endpoint")
+    for endpoint, stats in request_spans.items():
+        w.summary("http_request_duration_seconds", stats, endpoint=endpoint)
+    w.family("http_response_bytes_total", "counter", "Octets envoyés par endpoint (après compression)")
+    for row in traffic:
+        w.sample("http_response_bytes_total", row["sent_bytes"], endpoint=row["endpoint"])
@@ -0,0 +1,165 @@
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import g, has_request_context, request, template_rendered, before_render_template
+
+from failoverpi.timing import Timings
+from failoverpi import config as shared_config
+
+try:
+    import blinker  # signaux Flask (temps de rendu des templates) ; inclus avec Flask >= 2.3
+except ImportError:
+    blinker = None
+
+
+# Catégories mesurées à l'intérieur d'une requête (en plus du total et du CPU)
+CATEGORIES = ("subprocess", "io", "template")
+
+# Requêtes lentes gardées en mémoire pour la page Performance
+SLOW_KEEP = 50
+
+
+# ============================================================
+#  Mesures par catégorie (subprocess / io / template)
+# ============================================================
+
+@contextmanager
+def track(category: str):
+    """
+    Impute la durée du bloc à une catégorie de la requête en cours.
+    Hors requête (threads de fond, jobs) : aucun effet.
+    """
+    if not has_request_context() or g.get("perf") is None:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        perf = g.get("perf")
+        if perf is not None:
+            perf[category] = perf.get(category, 0.0) + time.perf_counter() - t0
+
+
+def timed(category: str):
+    """Décorateur équivalent à `with track(category):`."""
+    def deco(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with track(category):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+# ============================================================
+#  Statistiques par endpoint
+# ============================================================
+
+class PerfStats:
+    """Histogrammes de durée par endpoint, cumul des catégories, dernières requêtes lentes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.timings = Timings()
+        self._totals = {}
+        self._slow = deque(maxlen=SLOW_KEEP)
+
+    def record(self, endpoint: str, total: float, parts: dict):
+        self.timings.record(endpoint, total)
+        with self._lock:
+            t = self._totals.setdefault(endpoint, dict.fromkeys(CATEGORIES + ("cpu",), 0.0))
+            for k, v in parts.items():
+                t[k] = t.get(k, 0.0) + v
+
+    def add_slow(self, entry: dict):
+        with self._lock:
+            self._slow.appendleft(entry)
+
+    def snapshot(self):
+        """Lignes triées par temps cumulé décroissant + requêtes lentes (récentes d'abord)."""
+        spans = self.timings.snapshot()["spans"]
+        with self._lock:
+            totals = {k: dict(v) for k, v in self._totals.items()}
+            slow = list(self._slow)
+        rows = []
+        for endpoint, s in spans.items():
+            n = s["count"] or 1
+            parts = totals.get(endpoint, {})
+            rows.append(dict(
+                s, endpoint=endpoint,
+                **{f"{k}_ms": round(parts.get(k, 0.0) * 1000 / n, 1) for k in CATEGORIES + ("cpu",)},
+            ))
+        rows.sort(key=lambda r: r["sum_ms"], reverse=True)
+        return rows, slow
+
+
+PERF = PerfStats()
+
+# Durée de traitement par endpoint (histogrammes, exportés par /metrics)
+REQUEST_TIMINGS = PERF.timings
+
+
+def _fmt_parts(parts: dict) -> str:
+    return ", ".join(f"{k} {parts[k] * 1000:.0f} ms" for k in CATEGORIES + ("cpu",) if parts.get(k, 0) >= 0.0005)
+
+
+# ============================================================
+#  Enregistrement (avant les gardes : les redirections sont mesurées aussi)
+# ============================================================
+
+def register_perf(app, log=None):
+    config_file = app.config["CONFIG_FILE"]
+
+    @app.before_request
+    def perf_start():
+        g.perf = {}
+        g.perf_started = time.perf_counter()
+        g.perf_cpu = time.thread_time()
+
+    if blinker is not None:
+        def tpl_start(sender, template, context, **extra):
+            if has_request_context():
+                g.perf_tpl = time.perf_counter()
+
+        def tpl_done(sender, template, context, **extra):
+            if has_request_context() and g.get("perf") is not None and g.get("perf_tpl"):
+                g.perf["template"] = g.perf.get("template", 0.0) + time.perf_counter() - g.perf_tpl
+                g.perf_tpl = None
+
+        before_render_template.connect(tpl_start, app, weak=False)
+        template_rendered.connect(tpl_done, app, weak=False)
+
+    # Enregistré en premier : exécuté en dernier, compression comprise
+    @app.after_request
+    def perf_record(response):
+        started = g.get("perf_started")
+        if started is None:
+            return response
+        total = time.perf_counter() - started
+        parts = dict(g.perf, cpu=time.thread_time() - g.perf_cpu)
+        endpoint = request.endpoint or "?"
+        PERF.record(endpoint, total, parts)
+
+        # Lu à chaque requête : une seule clé, pas de copie de toute la config (links, sondes...)
+        threshold = shared_config.get_store(config_file).value("slow_request_ms")
+        if threshold and total * 1000 >= threshold:
+            entry = {
+                "time": time.strftime("%d/%m/%Y %H:%M:%S"),
+                "method": request.method,
+                "path": request.full_path.rstrip("?"),
+                "endpoint": endpoint,
+                "status": response.status_code,
+                "total_ms": round(total * 1000),
+                **{f"{k}_ms": round(parts.get(k, 0.0) * 1000) for k in CATEGORIES + ("cpu",)},
+            }
+            PERF.add_slow(entry)
+            if log:
+                log(
+                    f"[PERF] Requête lente {request.method} {entry['path']} : {entry['total_ms']} ms"
+                    + (f" ({_fmt_parts(parts)})" if parts else "")
+                )
+        return response
@@ -0,0 +1,230 @@
+import os
+import json
+import time
+import hashlib
+import zipfile
+import threading
+import subprocess
+from typing import Iterator, List, Optional
+
+from .backup import BASE_HOME, CHUNK_SIZE, MANIFEST_NAME
+
+ARCHIVE_PREFIX = "home/xavier/"
+
+# Service unique du mode combiné (run_failover_pi.py) : remplace les deux autres
+COMBINED_UNIT = "failover-pi.service"
+
+# Fichier (ou dossier, suffixe "/") restauré -> services systemd à relancer.
+# config.json, .dashboard_users.json, connect_4g.sh et send_sms.py sont relus
+# à chaud (ou à chaque appel) : aucun redémarrage nécessaire, sauf send_sms.py
+# en mode combiné (importé une fois pour toutes).
+UNIT_RULES = (
+    ("send_sms.py", (COMBINED_UNIT,)),
+    ("run_failover_pi.py", (COMBINED_UNIT,)),
+    ("monitor_failover.py", ("failover-monitor.service",)),
+    ("failoverpi/", ("failover-monitor.service", "failover-dashboard.service")),
+    ("run_dashboard.py", ("failover-dashboard.service",)),
+    ("dashboard/", ("failover-dashboard.service",)),
+)
+
+# Le dashboard se relance lui-même : on laisse le temps à la réponse de partir
+SELF_RESTART_DELAY = 3
+
+
+class RestoreEntry:
+    """Un fichier à restaurer, quelle que soit la source (zip ou snapshot)."""
+
+    def __init__(self, relpath: str, size: int, mode: int, mtime: Optional[float],
+                 sha256: Optional[str], reader):
+        self.relpath = relpath
+        self.size = size
+        self.mode = mode
+        self.mtime = mtime
+        self.sha256 = sha256
+        self.reader = reader  # callable -> itérateur de blocs
+
+    def chunks(self) -> Iterator[bytes]:
+        return self.reader()
+
+
+# ----------------------------------------------------------------------
+#  Sources
+# ----------------------------------------------------------------------
+def zip_entries(z: zipfile.ZipFile) -> List[RestoreEntry]:
+    """
+    Entrées home/xavier/... d'une archive. Les hashes sha256 viennent du
+    manifest embarqué (exports récents) ; à défaut, seul le CRC32 du zip
+    (vérifié par zipfile à la lecture) protège le contenu.
+    """
+    hashes = {}
+    if MANIFEST_NAME in z.namelist():
+        try:
+            hashes = json.loads(z.read(MANIFEST_NAME)).get("files", {})
+        except Exception:
+            hashes = {}
+
+    def reader(info):
+        def read():
+            with z.open(info) as src:
+                yield from iter(lambda: src.read(CHUNK_SIZE), b"")
+        return read
+
+    entries = []
+    for info in z.infolist():
+        if info.is_dir() or not info.filename.startswith(ARCHIVE_PREFIX):
+            continue
+        mode = (info.external_attr >> 16) & 0o7777
+        entries.append(RestoreEntry(
+            info.filename[len(ARCHIVE_PREFIX):],
+            info.file_size,
+            mode or None,
+            time.mktime(info.date_time + (0, 0, -1)),
+            hashes.get(info.filename),
+            reader(info),
+        ))
+    return entries
+
+
+def snapshot_entries(store, manifest: dict) -> List[RestoreEntry]:
+    def reader(entry):
+        return lambda: store.iter_file(entry)
+
+    entries = []
+    for f in manifest.get("files", []):
+        if not f["path"].startswith(ARCHIVE_PREFIX):
+            continue
+        entries.append(RestoreEntry(
+            f["path"][len(ARCHIVE_PREFIX):],
+            f["size"],
+            f.get("mode"),
+            f["mtime_ns"] / 1e9,
+            f["sha256"],
+            reader(f),
+        ))
+    return entries
+
+
+# ----------------------------------------------------------------------
+#  Pipeline
+# ----------------------------------------------------------------------
+def _file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(CHUNK_SIZE), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _safe_dest(base_home: str, relpath: str) -> str:
+    dest = os.path.realpath(os.path.join(base_home, relpath))
+    if not dest.startswith(os.path.realpath(base_home) + os.sep):
+        raise ValueError(f"chemin refusé : {relpath}")
+    return dest
+
+
+def _unchanged(dest: str, entry: RestoreEntry) -> Optional[bool]:
+    """Vrai si dest a déjà le contenu attendu (sans décompresser l'entrée si possible)."""
+    try:
+        if os.path.getsize(dest) != entry.size:
+            return False
+    except OSError:
+        return False
+    if entry.sha256:
+        return _file_sha256(dest) == entry.sha256
+    return None  # inconnu : il faudra comparer après lecture de l'entrée
+
+
+def restore_entries(entries: List[RestoreEntry], base_home: str = BASE_HOME, progress=None) -> dict:
+    """
+    Restaure les entrées en place :
+      - fichiers identiques ignorés,
+      - sinon écriture dans un temporaire du même dossier, vérification du
+        sha256 attendu, fsync puis rename atomique.
+    Renvoie un rapport (écrits, ignorés, octets, services à relancer).
+    """
+    # Chemins validés avant toute écriture : une archive piégée ne restaure rien
+    dests = [_safe_dest(base_home, e.relpath) for e in entries]
+    written, skipped = [], []
+    bytes_written = 0
+    for i, (entry, dest) in enumerate(zip(entries, dests), 1):
+        same = _unchanged(dest, entry)
+        if same:
+            skipped.append(entry.relpath)
+        else:
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            tmp = os.path.join(os.path.dirname(dest), f".{os.path.basename(dest)}.restore-tmp")
+            h = hashlib.sha256()
+            try:
+                with open(tmp, "wb") as out:
+                    for block in entry.chunks():
+                        h.update(block)
+                        out.write(block)
+                    out.flush()
+                    os.fsync(out.fileno())
+                digest = h.hexdigest()
+                if entry.sha256 and digest != entry.sha256:
+                    raise ValueError(f"hash invalide pour {entry.relpath}")
+                if same is None and os.path.exists(dest) and _file_sha256(dest) == digest:
+                    os.remove(tmp)
+                    skipped.append(entry.relpath)
+                else:
+                    if entry.mode:
+                        os.chmod(tmp, entry.mode)
+                    if entry.mtime:
+                        os.utime(tmp, (entry.mtime, entry.mtime))
+                    os.replace(tmp, dest)
+                    written.append(entry.relpath)
+                    bytes_written += entry.size
+            finally:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+        if progress:
+            progress(i, len(entries), entry.relpath)
+
+    return {
+        "written": written,
+        "skipped": skipped,
+        "bytes_written": bytes_written,
+        "units": units_for(written),
+    }
+
+
+# ----------------------------------------------------------------------
+#  Services systemd
+# ----------------------------------------------------------------------
+def units_for(paths: List[str]) -> List[str]:
+    units = []
+    for p in paths:
+        for prefix, rule_units in UNIT_RULES:
+            if p == prefix or (prefix.endswith("/") and p.startswith(prefix)):
+                for u in rule_units:
+                    if u not in units:
+                        units.append(u)
+    return units
+
+
+def restart_units(units: List[str], self_unit: str = "failover-dashboard.service") -> List[str]:
+    """
+    Relance les services concernés (au lieu d'un reboot complet).
+    Le service du dashboard est relancé en dernier, en différé.
+    Renvoie les services effectivement relancés (pour le log).
+    """
+    launched = []
+    for unit in units:
+        if unit == self_unit:
+            continue
+        try:
+            r = subprocess.run(["sudo", "systemctl", "restart", unit], capture_output=True, timeout=30)
+            if r.returncode == 0:
+                launched.append(unit)
+        except Exception:
+            pass
+    if self_unit in units:
+        def _restart_self():
+            try:
+                subprocess.Popen(["sudo", "systemctl", "restart", self_unit])
+            except Exception:
+                pass
+        threading.Timer(SELF_RESTART_DELAY, _restart_self).start()
+        launched.append(self_unit)
+    return launched
@@ -1,4 +1,6 @@
 from flask import (
+    Response,
+    jsonify,
     render_template,
     send_file,
     request,
@@ -7,23 +9,37 @@ from flask import (
     session,
 )
 import json
+import hmac
 from datetime import datetime
 import os
 import subprocess
 import time
+import uuid
 import zipfile
-import shutil
 from .utils import (
     log,
-    get_gateway,
-    get_signal,
     get_logs,
     list_backups,
-    get_freebox_history,
     check_dependencies,
     load_config,
     save_config,
 )
+from .delivery import TRAFFIC
+from .perf import PERF, REQUEST_TIMINGS, track
+from .metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, MetricsWriter, monitor_metrics, dashboard_metrics
+from .status import StatusService
+from .jobs import JobRunner, JobQueueFull
+from .backup import backup_files, stream_backup_zip, LOG_POLICIES
+from .snapshots import SnapshotStore
+from .restore import COMBINED_UNIT, restore_entries, restart_units, snapshot_entries, zip_entries
+from failoverpi import logs as logstore
+from failoverpi.journal import EventJournal
+from failoverpi.sla import SlaEngine, PERIODS, fmt_duration
+from failoverpi.shm import SharedSnapshot, MONITOR_SNAPSHOT
+from failoverpi.quality import CONFIG_KEYS as BROWNOUT_KEYS
+from failoverpi.probes import parse_probe
+from failoverpi.multipath import ROUTE_MODES
+from failoverpi.usage import CONFIG_KEYS as USAGE_KEYS
 from .auth import (
     login_required,
     admin_required,
@@ -85,50 +101,6 @@ def confirm_page(title, message, log_entry, redirect_url, delay=4):
     </div></body></html>
     """
 
-# ------------------------------------------------------------------
-# Page de restauration avec compte à rebours
-# ------------------------------------------------------------------
-def restore_wait_page(log_entry, backup_name):
-    return f"""
-    <html lang="fr">
-    <head>
-      <meta charset="utf-8">
-      <title>Restauration en cours</title>
-      <meta http-equiv="refresh" content="10;url={url_for('backup')}" />
-      <style>
-        body {{background:#0d1117;color:#c9d1d9;font-family:-apple-system,BlinkMacSystemFont,Segoe UI,Helvetica,Arial,sans-serif;display:flex;align-items:center;justify-content:center;height:100vh;margin:0;}}
-        .card {{background:#161b22;border:1px solid #30363d;border-radius:12px;padding:32px;max-width:650px;text-align:center;}}
-        h2 {{color:#58a6ff;margin-bottom:16px;}}
-        .file {{font-family:monospace;background:#0d1117;padding:6px 12px;border-radius:6px;display:inline-block;margin:8px 0;}}
-        .log {{color:#8b949e;font-size:0.9em;margin-top:10px;}}
-        .countdown {{margin-top:20px;color:#58a6ff;font-weight:600;font-size:1.1em;}}
-        .spinner {{margin:20px auto;width:40px;height:40px;border:4px solid #30363d;border-top:4px solid #58a6ff;border-radius:50%;animation:spin 1s linear infinite;}}
-        @keyframes spin {{to{{transform:rotate(360deg)}}}}
-      </style>
-      <script>
-        let timeLeft = 10;
-        const countdownEl = document.getElementById('countdown');
-        const interval = setInterval(() => {{
-          timeLeft--;
-          countdownEl.innerText = `Redirection dans ${{timeLeft}} seconde${{timeLeft > 1 ? 's' : ''}}...`;
-          if (timeLeft <= 0) clearInterval(interval);
-        }}, 1000);
-      </script>
-    </head>
-    <body>
-      <div class="card">
-        <h2>Restauration en cours</h2>
-        <div class="spinner"></div>
-        <p><strong>Veuillez patienter</strong>, la restauration nécessite un redémarrage du Pi.</p>
-        <p>Vous serez redirigé et recevrez une <strong>notification SMS</strong> du redémarrage.</p>
-        <p>Fichier : <span class="file">{backup_name}</span></p>
-        <p class="log">{log_entry}</p>
-        <p class="countdown" id="countdown">Redirection dans 10 secondes...</p>
-      </div>
-    </body>
-    </html>
-    """
-
 # ------------------------------------------------------------------
 # Enregistrement des routes
 # ------------------------------------------------------------------
@@ -138,6 +110,46 @@ def register_routes(app):
     BACKUP_DIR = app.config["BACKUP_DIR"]
     UPLOAD_DIR = app.config["UPLOAD_DIR"]
     USERS_DB = app.config["USERS_DB"]
+    HISTORY_FILE = app.config["HISTORY_FILE"]
+
+    # État + compteurs publiés par le monitor en mémoire partagée (/dev/shm)
+    monitor_snapshot = SharedSnapshot(MONITOR_SNAPSHOT)
+
+    # État réseau partagé (suivi en tâche de fond, jamais par requête)
+    status_service = StatusService(monitor_snapshot, HISTORY_FILE)
+    app.extensions["status_service"] = status_service
+
+    # Journal d'événements du monitor (events.jsonl, lecture seule)
+    journal = EventJournal(app.config["EVENTS_FILE"])
+
+    # Rapports de disponibilité (agrégats journaliers tenus à jour depuis le journal)
+    sla = SlaEngine(app.config["SLA_FILE"], journal)
+    app.jinja_env.filters["duration"] = fmt_duration
+
+    # Snapshots incrémentaux (blocs dédupliqués + manifests)
+    snapshots = SnapshotStore(app.config["SNAPSHOT_DIR"])
+
+    # Actions longues (backup, SMS) exécutées hors requête
+    jobs = JobRunner()
+    app.extensions["jobs"] = jobs
+
+    def _send_sms(message):
+        if app.config["COMBINED"]:
+            import send_sms
+            send_sms.send(message, load_config(CONFIG_FILE), say=lambda *a: None)
+            return
+        subprocess.run(["python3", app.config["SMS_SCRIPT"], message], cwd=app.config["BASE_HOME"], timeout=60, check=True)
+
+    def start_job(kind, fn, *args, key=None, title="", back="index", on_reject=None):
+        """Soumet un job et renvoie immédiatement son id (JSON 202 ou page de suivi)."""
+        try:
+            job = jobs.submit(kind, fn, *args, key=key, redirect_url=url_for(back))
+        except JobQueueFull:
+            if on_reject: on_reject()
+            return error_page("File d'attente pleine", "Trop d'actions en cours, réessayez plus tard.")
+        if request.accept_mimetypes.best == "application/json":
+            return jsonify(job.to_dict()), 202
+        return render_template("job.html", job=job, title=title)
 
     # AUTH
     @app.route("/setup", methods=["GET", "POST"])
@@ -183,36 +195,207 @@ def register_routes(app):
     @app.route("/")
     @login_required
     def index():
-        gw_text, _ = get_gateway(CONFIG_FILE)
-        signal_text, signal_percent, _ = get_signal()
-        logs = get_logs(LOG_FILE)
-        times, states = get_freebox_history(LOG_FILE)
-        return render_template("index.html", gw_text=gw_text, signal_text=signal_text, signal_percent=signal_percent,
-                               logs=logs, history_times=json.dumps(times), history_states=json.dumps(states))
+        # Statut, signal et historique sont chargés en asynchrone via /api/v1/*
+        status_service.start()
+        return render_template("index.html", logs=get_logs(LOG_FILE))
+
+    # API JSON (état tenu en mémoire, ETag + long-poll)
+    def _etag_matches(tag):
+        # Le suffixe d'encodage (-gzip / -br) ajouté par delivery.py est ignoré
+        return any(t.split("-", 1)[0] == tag for t in request.if_none_match.as_set())
+
+    def _api_response(prefix, current, wait_for_change):
+        version, data = current()
+        wait = request.args.get("wait", default=0, type=float) or 0
+        if wait > 0 and _etag_matches(f"{prefix}{version}"):
+            wait_for_change(version, wait)
+            version, data = current()
+        tag = f"{prefix}{version}"
+        if _etag_matches(tag):
+            resp = app.response_class(status=304)
+        else:
+            resp = app.response_class(json.dumps(data, separators=(",", ":"), ensure_ascii=False),
+                                      mimetype="application/json")
+        resp.set_etag(tag)
+        resp.cache_control.private = True
+        resp.cache_control.no_cache = True
+        return resp
+
+    @app.route("/api/v1/status")
+    @login_required
+    def api_status():
+        return _api_response("s", status_service.status, status_service.wait_status)
+
+    @app.route("/api/v1/history")
+    @login_required
+    def api_history():
+        range_key = request.args.get("range", "24h")
+        return _api_response("h", lambda: status_service.history(range_key), status_service.wait_history)
+
+    @app.route("/api/v1/events")
+    @login_required
+    def api_events():
+        """
+        Événements du monitor (transitions typées).
+        Sans offset : les `limit` derniers. Avec ?offset= (valeur "offset" de la
+        réponse précédente) : uniquement les nouveaux, sans relire le journal.
+        """
+        limit = max(1, min(1000, request.args.get("limit", default=100, type=int)))
+        offset = request.args.get("offset", type=int)
+        with track("io"):
+            if offset is None:
+                events, offset = journal.tail(limit), journal.size()
+            else:
+                events, offset = journal.read_from(offset, limit)
+        return jsonify({"events": events, "offset": offset})
+
+    # DISPONIBILITÉ / SLA
+    def _sla_args():
+        period = request.args.get("period", "day")
+        if period not in PERIODS: period = "day"
+        last = max(1, min(366, request.args.get("last", default={"day": 7, "week": 8, "month": 12}[period], type=int)))
+        return period, last
+
+    @app.route("/sla")
+    @login_required
+    def sla_report():
+        period, last = _sla_args()
+        with track("io"):
+            rows = sla.report(period, last)
+        return render_template("sla.html", rows=rows, period=period, last=last)
+
+    @app.route("/api/v1/sla")
+    @login_required
+    def api_sla():
+        period, last = _sla_args()
+        with track("io"):
+            rows = sla.report(period, last)
+        return jsonify({"period": period, "rows": rows})
+
+    # RECHERCHE DANS LES LOGS (monitor.log + segments archivés)
+    SEARCH_PAGE = 200
+    SEARCH_MAX_PAGE = 1000
+
+    def _parse_when(value, default):
+        """Date "YYYY-mm-ddTHH:MM[:SS]" (champ datetime-local) ou epoch."""
+        if not value:
+            return default
+        try:
+            return float(value)
+        except ValueError:
+            pass
+        for fmt in ("%Y-%m-%dT%H:%M:%S", "%Y-%m-%dT%H:%M", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d"):
+            try:
+                return datetime.strptime(value, fmt).timestamp()
+            except ValueError:
+                continue
+        raise ValueError(value)
+
+    @app.route("/logs/search")
+    @login_required
+    def logs_search():
+        """
+        ?from=&to=&q=&level=&limit=  (+ cursor/skip renvoyés dans "next" pour la page suivante)
+        format=text : lignes envoyées en streaming au lieu du JSON.
+        """
+        try:
+            start = _parse_when(request.args.get("cursor") or request.args.get("from"), 0.0)
+            end = _parse_when(request.args.get("to"), time.time() + 60)
+        except ValueError as e:
+            return jsonify({"error": f"date invalide : {e}"}), 400
+        q = request.args.get("q", "")
+        level = request.args.get("level", "")
+        limit = max(1, min(SEARCH_MAX_PAGE, request.args.get("limit", default=SEARCH_PAGE, type=int)))
+        skip = max(0, request.args.get("skip", default=0, type=int))
+
+        def page():
+            """Jusqu'à `limit` lignes, après les `skip` premières à l'horodatage du curseur."""
+            skipped = 0
+            count = 0
+            for t, line in logstore.search(LOG_FILE, start, end, q, level):
+                if skipped < skip and t == start:
+                    skipped += 1
+                    continue
+                if count == limit:
+                    yield None, None  # il reste des lignes : page suivante
+                    return
+                count += 1
+                yield t, line
+
+        def next_args(last_t, same_t):
+            args = {k: v for k, v in request.args.items() if k not in ("cursor", "skip")}
+            args.update(cursor=repr(last_t), skip=same_t + (skip if last_t == start else 0))
+            return args
+
+        if request.args.get("format") == "text":
+            def stream():
+                for t, line in page():
+                    if t is None:
+                        return
+                    yield line + "\n"
+            return Response(stream(), mimetype="text/plain",
+                            headers={"Cache-Control": "no-store"})
+
+        t0 = time.monotonic()
+        lines, more = [], False
+        last_t, same_t = None, 0
+        with track("io"):
+            for t, line in page():
+                if t is None:
+                    more = True
+                    break
+                same_t = same_t + 1 if t == last_t else 1
+                last_t = t
+                lines.append(line)
+        return jsonify({
+            "lines": lines,
+            "count": len(lines),
+            "next": url_for("logs_search", **next_args(last_t, same_t)) if more else None,
+            "took_ms": round((time.monotonic() - t0) * 1000, 1),
+        })
+
+    # MÉTRIQUES PROMETHEUS (publique, jeton optionnel : metrics_token)
+    @app.route("/metrics")
+    def metrics():
+        token = load_config(CONFIG_FILE).get("metrics_token", "")
+        if token:
+            auth = request.headers.get("Authorization", "")
+            if not hmac.compare_digest(auth.encode(), f"Bearer {token}".encode()):
+                return Response("unauthorized\n", status=401, mimetype="text/plain",
+                                headers={"WWW-Authenticate": "Bearer"})
+        w = MetricsWriter()
+        monitor_metrics(w, monitor_snapshot.read())
+        dashboard_metrics(
+            w,
+            status_service.status()[1],
+            REQUEST_TIMINGS.snapshot()["spans"],
+            TRAFFIC.snapshot(),
+            jobs.pending_count(),
+        )
+        return Response(w.render(), content_type=METRICS_CONTENT_TYPE)
 
     # ACTIONS RÉSEAU (style backup)
     @app.route("/sms")
     @login_required
     def sms():
         msg = f"Test dashboard OK ! ({datetime.now().strftime('%d/%m/%Y')})"
-        log_entry = log(f"[DASHBOARD] SMS Test → {msg}", LOG_FILE)
-        try:
-            subprocess.run(["python3", app.config["SMS_SCRIPT"], msg], cwd="/home/xavier", timeout=30, check=True)
-            return confirm_page(
-                title="SMS envoyé",
-                message="Le test SMS a été envoyé avec succès.",
-                log_entry=log_entry,
-                redirect_url=url_for('index')
-            )
-        except Exception as e:
-            error = log(f"[DASHBOARD] Erreur SMS: {e}", LOG_FILE)
-            return error_page("Erreur SMS", error)
+        log(f"[DASHBOARD] SMS Test → {msg}", LOG_FILE)
+
+        def sms_job(job, msg):
+            job.update(10, "Envoi du SMS…")
+            try:
+                _send_sms(msg)
+            except Exception as e:
+                raise RuntimeError(log(f"[DASHBOARD] Erreur SMS: {e}", LOG_FILE))
+            return "Le test SMS a été envoyé avec succès."
+
+        return start_job("sms", sms_job, msg, key="modem", title="Test SMS")
 
     @app.route("/reboot")
     @login_required
     def reboot():
         log_entry = log("[ACTION] Reboot 4G demandé via dashboard", LOG_FILE)
-        subprocess.Popen(["/home/xavier/connect_4g.sh"])
+        subprocess.Popen([os.path.join(app.config["BASE_HOME"], "connect_4g.sh")])
         return confirm_page(
             title="Reboot 4G",
             message="La commande de redémarrage du modem 4G a été lancée.",
@@ -223,26 +406,27 @@ def register_routes(app):
     @app.route("/test_failover")
     @login_required
     def test_failover():
-        gw_text, _ = get_gateway(CONFIG_FILE)
+        gw_text = status_service.status()[1].get("gw_text", "État réseau inconnu")
         msg = f"Test failover manuel - état: {gw_text} ({datetime.now().strftime('%d/%m/%Y %H:%M:%S')})"
-        log_entry = log(f"[TEST] {msg}", LOG_FILE)
-        try:
-            subprocess.run(["python3", app.config["SMS_SCRIPT"], msg], cwd="/home/xavier", timeout=30, check=True)
-            return confirm_page(
-                title="Test Failover",
-                message=f"SMS envoyé : <strong>{gw_text}</strong>",
-                log_entry=log_entry,
-                redirect_url=url_for('index')
-            )
-        except Exception as e:
-            error = log(f"[TEST] Erreur envoi SMS: {e}", LOG_FILE)
-            return error_page("Erreur Test Failover", error)
+        log(f"[TEST] {msg}", LOG_FILE)
+
+        def test_failover_job(job, msg, gw_text):
+            job.update(10, "Envoi du SMS de test…")
+            try:
+                _send_sms(msg)
+            except Exception as e:
+                raise RuntimeError(log(f"[TEST] Erreur envoi SMS: {e}", LOG_FILE))
+            return f"SMS envoyé : {gw_text}"
+
+        return start_job("test_failover", test_failover_job, msg, gw_text, key="modem", title="Test Failover")
 
     @app.route("/clear_logs")
     @admin_required
     def clear_logs():
-        open(LOG_FILE, "w").close()
-        with open("/home/xavier/status_history.json", "w") as f: f.write('{"times":[],"states":[]}')
+        with track("io"):
+            open(LOG_FILE, "w").close()
+            with open(HISTORY_FILE, "w") as f: f.write('{"times":[],"states":[],"epochs":[]}')
+        status_service.clear_history()
         log_entry = log("[ACTION] Logs effacés via dashboard", LOG_FILE)
         return success_page("Logs effacés", log_entry)
 
@@ -251,52 +435,112 @@ def register_routes(app):
     @admin_required
     def backup():
         backups = list_backups(BACKUP_DIR)
-        return render_template("backup.html", backups=backups)
+        with track("io"):
+            snaps, snap_stats = snapshots.list(), snapshots.stats()
+        return render_template("backup.html", backups=backups, snapshots=snaps, snap_stats=snap_stats)
+
+    def snapshot_job(job):
+        try:
+            manifest = snapshots.create(
+                backup_files(),
+                progress=lambda i, n, arc: job.update(70 * i // n, f"Snapshot {i}/{n} : {arc}"))
+            job.update(75, "Rétention des anciens snapshots…")
+            cfg = load_config(CONFIG_FILE)
+            pruned = snapshots.prune(cfg["snapshot_keep_daily"], cfg["snapshot_keep_weekly"])
+        except Exception as e:
+            raise RuntimeError(log(f"[BACKUP] Erreur snapshot: {e}", LOG_FILE))
+        summary = (f"{manifest['file_count']} fichiers, {manifest['written_bytes'] // 1024} Ko écrits, "
+                   f"{manifest['reused_files']} inchangés, {len(pruned['removed'])} ancien(s) supprimé(s)")
+        log(f"[BACKUP] Snapshot {manifest['id']} : {summary}", LOG_FILE)
+
+        # Envoi SMS
+        sms_msg = f"Backup créé : {manifest['id']} ({datetime.now().strftime('%d/%m/%Y %H:%M')})"
+        log(f"[BACKUP] Backup + SMS → {sms_msg}", LOG_FILE)
+        job.update(85, "Envoi du SMS…")
+        try:
+            _send_sms(sms_msg)
+            return f"Snapshot {manifest['id']} créé ({summary}) — SMS envoyé."
+        except Exception as e:
+            log(f"[BACKUP] Erreur envoi SMS: {e}", LOG_FILE)
+            return f"Snapshot {manifest['id']} créé ({summary}) — échec de l'envoi du SMS."
 
     @app.route("/backup/create")
     @admin_required
     def create_backup():
-        ts = datetime.now().strftime("%Y%m%d-%H%M%S")
-        backup_name = f"failoverpi-backup-{ts}.zip"
-        backup_path = os.path.join(BACKUP_DIR, backup_name)
-        base_home = "/home/xavier"
-        try:
-            with zipfile.ZipFile(backup_path, "w", zipfile.ZIP_DEFLATED) as z:
-                def add_if_exists(p, a=None): os.path.exists(p) and z.write(p, a or p)
-                add_if_exists(os.path.join(base_home, "config.json"), "home/xavier/config.json")
-                add_if_exists(os.path.join(base_home, "monitor_failover.py"), "home/xavier/monitor_failover.py")
-                add_if_exists(os.path.join(base_home, "run_dashboard.py"), "home/xavier/run_dashboard.py")
-                add_if_exists(os.path.join(base_home, "send_sms.py"), "home/xavier/send_sms.py")
-                add_if_exists(os.path.join(base_home, "connect_4g.sh"), "home/xavier/connect_4g.sh")
-                add_if_exists(os.path.join(base_home, "status_history.json"), "home/xavier/status_history.json")
-                add_if_exists(os.path.join(base_home, "monitor.log"), "home/xavier/monitor.log")
-                add_if_exists(os.path.join(base_home, ".dashboard_users.json"), "home/xavier/.dashboard_users.json")
-                dash_dir = os.path.join(base_home, "dashboard")
-                if os.path.isdir(dash_dir):
-                    for root, _, files in os.walk(dash_dir):
-                        if ".git" in root: continue
-                        for f in files:
-                            full = os.path.join(root, f)
-                            arc = os.path.join("home/xavier", os.path.relpath(full, base_home))
-                            z.write(full, arc)
-
-            # Envoi SMS
-            sms_msg = f"Backup créé : {backup_name} ({datetime.now().strftime('%d/%m/%Y %H:%M')})"
-            log_entry = log(f"[BACKUP] Backup + SMS → {sms_msg}", LOG_FILE)
-            try:
-                subprocess.run(["python3", app.config["SMS_SCRIPT"], sms_msg], cwd="/home/xavier", timeout=30, check=True)
-            except Exception as e:
-                log(f"[BACKUP] Erreur envoi SMS: {e}", LOG_FILE)
+        return start_job("backup", snapshot_job, key="sdcard", title="Backup", back="backup")
 
-            return confirm_page(
-                title="Backup créé",
-                message=f"Fichier : <span class='file'>{backup_name}</span><br><strong>SMS envoyé !</strong>",
-                log_entry=log_entry,
-                redirect_url=url_for('backup')
-            )
-        except Exception as e:
-            error = log(f"[BACKUP] Erreur backup: {e}", LOG_FILE)
-            return error_page("Erreur Backup", error)
+    @app.route("/backup/snapshot/<snap_id>/export")
+    @admin_required
+    def export_snapshot(snap_id):
+        if snapshots.load(snap_id) is None: return error_page("Snapshot introuvable", snap_id)
+        level = request.args.get("level", default=6, type=int)
+        log(f"[BACKUP] Export snapshot: {snap_id}", LOG_FILE)
+        return Response(
+            snapshots.stream_zip(snap_id, level=level),
+            mimetype="application/zip",
+            headers={"Content-Disposition": f"attachment; filename=failoverpi-backup-{snap_id}.zip",
+                     "Cache-Control": "no-store"},
+        )
+
+    @app.route("/backup/snapshot/<snap_id>/delete")
+    @admin_required
+    def delete_snapshot(snap_id):
+        def delete_snapshot_job(job, snap_id):
+            if not snapshots.delete(snap_id):
+                raise RuntimeError(f"Snapshot introuvable : {snap_id}")
+            log(f"[BACKUP] Snapshot supprimé: {snap_id}", LOG_FILE)
+            return f"Snapshot {snap_id} supprimé."
+        if snapshots.load(snap_id) is None: return error_page("Snapshot introuvable", snap_id)
+        # snap_id fait partie des arguments : deux suppressions différentes ne sont pas fusionnées
+        return start_job("snapshot_delete", delete_snapshot_job, snap_id, key="sdcard",
+                         title="Suppression snapshot", back="backup")
+
+    # Export streaming : zip généré à la volée dans la réponse, rien n'est écrit sur la SD
+    @app.route("/backup/export")
+    @admin_required
+    def export_backup():
+        level = request.args.get("level", default=6, type=int)
+        logs = request.args.get("logs", "tail")
+        if logs not in LOG_POLICIES: logs = "tail"
+        name = f"failoverpi-export-{datetime.now().strftime('%Y%m%d-%H%M%S')}.zip"
+        log(f"[BACKUP] Export streaming: {name} (niveau={level}, logs={logs})", LOG_FILE)
+        files = backup_files(logs=logs)
+        return Response(
+            stream_backup_zip(files, level=level, logs=logs),
+            mimetype="application/zip",
+            headers={"Content-Disposition": f"attachment; filename={name}", "Cache-Control": "no-store"},
+        )
+
+    # SUIVI DES JOBS
+    @app.route("/jobs/<job_id>")
+    @login_required
+    def job_status(job_id):
+        job = jobs.get(job_id)
+        if not job: return jsonify({"error": "job introuvable"}), 404
+        wait = request.args.get("wait", default=0, type=float) or 0
+        version = request.args.get("v", default=-1, type=int)
+        if wait > 0 and version == job.version and not job.done:
+            jobs.wait(job, version, min(wait, 60))
+        return jsonify(job.to_dict())
+
+    @app.route("/jobs/<job_id>/events")
+    @login_required
+    def job_events(job_id):
+        job = jobs.get(job_id)
+        if not job: return jsonify({"error": "job introuvable"}), 404
+
+        def stream():
+            version = -1
+            while True:
+                if job.version != version:
+                    version = job.version
+                    yield f"data: {json.dumps(job.to_dict(), ensure_ascii=False)}\n\n"
+                    if job.done: return
+                else:
+                    yield ": keep-alive\n\n"
+                jobs.wait(job, version, 15)
+
+        return Response(stream(), mimetype="text/event-stream", headers={"Cache-Control": "no-cache"})
 
     @app.route("/backup/delete/<name>")
     @admin_required
@@ -323,21 +567,52 @@ def register_routes(app):
         path = os.path.join(BACKUP_DIR, os.path.basename(name))
         return send_file(path, as_attachment=True) if os.path.exists(path) else error_page("Introuvable", name)
 
-    # Fonction de restauration
-    def _restore_from_zip(zip_path):
-        base_home = "/home/xavier"
-        extract_dir = "/tmp/restore_temp"
-        if os.path.exists(extract_dir): shutil.rmtree(extract_dir)
-        os.makedirs(extract_dir, exist_ok=True)
-        with zipfile.ZipFile(zip_path, "r") as z: z.extractall(extract_dir)
-        for root, _, files in os.walk(extract_dir):
-            for f in files:
-                src = os.path.join(root, f)
-                rel = os.path.relpath(src, extract_dir)
-                dest = os.path.join(base_home, rel.replace("home/xavier/", "", 1))
-                os.makedirs(os.path.dirname(dest), exist_ok=True)
-                shutil.copy2(src, dest)
-        shutil.rmtree(extract_dir)
+    # Restauration en place : fichiers modifiés seulement, services concernés relancés
+    def discard_upload(path):
+        """Supprime une archive uploadée (restore_tmp) une fois inutile."""
+        if os.path.dirname(path) == UPLOAD_DIR:
+            try: os.remove(path)
+            except OSError: pass
+
+    def restore_job(job, source, label):
+        try:
+            return _restore(job, source, label)
+        finally:
+            discard_upload(source)
+
+    def _restore(job, source, label):
+        job.update(2, "Lecture de l'archive…")
+        try:
+            if source == "snapshot":
+                manifest = snapshots.load(label)
+                if manifest is None:
+                    raise FileNotFoundError(label)
+                report = restore_entries(
+                    snapshot_entries(snapshots, manifest),
+                    progress=lambda i, n, rel: job.update(90 * i // n, f"Restauration {i}/{n} : {rel}"))
+            else:
+                with zipfile.ZipFile(source, "r") as z:
+                    report = restore_entries(
+                        zip_entries(z),
+                        progress=lambda i, n, rel: job.update(90 * i // n, f"Restauration {i}/{n} : {rel}"))
+        except Exception as e:
+            raise RuntimeError(log(f"[RESTORE] Erreur ({label}): {e}", LOG_FILE))
+
+        summary = (f"{len(report['written'])} fichier(s) écrit(s) ({report['bytes_written'] // 1024} Ko), "
+                   f"{len(report['skipped'])} inchangé(s)")
+        log(f"[RESTORE] Restauration {label} : {summary}", LOG_FILE)
+        # Mode combiné : monitor et dashboard tournent dans un seul service
+        units = [u for u in report["units"] if app.config["COMBINED"] or u != COMBINED_UNIT]
+        if not units:
+            return f"Restauration {label} terminée : {summary}. Aucun service à relancer."
+        if app.config["COMBINED"]:
+            job.update(95, "Redémarrage du service : " + COMBINED_UNIT)
+            restarted = restart_units([COMBINED_UNIT], self_unit=COMBINED_UNIT)
+        else:
+            job.update(95, "Redémarrage des services : " + ", ".join(units))
+            restarted = restart_units(units)
+        log(f"[RESTORE] Services relancés: {', '.join(restarted)}", LOG_FILE)
+        return f"Restauration {label} terminée : {summary}. Services relancés : {', '.join(restarted)}."
 
     # Restauration via upload
     @app.route("/restore", methods=["POST"])
@@ -346,16 +621,15 @@ def register_routes(app):
         file = request.files.get("backup_file")
         if not file or not file.filename.lower().endswith(".zip"):
             return error_page("Erreur", "Fichier .zip requis.")
-        dest_path = os.path.join(UPLOAD_DIR, f"upload-{int(time.time())}.zip")
+        # Nom unique : deux uploads rapprochés ne s'écrasent pas (ni ne fusionnent en un seul job)
+        dest_path = os.path.join(UPLOAD_DIR, f"upload-{int(time.time())}-{uuid.uuid4().hex[:8]}.zip")
         file.save(dest_path)
-        try:
-            _restore_from_zip(dest_path)
-            log_entry = log(f"[RESTORE] Restauration depuis upload: {os.path.basename(dest_path)}", LOG_FILE)
-            subprocess.Popen(["sudo", "reboot"])
-            return restore_wait_page(log_entry, os.path.basename(dest_path))
-        except Exception as e:
-            error = log(f"[RESTORE] Erreur: {e}", LOG_FILE)
-            return error_page("Erreur Restauration", error)
+        if not zipfile.is_zipfile(dest_path):
+            discard_upload(dest_path)
+            return error_page("Erreur", "Archive ZIP invalide.")
+        log(f"[RESTORE] Restauration depuis upload: {os.path.basename(dest_path)}", LOG_FILE)
+        return start_job("restore", restore_job, dest_path, os.path.basename(dest_path), key="sdcard",
+                         title="Restauration", back="backup", on_reject=lambda: discard_upload(dest_path))
 
     # Restauration depuis backup existant
     @app.route("/backup/restore_existing/<name>")
@@ -363,14 +637,18 @@ def register_routes(app):
     def restore_existing(name):
         path = os.path.join(BACKUP_DIR, os.path.basename(name))
         if not os.path.exists(path): return error_page("Backup introuvable", name)
-        try:
-            _restore_from_zip(path)
-            log_entry = log(f"[RESTORE] Restauration: {os.path.basename(name)}", LOG_FILE)
-            subprocess.Popen(["sudo", "reboot"])
-            return restore_wait_page(log_entry, os.path.basename(name))
-        except Exception as e:
-            error = log(f"[RESTORE] Erreur: {e}", LOG_FILE)
-            return error_page("Erreur Restauration", error)
+        log(f"[RESTORE] Restauration: {os.path.basename(name)}", LOG_FILE)
+        return start_job("restore", restore_job, path, os.path.basename(name), key="sdcard",
+                         title="Restauration", back="backup")
+
+    # Restauration depuis un snapshot (hash sha256 de chaque fichier dans le manifest)
+    @app.route("/backup/snapshot/<snap_id>/restore")
+    @admin_required
+    def restore_snapshot(snap_id):
+        if snapshots.load(snap_id) is None: return error_page("Snapshot introuvable", snap_id)
+        log(f"[RESTORE] Restauration snapshot: {snap_id}", LOG_FILE)
+        return start_job("restore", restore_job, "snapshot", snap_id, key="sdcard",
+                         title="Restauration", back="backup")
 
     # REBOOT / SHUTDOWN
     @app.route("/reboot_pi")
@@ -419,7 +697,22 @@ def register_routes(app):
     @app.route("/diagnostics")
     @admin_required
     def diagnostics():
-        return render_template("diagnostics.html", checks=check_dependencies(app.config))
+        return render_template("diagnostics.html", checks=check_dependencies(app.config), traffic=TRAFFIC.snapshot())
+
+    @app.route("/performance")
+    @admin_required
+    def performance():
+        """Durées par endpoint depuis le démarrage du dashboard + dernières requêtes lentes."""
+        rows, slow = PERF.snapshot()
+        threshold = load_config(CONFIG_FILE)["slow_request_ms"]
+        return render_template("performance.html", rows=rows, slow=slow, threshold=threshold)
+
+    def _valid_probe(spec):
+        try:
+            parse_probe(spec)
+            return True
+        except ValueError:
+            return False
 
     @app.route("/config", methods=["GET", "POST"])
     @admin_required
@@ -437,9 +730,32 @@ def register_routes(app):
             if recipients: cfg["sms_phone"] = recipients[0]
             try: cfg["port"] = int(request.form.get("port", str(cfg.get("port", 5123))))
             except: pass
+            for key in ("check_interval", "min_4g_retry_delay"):
+                try: cfg[key] = max(5, int(request.form.get(key, str(cfg[key]))))
+                except: pass
+            for key in BROWNOUT_KEYS + ("multipath_rtt_ref_ms", "multipath_probe_interval"):
+                try: cfg[key] = max(0, int(request.form.get(key, str(cfg[key]))))
+                except: pass
+            for key in USAGE_KEYS:
+                try: cfg[key] = max(0, int(request.form.get(key, str(cfg[key]))))
+                except: pass
+            cfg["quota_reset_day"] = min(28, max(1, cfg["quota_reset_day"]))
+            if request.form.get("route_mode") in ROUTE_MODES:
+                cfg["route_mode"] = request.form["route_mode"]
+            invalid = []
+            for key in ("probes_freebox", "probes_4g"):
+                if key in request.form:
+                    specs = [l.strip() for l in request.form[key].splitlines() if l.strip()]
+                    invalid += [s for s in specs if not _valid_probe(s)]
+                    cfg[key] = [s for s in specs if _valid_probe(s)] or cfg[key]
+            for key in ("probe_quorum", "probe_timeout", "multipath_fail_count"):
+                try: cfg[key] = max(1, int(request.form.get(key, str(cfg[key]))))
+                except: pass
             if save_config(cfg, CONFIG_FILE):
                 message = "Configuration sauvegardée."
                 log("[CONFIG] Mise à jour via /config", LOG_FILE)
+                if invalid:
+                    error = "Sondes invalides ignorées : " + ", ".join(invalid)
             else:
                 error = "Échec sauvegarde."
         recipients_preview = "\n".join(cfg.get("sms_recipients", []) or [cfg.get("sms_phone", "")])
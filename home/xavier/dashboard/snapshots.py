@@ -0,0 +1,291 @@
+import os
+import json
+import zlib
+import time
+import hashlib
+import zipfile
+import threading
+from datetime import datetime
+from typing import Iterator, List, Optional, Tuple
+
+from .backup import StreamBuffer, write_manifest, zip_params
+
+# Taille des blocs (chunks) : un log qui grossit ne réécrit que ses derniers blocs
+CHUNK_SIZE = 256 * 1024
+
+
+class SnapshotStore:
+    """
+    Snapshots incrémentaux dédupliqués par contenu.
+
+    Organisation sur disque (sous root) :
+      chunks/ab/abcdef...   bloc compressé zlib, nommé par le sha256 du bloc brut
+      manifests/<id>.json   liste des fichiers du snapshot et de leurs blocs
+
+    Un fichier dont taille + mtime n'ont pas changé depuis le snapshot précédent
+    n'est même pas relu ; seuls les blocs inconnus sont écrits.
+
+    create / delete / prune / gc sont sérialisés par un verrou : le ramasse-miettes
+    ne doit jamais voir les blocs d'un snapshot dont le manifest n'est pas écrit.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self._lock = threading.RLock()
+        self.chunks_dir = os.path.join(root, "chunks")
+        self.manifests_dir = os.path.join(root, "manifests")
+
+    # ------------------------------------------------------------------
+    #  Blocs
+    # ------------------------------------------------------------------
+    def _chunk_path(self, digest: str) -> str:
+        return os.path.join(self.chunks_dir, digest[:2], digest)
+
+    def _put_chunk(self, data: bytes) -> Tuple[str, int]:
+        """Stocke un bloc s'il est inconnu ; renvoie (hash, octets écrits)."""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._chunk_path(digest)
+        if os.path.exists(path):
+            return digest, 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        packed = zlib.compress(data, 6)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(packed)
+        os.replace(tmp, path)
+        return digest, len(packed)
+
+    def read_chunk(self, digest: str) -> bytes:
+        with open(self._chunk_path(digest), "rb") as f:
+            data = zlib.decompress(f.read())
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise ValueError(f"bloc corrompu : {digest}")
+        return data
+
+    # ------------------------------------------------------------------
+    #  Manifests
+    # ------------------------------------------------------------------
+    def list(self) -> List[dict]:
+        """Snapshots du plus récent au plus ancien (sans la liste des fichiers)."""
+        snaps = []
+        if not os.path.isdir(self.manifests_dir):
+            return snaps
+        for name in os.listdir(self.manifests_dir):
+            if not name.endswith(".json"):
+                continue
+            m = self.load(name[:-5])
+            if m:
+                snaps.append({k: v for k, v in m.items() if k != "files"})
+        snaps.sort(key=lambda m: m["created"], reverse=True)
+        return snaps
+
+    def load(self, snap_id: str) -> Optional[dict]:
+        path = os.path.join(self.manifests_dir, os.path.basename(snap_id) + ".json")
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except Exception:
+            return None
+
+    def _save_manifest(self, manifest: dict):
+        os.makedirs(self.manifests_dir, exist_ok=True)
+        path = os.path.join(self.manifests_dir, manifest["id"] + ".json")
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(manifest, f, separators=(",", ":"))
+        os.replace(tmp, path)
+
+    def delete(self, snap_id: str) -> bool:
+        """Supprime un snapshot et les blocs qu'il était seul à référencer."""
+        with self._lock:
+            path = os.path.join(self.manifests_dir, os.path.basename(snap_id) + ".json")
+            if not os.path.exists(path):
+                return False
+            os.remove(path)
+            self.gc()
+            return True
+
+    # ------------------------------------------------------------------
+    #  Création
+    # ------------------------------------------------------------------
+    def create(self, files, progress=None) -> dict:
+        """
+        files : liste (chemin, nom dans l'archive), cf. backup.backup_files().
+        Renvoie le manifest (avec stats : octets lus / écrits).
+        """
+        with self._lock:
+            return self._create(files, progress)
+
+    def _create(self, files, progress) -> dict:
+        previous = {}
+        snaps = self.list()
+        if snaps:
+            last = self.load(snaps[0]["id"]) or {}
+            previous = {f["path"]: f for f in last.get("files", [])}
+
+        snap_id = datetime.now().strftime("%Y%m%d-%H%M%S")
+        while os.path.exists(os.path.join(self.manifests_dir, snap_id + ".json")):
+            snap_id += "b"
+
+        entries = []
+        read_bytes = written_bytes = reused_files = 0
+        for i, (full, arc) in enumerate(files, 1):
+            try:
+                st = os.stat(full)
+            except OSError:
+                continue
+            prev = previous.get(arc)
+            if prev and prev["size"] == st.st_size and prev["mtime_ns"] == st.st_mtime_ns:
+                chunks, sha = prev["chunks"], prev["sha256"]
+                reused_files += 1
+            else:
+                chunks, h = [], hashlib.sha256()
+                with open(full, "rb") as f:
+                    for block in iter(lambda: f.read(CHUNK_SIZE), b""):
+                        h.update(block)
+                        digest, written = self._put_chunk(block)
+                        chunks.append(digest)
+                        read_bytes += len(block)
+                        written_bytes += written
+                sha = h.hexdigest()
+            entries.append({
+                "path": arc,
+                "size": st.st_size,
+                "mtime_ns": st.st_mtime_ns,
+                "mode": st.st_mode & 0o7777,
+                "sha256": sha,
+                "chunks": chunks,
+            })
+            if progress:
+                progress(i, len(files), arc)
+
+        manifest = {
+            "id": snap_id,
+            "created": time.time(),
+            "file_count": len(entries),
+            "logical_bytes": sum(e["size"] for e in entries),
+            "read_bytes": read_bytes,
+            "written_bytes": written_bytes,
+            "reused_files": reused_files,
+            "files": entries,
+        }
+        self._save_manifest(manifest)
+        return manifest
+
+    # ------------------------------------------------------------------
+    #  Rétention + ramasse-miettes
+    # ------------------------------------------------------------------
+    def prune(self, keep_daily: int, keep_weekly: int) -> dict:
+        """
+        Garde le dernier snapshot de chacun des keep_daily derniers jours et de
+        chacune des keep_weekly dernières semaines (ISO), plus le plus récent.
+        Supprime les autres puis les blocs qui ne sont plus référencés.
+        """
+        with self._lock:
+            return self._prune(keep_daily, keep_weekly)
+
+    def _prune(self, keep_daily: int, keep_weekly: int) -> dict:
+        snaps = self.list()
+        keep = set()
+        if snaps:
+            keep.add(snaps[0]["id"])
+        days, weeks = [], []
+        for m in snaps:
+            d = datetime.fromtimestamp(m["created"])
+            day, week = d.date(), d.isocalendar()[:2]
+            if day not in days and len(days) < keep_daily:
+                days.append(day)
+                keep.add(m["id"])
+            if week not in weeks and len(weeks) < keep_weekly:
+                weeks.append(week)
+                keep.add(m["id"])
+        removed = [m["id"] for m in snaps if m["id"] not in keep]
+        for snap_id in removed:
+            os.remove(os.path.join(self.manifests_dir, snap_id + ".json"))
+        freed = self.gc()
+        return {"removed": removed, "kept": len(keep), "freed_bytes": freed}
+
+    def gc(self) -> int:
+        """Supprime les blocs non référencés, renvoie les octets libérés."""
+        with self._lock:
+            return self._gc()
+
+    def _gc(self) -> int:
+        referenced = set()
+        for m in self.list():
+            full = self.load(m["id"]) or {}
+            for f in full.get("files", []):
+                referenced.update(f["chunks"])
+        freed = 0
+        if not os.path.isdir(self.chunks_dir):
+            return 0
+        for sub in os.listdir(self.chunks_dir):
+            d = os.path.join(self.chunks_dir, sub)
+            for name in os.listdir(d):
+                if name not in referenced:
+                    p = os.path.join(d, name)
+                    freed += os.path.getsize(p)
+                    os.remove(p)
+            if not os.listdir(d):
+                os.rmdir(d)
+        return freed
+
+    def stats(self) -> dict:
+        """Espace réellement occupé vs somme des tailles de tous les snapshots."""
+        snaps = self.list()
+        logical = sum(m["logical_bytes"] for m in snaps)
+        stored = chunks = 0
+        # Sans le verrou (page /backup sans attente) : un bloc ou un dossier retiré
+        # par un élagage / gc en cours est simplement ignoré
+        if os.path.isdir(self.chunks_dir):
+            for sub in os.listdir(self.chunks_dir):
+                d = os.path.join(self.chunks_dir, sub)
+                try:
+                    names = os.listdir(d)
+                except FileNotFoundError:
+                    continue
+                for name in names:
+                    try:
+                        stored += os.path.getsize(os.path.join(d, name))
+                    except FileNotFoundError:
+                        continue
+                    chunks += 1
+        return {
+            "snapshots": len(snaps),
+            "chunks": chunks,
+            "logical_bytes": logical,
+            "stored_bytes": stored,
+            "saved_bytes": max(0, logical - stored),
+            "saved_percent": round(100 * (1 - stored / logical), 1) if logical else 0.0,
+        }
+
+    # ------------------------------------------------------------------
+    #  Lecture / export
+    # ------------------------------------------------------------------
+    def iter_file(self, entry: dict) -> Iterator[bytes]:
+        for digest in entry["chunks"]:
+            yield self.read_chunk(digest)
+
+    def stream_zip(self, snap_id: str, level: int = 6) -> Iterator[bytes]:
+        """Export d'un snapshot au format ZIP habituel (home/xavier/...), en streaming."""
+        manifest = self.load(snap_id)
+        if manifest is None:
+            raise FileNotFoundError(snap_id)
+        compression, compresslevel = zip_params(level)
+        buf = StreamBuffer()
+        with zipfile.ZipFile(buf, "w", compression, compresslevel=compresslevel) as z:
+            for entry in manifest["files"]:
+                info = zipfile.ZipInfo(entry["path"], time.localtime(entry["mtime_ns"] / 1e9)[:6])
+                info.external_attr = (0o100000 | entry["mode"]) << 16
+                info.compress_type = compression
+                info._compresslevel = compresslevel
+                with z.open(info, "w", force_zip64=entry["size"] > zipfile.ZIP64_LIMIT) as dst:
+                    for block in self.iter_file(entry):
+                        dst.write(block)
+                        data = buf.drain()
+                        if data:
+                            yield data
+            write_manifest(z, {e["path"]: e["sha256"] for e in manifest["files"]})
+        data = buf.drain()
+        if data:
+            yield data
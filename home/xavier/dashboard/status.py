@@ -0,0 +1,239 @@
+import os
+import json
+import time
+import threading
+from collections import deque
+from datetime import datetime
+
+from failoverpi.shm import monitor_alive
+from .utils import get_signal
+
+# L'état des liens vient du monitor (instantané en mémoire partagée, voir
+# failoverpi/shm.py) : relu toutes les SNAPSHOT_POLL secondes (un stat() si
+# rien n'a changé). Le dashboard ne lance jamais de ping lui-même.
+SNAPSHOT_POLL = 1
+
+# Signal 4G (qmicli) et point d'historique : toutes les SAMPLE_INTERVAL secondes,
+# quel que soit le nombre de clients.
+SAMPLE_INTERVAL = 30
+
+# Persistance de l'historique dans status_history.json (limite les écritures SD)
+PERSIST_INTERVAL = 300
+
+# Profondeur d'historique conservée (README : historique 7 jours)
+HISTORY_SECONDS = 7 * 24 * 3600
+
+# Durée max d'attente d'un long-poll (?wait=)
+MAX_WAIT = 60
+
+# Nombre max de points renvoyés pour le graphe
+MAX_POINTS = 120
+
+RANGES = {
+    "1h": 3600,
+    "6h": 6 * 3600,
+    "24h": 24 * 3600,
+    "7d": 7 * 24 * 3600,
+}
+
+
+def route_status(snap) -> dict:
+    """
+    Texte, couleur et route (nom du lien / none / unknown) d'après l'état publié
+    par le monitor ; led : freebox (lien principal) / 4g (secours) / none / unknown.
+    """
+    if not monitor_alive(snap):
+        return {"gw_text": "Monitor arrêté (état réseau inconnu)", "gw_color": "#8b949e", "route": "unknown", "led": "unknown"}
+    route = snap.get("route")
+    links = snap.get("links") or {}
+    primary = snap.get("primary") or "freebox"
+    lan_ok = links.get("lan", {}).get("up")
+
+    def label(name):
+        return (links.get(name) or {}).get("label") or {"freebox": "Freebox", "4g": "4G"}.get(name, name)
+
+    shared = snap.get("multipath") or {}
+    if len(shared) > 1 and route in links:
+        weights = " / ".join(f"{label(n)} {w}" for n, w in shared.items())
+        text, color, led = f"Partage de charge actif ({weights})", "#3fb950", "freebox" if route == primary else "4g"
+    elif route == primary:
+        text, color, led = f"{label(route)} OK (Internet OK)", "#3fb950", "freebox"
+    elif route in links and route != "lan" and snap.get("brownout"):
+        text, color, led = f"Failover {label(route)} actif ({label(primary)} dégradée)", "#f0883e", "4g"
+    elif route in links and route != "lan":
+        state = "sans Internet" if lan_ok else "KO"
+        text, color, led = f"Failover {label(route)} actif ({label(primary)} {state})", "#f0883e", "4g"
+    elif route == "none":
+        names = [label(n) for n in links if n != "lan"] or ["Freebox", "4G"]
+        text, color, led = f"Aucune connexion ({', '.join('ni ' + n for n in names)})", "#f85149", "none"
+    else:
+        text, color, route, led = "État réseau inconnu", "#8b949e", "unknown", "unknown"
+    return {"gw_text": text, "gw_color": color, "route": route, "led": led}
+
+
+class StatusService:
+    """
+    État réseau tenu en mémoire par le dashboard.
+
+    Un thread suit l'instantané publié par le monitor (liens, RTT, route,
+    dernière transition) et échantillonne le signal 4G ; les lecteurs
+    (API JSON, index, test failover) ne lisent que ce cache. Chaque changement
+    incrémente un numéro de version, utilisé comme ETag et pour réveiller
+    les long-polls.
+    """
+
+    def __init__(self, snapshot, history_file: str):
+        self.snapshot = snapshot
+        self.history_file = history_file
+        self._cond = threading.Condition()
+        self._status = None
+        self._status_version = 0
+        self._status_updated = 0.0
+        self._history = deque()
+        self._history_version = 0
+        self._thread = None
+        self._last_persist = 0.0
+        self._signal = None
+        self._last_sample = 0.0
+
+    # ------------------------------------------------------------------
+    #  Cycle d'échantillonnage
+    # ------------------------------------------------------------------
+    def start(self):
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._load_history()
+            self._thread = threading.Thread(target=self._run, name="status-sampler", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.sample()
+            except Exception:
+                pass
+            time.sleep(SNAPSHOT_POLL)
+
+    def sample(self):
+        now = time.time()
+        periodic = now - self._last_sample >= SAMPLE_INTERVAL
+        if periodic or self._signal is None:
+            self._signal = get_signal()
+            self._last_sample = now
+        snap = self.snapshot.read()
+        signal_text, signal_percent, rssi = self._signal
+        status = route_status(snap)
+        alive = status["route"] != "unknown"
+        status.update({
+            "links": (snap.get("links") or {}) if alive else {},
+            "usage": (snap.get("usage") or {}) if alive else {},
+            "last_transition": snap.get("last_transition") if snap else None,
+            "monitor_seq": snap.get("seq") if snap else None,
+            "signal_text": signal_text,
+            "signal_percent": signal_percent,
+            "rssi": rssi,
+        })
+        self.publish(status, now, history=periodic)
+
+    def publish(self, status: dict, now: float, history: bool = True):
+        """Enregistre un nouvel état et réveille les long-polls s'il a changé."""
+        with self._cond:
+            if status != self._status:
+                self._status = status
+                self._status_version += 1
+            self._status_updated = now
+            if history:
+                self._history.append((int(now), 1 if status["led"] == "freebox" else 0))
+                while self._history and self._history[0][0] < now - HISTORY_SECONDS:
+                    self._history.popleft()
+                self._history_version += 1
+            self._cond.notify_all()
+        if history and now - self._last_persist >= PERSIST_INTERVAL:
+            self._persist_history()
+            self._last_persist = now
+
+    # ------------------------------------------------------------------
+    #  Lecture
+    # ------------------------------------------------------------------
+    def status(self):
+        """(version, dict) de l'état courant."""
+        self.start()
+        with self._cond:
+            if self._status is None:
+                return self._status_version, {"v": self._status_version, "ready": False}
+            data = dict(self._status, v=self._status_version, ready=True,
+                        updated=int(self._status_updated))
+            return self._status_version, data
+
+    def history(self, range_key: str):
+        """(version, dict) de l'historique sur la plage demandée, sous-échantillonné."""
+        self.start()
+        span = RANGES.get(range_key, RANGES["24h"])
+        with self._cond:
+            since = time.time() - span
+            points = [p for p in self._history if p[0] >= since]
+            version = self._history_version
+        step = max(1, -(-len(points) // MAX_POINTS))
+        points = points[step - 1::step] if step > 1 else points
+        fmt = "%H:%M" if span <= 24 * 3600 else "%d/%m %H:%M"
+        return version, {
+            "v": version,
+            "range": range_key if range_key in RANGES else "24h",
+            "times": [datetime.fromtimestamp(t).strftime(fmt) for t, _ in points],
+            "states": [s for _, s in points],
+        }
+
+    def wait_status(self, version: int, timeout: float):
+        """Bloque jusqu'à ce que la version de l'état diffère de version (ou timeout)."""
+        self.start()
+        with self._cond:
+            self._cond.wait_for(lambda: self._status_version != version, timeout=min(timeout, MAX_WAIT))
+
+    def wait_history(self, version: int, timeout: float):
+        self.start()
+        with self._cond:
+            self._cond.wait_for(lambda: self._history_version != version, timeout=min(timeout, MAX_WAIT))
+
+    def clear_history(self):
+        with self._cond:
+            self._history.clear()
+            self._history_version += 1
+            self._cond.notify_all()
+
+    # ------------------------------------------------------------------
+    #  Persistance status_history.json
+    # ------------------------------------------------------------------
+    def _load_history(self):
+        """
+        Format : {"times": ["06:43", ...], "states": [1, 0, ...], "epochs": [..]}
+        Les anciens fichiers sans "epochs" ne sont pas datables : ignorés.
+        """
+        try:
+            with open(self.history_file, "r") as f:
+                data = json.load(f)
+            epochs = data.get("epochs", [])
+            states = data.get("states", [])
+            n = min(len(epochs), len(states))
+            since = time.time() - HISTORY_SECONDS
+            for t, s in zip(epochs[-n:], states[-n:]):
+                if int(t) >= since:
+                    self._history.append((int(t), 1 if int(s) > 0 else 0))
+        except Exception:
+            pass
+
+    def _persist_history(self):
+        with self._cond:
+            points = list(self._history)
+        data = {
+            "times": [datetime.fromtimestamp(t).strftime("%H:%M") for t, _ in points],
+            "states": [s for _, s in points],
+            "epochs": [t for t, _ in points],
+        }
+        try:
+            tmp = self.history_file + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(data, f, separators=(",", ":"))
+            os.replace(tmp, self.history_file)
+        except Exception:
+            pass
@@ -1,14 +1,17 @@
 import os
-import json
 import subprocess
 import datetime
 import shutil
 from typing import List, Tuple
 
+from failoverpi import config as shared_config
+from .perf import timed
+
 
 # ----------------------------------------------------------------------
 #  LOG & CONFIG
 # ----------------------------------------------------------------------
+@timed("io")
 def log(msg: str, log_file: str) -> str:
     """Écrit un log horodaté dans log_file et le renvoie."""
     ts = datetime.datetime.now().strftime("%d/%m/%Y %H:%M:%S")
@@ -23,43 +26,25 @@ def log(msg: str, log_file: str) -> str:
     return line
 
 
+@timed("io")
 def load_config(path: str) -> dict:
-    """Charge config.json (ou renvoie des valeurs par défaut)."""
-    default_cfg = {
-        "apn": "free",
-        "sim_pin": "1234",
-        "sms_phone": "+33600000000",
-        "gateway": "192.168.0.254",
-        "serial_port": "/dev/ttyUSB3",
-        "port": 5123,
-        "qmi_device": "/dev/cdc-wdm0",
-        "wwan_interface": "wwan0",
-    }
-    try:
-        if os.path.exists(path):
-            with open(path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            default_cfg.update(data or {})
-    except Exception:
-        pass
-    return default_cfg
+    """
+    Charge config.json (ou renvoie des valeurs par défaut).
+    Mis en cache par failoverpi.config : re-parsé seulement si le fichier change.
+    """
+    return shared_config.load_config(path)
 
 
+@timed("io")
 def save_config(cfg: dict, path: str) -> bool:
-    """Sauvegarde config.json, renvoie True si OK."""
-    try:
-        tmp = path + ".tmp"
-        with open(tmp, "w", encoding="utf-8") as f:
-            json.dump(cfg, f, indent=2, ensure_ascii=False)
-        os.replace(tmp, path)
-        return True
-    except Exception:
-        return False
+    """Sauvegarde config.json (écriture atomique), renvoie True si OK."""
+    return shared_config.save_config(cfg, path)
 
 
 # ----------------------------------------------------------------------
 #  COMMANDES SHELL
 # ----------------------------------------------------------------------
+@timed("subprocess")
 def _run_cmd(cmd, timeout=10) -> Tuple[int, str, str]:
     """Exécute une commande shell et renvoie (rc, stdout, stderr)."""
     try:
@@ -75,8 +60,9 @@ def _run_cmd(cmd, timeout=10) -> Tuple[int, str, str]:
 
 
 # ----------------------------------------------------------------------
-#  LECTURE LOGS & HISTORIQUE
+#  LECTURE LOGS
 # ----------------------------------------------------------------------
+@timed("io")
 def get_logs(log_file: str, limit: int = 80) -> List[str]:
     """Retourne les dernières lignes du fichier de log."""
     if not os.path.exists(log_file):
@@ -89,98 +75,10 @@ def get_logs(log_file: str, limit: int = 80) -> List[str]:
         return []
 
 
-def get_freebox_history(log_file: str):
-    """
-    Renvoie l'historique Freebox / 4G pour l'affichage du graphique.
-
-    Format recommandé de /home/xavier/status_history.json :
-    {
-      "times": ["06:43", "06:44", ...],
-      "states": [1, 1, 0, ...]   # 1 = Freebox, 0 = 4G
-    }
-
-    On :
-      - lit ce JSON si présent,
-      - normalise les valeurs d'état,
-      - ne garde que les N derniers points (pour un graphe lisible),
-      - sinon, fallback : parsing du fichier de log.
-    """
-    history_file = "/home/xavier/status_history.json"
-    MAX_POINTS = 60  # nombre max de points sur le graphe
-
-    # --- 1) Fichier structuré (recommandé) ---
-    if os.path.exists(history_file):
-        try:
-            with open(history_file, "r") as f:
-                data = json.load(f)
-
-            times = data.get("times", [])
-            states = data.get("states", [])
-
-            # Alignement tailles
-            n = min(len(times), len(states))
-            times = times[-n:]
-            states = states[-n:]
-
-            # Normalisation des états :
-            #  - 1  => Freebox
-            #  - 0  => 4G
-            #  - tout le reste (ex: -1) => on force à 0 pour ne pas casser l'échelle
-            norm_states = []
-            for s in states:
-                try:
-                    v = int(s)
-                except Exception:
-                    v = 0
-                if v <= 0:
-                    v = 0
-                else:
-                    v = 1
-                norm_states.append(v)
-
-            states = norm_states
-
-            # On limite le nombre de points pour garder un graphe lisible
-            n = min(len(times), len(states), MAX_POINTS)
-            if n > 0:
-                return times[-n:], states[-n:]
-            else:
-                return [], []
-        except Exception:
-            # En cas de problème de lecture, fallback sur les logs
-            pass
-
-    # --- 2) Fallback : parsing du fichier de log (ancien système) ---
-    if not os.path.exists(log_file):
-        return [], []
-
-    times, states = [], []
-    try:
-        with open(log_file) as f:
-            lines = f.readlines()
-
-        # On ne garde que les dernières lignes pertinentes
-        for line in lines[-500:]:
-            if "Freebox OK" in line or "4G ACTIVE" in line:
-                try:
-                    time_part = line.split("]")[0].replace("[", "").strip()
-                except Exception:
-                    continue
-
-                state = 1 if "Freebox OK" in line else 0
-                times.append(time_part)
-                states.append(state)
-
-        # On limite aussi ici
-        n = min(len(times), len(states), MAX_POINTS)
-        return times[-n:], states[-n:]
-    except Exception:
-        return [], []
-
-
 # ----------------------------------------------------------------------
 #  BACKUPS
 # ----------------------------------------------------------------------
+@timed("io")
 def list_backups(backup_dir: str) -> List[str]:
     """Liste les backups ZIP dans le dossier backup_dir, triés par date descendante."""
     if not os.path.isdir(backup_dir):
@@ -195,38 +93,9 @@ def list_backups(backup_dir: str) -> List[str]:
 
 
 # ----------------------------------------------------------------------
-#  STATUT GATEWAY & SIGNAL 4G (pour le dashboard)
+#  SIGNAL 4G (pour le dashboard)
+#  L'état des liens (Freebox / 4G) vient du monitor : voir status.py
 # ----------------------------------------------------------------------
-def _ping_host(host: str, count: int = 2, timeout: int = 2) -> bool:
-    rc, out, err = _run_cmd(
-        ["ping", "-c", str(count), "-W", str(timeout), host],
-        timeout=timeout * count + 2,
-    )
-    return rc == 0
-
-
-def get_gateway(config_file: str) -> Tuple[str, str]:
-    """
-    Retourne (texte_statut, couleur_led) pour le dashboard.
-    On ping la gateway Freebox et 8.8.8.8 via la route par défaut.
-    """
-    cfg = load_config(config_file)
-    gw = cfg.get("gateway", "192.168.0.254")
-
-    lan_ok = _ping_host(gw, count=1, timeout=1)
-    internet_ok = _ping_host("8.8.8.8", count=1, timeout=1)
-
-    if lan_ok and internet_ok:
-        return "Freebox OK (Internet OK)", "#3fb950"
-    if lan_ok and not internet_ok:
-        return "Freebox OK (pas d'accès Internet)", "#f0883e"
-    if not lan_ok:
-        # On pourrait raffiner en testant wwan0, ici on simplifie :
-        return "Connexion 4G ou aucune (Freebox KO)", "#f85149"
-
-    return "État réseau inconnu", "#8b949e"
-
-
 def get_signal() -> Tuple[str, int, int]:
     """
     Retourne (description_signal, pourcentage, rssi_dbm) pour le SIM7600E.
@@ -485,7 +354,7 @@ def check_dependencies(app_config: dict) -> List[dict]:
     checks.append(_check_dir_writable(upload_dir, "UPLOAD_DIR"))
 
     # Scripts principaux
-    base_home = "/home/xavier"
+    base_home = app_config.get("BASE_HOME", "/home/xavier")
     scripts = [
         ("monitor_failover.py", os.path.join(base_home, "monitor_failover.py")),
         ("connect_4g.sh", os.path.join(base_home, "connect_4g.sh")),
@@ -504,9 +373,12 @@ def check_dependencies(app_config: dict) -> List[dict]:
     wwan_if = app_config.get("WWAN_INTERFACE", "wwan0")
     checks.append(_check_iface(wwan_if))
 
-    # Services systemd
-    checks.append(_check_service("failover-dashboard.service"))
-    checks.append(_check_service("failover-monitor.service"))
+    # Services systemd (un seul en mode combiné)
+    if app_config.get("COMBINED"):
+        checks.append(_check_service("failover-pi.service"))
+    else:
+        checks.append(_check_service("failover-dashboard.service"))
+        checks.append(_check_service("failover-monitor.service"))
 
     # Module SIM7600E & ports série
     checks.append(_check_lsusb_sim7600())
@@ -0,0 +1,6 @@
+# ============================================================================
+#  Failover-Pi : briques communes au monitor, à send_sms.py et au dashboard
+#
+#  Les scripts de /home/xavier sont lancés depuis ce dossier, le paquet est
+#  donc importable directement (from failoverpi.config import ...).
+# ============================================================================
@@ -0,0 +1,345 @@
+import os
+import copy
+import json
+import struct
+import select
+import ctypes
+import ctypes.util
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+CONFIG_FILE = "/home/xavier/config.json"
+
+# ----------------------------------------------------------------------
+#  SCHÉMA & VALEURS PAR DÉFAUT (uniques pour monitor, SMS et dashboard)
+# ----------------------------------------------------------------------
+# clé -> (type attendu, valeur par défaut)
+SCHEMA: Dict[str, Tuple[type, object]] = {
+    "apn": (str, "free"),
+    "sim_pin": (str, ""),
+    "sms_phone": (str, "+33XXXXXXXXX"),
+    "sms_recipients": (list, []),
+    "alert_numbers": (list, []),
+    "gateway": (str, "192.168.0.254"),
+    "port": (int, 5123),
+    "serial_port": (str, "/dev/ttyUSB3"),
+    "qmi_device": (str, "/dev/cdc-wdm0"),
+    "wwan_interface": (str, "wwan0"),
+    # Intervalle entre deux checks du monitor (secondes)
+    "check_interval": (int, 60),
+    # Délai minimal entre deux tentatives d'activation 4G (secondes)
+    "min_4g_retry_delay": (int, 90),
+    # Rétention des snapshots de sauvegarde (N quotidiens, M hebdomadaires)
+    "snapshot_keep_daily": (int, 7),
+    "snapshot_keep_weekly": (int, 4),
+    # Rotation de monitor.log : taille max, âge max, rétention des archives, codec (gz / xz)
+    "log_max_bytes": (int, 1024 * 1024),
+    "log_rotate_hours": (int, 24),
+    "log_keep_days": (int, 7),
+    "log_compression": (str, "gz"),
+    # Jeton exigé par /metrics (Authorization: Bearer ...) ; vide = accès libre sur le LAN
+    "metrics_token": (str, ""),
+    # Requêtes du dashboard plus lentes que ce seuil (ms) : journalisées (0 = jamais)
+    "slow_request_ms": (int, 1000),
+    # Table des liens WAN (voir failoverpi/links.py) ; vide = Freebox (gateway) + 4G (wwan_interface)
+    "links": (list, []),
+    # Routage : "failover" (un seul lien à la fois) ou "multipath" (partage de charge pondéré)
+    "route_mode": (str, "failover"),
+    # Multipath : RTT au-delà duquel le poids baisse, sonde rapide (s, 0 = aucune), échecs avant retrait
+    "multipath_rtt_ref_ms": (int, 100),
+    "multipath_probe_interval": (int, 2),
+    "multipath_fail_count": (int, 2),
+    # Data des liens facturés au volume : lecture des compteurs (s, 0 = aucune), forfait 4G (Mo, 0 = aucun)
+    "usage_interval": (int, 10),
+    "quota_4g_mb": (int, 0),
+    # Jour de remise à zéro du forfait, seuils d'alerte SMS (% du forfait)
+    "quota_reset_day": (int, 1),
+    "quota_alert_pct": (list, [50, 80, 100]),
+    # Au-delà de quota_failback_pct % du forfait, retour sur un lien fixe après quota_recover_dwell s
+    "quota_failback_pct": (int, 80),
+    "quota_recover_dwell": (int, 60),
+    # Modem 4G (vendor:product USB) ; attente après ré-énumération avant de le réutiliser (s)
+    "modem_usb_id": (str, "1e0e:9001"),
+    "modem_settle": (int, 5),
+    # Accès Internet d'un lien : quorum de sondes "icmp:hôte", "dns:serveur", "tcp:hôte:port"
+    "probes_freebox": (list, ["icmp:8.8.8.8", "icmp:1.1.1.1", "dns:1.1.1.1", "dns:8.8.8.8", "tcp:1.1.1.1:443"]),
+    "probes_4g": (list, ["icmp:8.8.8.8", "icmp:1.1.1.1", "dns:1.1.1.1", "dns:8.8.8.8", "tcp:1.1.1.1:443"]),
+    "probe_quorum": (int, 3),
+    "probe_timeout": (int, 2),
+    "probe_dns_name": (str, "example.com"),
+    # Qualité des liens : fenêtre glissante (cycles) et pings par mesure Internet
+    "quality_window": (int, 10),
+    "quality_ping_count": (int, 5),
+    # Brownout Freebox : seuils de bascule 4G (0 = critère ignoré), à tenir brownout_dwell s
+    "brownout_loss_pct": (int, 20),
+    "brownout_rtt_ms": (int, 800),
+    "brownout_jitter_ms": (int, 300),
+    "brownout_dwell": (int, 120),
+    # Retour Freebox : seuils plus bas (hystérésis), tous respectés pendant recover_dwell s
+    "recover_loss_pct": (int, 5),
+    "recover_rtt_ms": (int, 300),
+    "recover_jitter_ms": (int, 100),
+    "recover_dwell": (int, 600),
+}
+
+
+def defaults() -> dict:
+    """Copie fraîche des valeurs par défaut."""
+    return {k: copy.deepcopy(v) for k, (_, v) in SCHEMA.items()}
+
+
+def _coerce(key: str, value):
+    """Ramène une valeur au type du schéma, ou lève ValueError."""
+    typ, _ = SCHEMA[key]
+    if typ is list:
+        if isinstance(value, str):
+            value = [value]
+        if not isinstance(value, (list, tuple)):
+            raise ValueError(key)
+        # Listes d'objets (table "links") : éléments gardés tels quels
+        return [dict(v) if isinstance(v, dict) else str(v).strip()
+                for v in value if isinstance(v, dict) or (v and str(v).strip())]
+    if typ is int:
+        if isinstance(value, bool):
+            raise ValueError(key)
+        return int(value)
+    if value is None:
+        raise ValueError(key)
+    return str(value)
+
+
+def normalize(data: dict) -> dict:
+    """
+    Fusionne data avec les valeurs par défaut.
+    Les clés connues mal typées retombent sur le défaut,
+    les clés inconnues sont conservées telles quelles.
+    """
+    cfg = defaults()
+    for key, value in (data or {}).items():
+        if key in SCHEMA:
+            try:
+                cfg[key] = _coerce(key, value)
+            except (TypeError, ValueError):
+                pass
+        else:
+            cfg[key] = value
+    return cfg
+
+
+def get_recipients(cfg: dict) -> List[str]:
+    """
+    Numéros destinataires des alertes :
+    alert_numbers[] prioritaire, puis sms_recipients[] (dashboard), sinon sms_phone.
+    """
+    for key in ("alert_numbers", "sms_recipients"):
+        numbers = [n.strip() for n in cfg.get(key) or [] if n and n.strip()]
+        if numbers:
+            return numbers
+    phone = (cfg.get("sms_phone") or "").strip()
+    return [phone] if phone else []
+
+
+# ----------------------------------------------------------------------
+#  CACHE BASÉ SUR stat()
+# ----------------------------------------------------------------------
+def _file_signature(path: str):
+    """(inode, mtime_ns, taille) ou None si le fichier est absent."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+class ConfigStore:
+    """
+    Accès partagé à config.json.
+
+    get() ne fait qu'un stat() tant que le fichier n'a pas changé
+    (inode / mtime / taille) ; le JSON n'est re-parsé qu'après modification.
+    watch() ajoute un rechargement à chaud piloté par inotify.
+    """
+
+    def __init__(self, path: str = CONFIG_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._sig = None
+        self._cfg: Optional[dict] = None
+        self._callbacks: List[Callable[[dict], None]] = []
+        self._watcher: Optional[threading.Thread] = None
+
+    def _reload_locked(self, sig) -> bool:
+        data = {}
+        if sig is not None:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except Exception:
+                # Fichier en cours d'écriture ou invalide : on garde l'ancien
+                if self._cfg is not None:
+                    return False
+        cfg = normalize(data if isinstance(data, dict) else {})
+        changed = cfg != self._cfg
+        self._cfg = cfg
+        self._sig = sig
+        return changed
+
+    def refresh(self) -> bool:
+        """Re-parse si le fichier a changé, renvoie True si le contenu a changé."""
+        sig = _file_signature(self.path)
+        with self._lock:
+            if self._cfg is not None and sig == self._sig:
+                return False
+            first_load = self._cfg is None
+            changed = self._reload_locked(sig)
+        if changed and not first_load:
+            self._notify()
+        return changed
+
+    def get(self) -> dict:
+        """Config courante (copie modifiable par l'appelant)."""
+        self.refresh()
+        with self._lock:
+            return copy.deepcopy(self._cfg)
+
+    def value(self, key: str):
+        """Une seule clé de la config courante, sans copier tout le reste."""
+        self.refresh()
+        with self._lock:
+            return copy.deepcopy(self._cfg.get(key))
+
+    def save(self, cfg: dict) -> bool:
+        """Écriture atomique (tmp + rename), renvoie True si OK."""
+        try:
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(cfg, f, indent=2, ensure_ascii=False)
+            os.replace(tmp, self.path)
+        except Exception:
+            return False
+        self.refresh()
+        return True
+
+    # ------------------------------------------------------------------
+    #  Rechargement à chaud
+    # ------------------------------------------------------------------
+    def on_change(self, callback: Callable[[dict], None]):
+        """Enregistre un callback appelé avec la nouvelle config."""
+        self._callbacks.append(callback)
+
+    def _notify(self):
+        with self._lock:
+            cfg = copy.deepcopy(self._cfg)
+        for cb in list(self._callbacks):
+            try:
+                cb(copy.deepcopy(cfg))
+            except Exception:
+                pass
+
+    def watch(self, poll_interval: float = 5.0):
+        """
+        Démarre (une seule fois) un thread qui surveille le dossier du fichier
+        via inotify ; à défaut d'inotify, simple scrutation stat().
+        """
+        if self._watcher is not None:
+            return
+        self.refresh()
+        self._watcher = threading.Thread(
+            target=self._watch_loop, args=(poll_interval,), name="config-watch", daemon=True
+        )
+        self._watcher.start()
+
+    def _watch_loop(self, poll_interval: float):
+        notifier = _Inotify.open(os.path.dirname(self.path) or ".")
+        name = os.path.basename(self.path)
+        while True:
+            if notifier is None:
+                threading.Event().wait(poll_interval)
+                self.refresh()
+                continue
+            names = notifier.read(timeout=poll_interval)
+            if names is None:
+                # inotify en erreur : on repasse en scrutation
+                notifier = None
+            if names is None or name in names:
+                self.refresh()
+
+
+# ----------------------------------------------------------------------
+#  inotify via ctypes (pas de dépendance externe)
+# ----------------------------------------------------------------------
+_IN_MODIFY = 0x00000002
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_CLOEXEC = 0o2000000
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class _Inotify:
+    def __init__(self, fd: int):
+        self.fd = fd
+
+    @classmethod
+    def open(cls, directory: str):
+        """Renvoie un _Inotify sur directory, ou None si indisponible."""
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            fd = libc.inotify_init1(_IN_CLOEXEC)
+            if fd < 0:
+                return None
+            mask = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+            if libc.inotify_add_watch(fd, directory.encode(), mask) < 0:
+                os.close(fd)
+                return None
+            return cls(fd)
+        except Exception:
+            return None
+
+    def read(self, timeout: float):
+        """
+        Attend des événements, renvoie l'ensemble des noms de fichiers touchés,
+        un ensemble vide en cas de timeout, ou None en cas d'erreur.
+        """
+        try:
+            ready, _, _ = select.select([self.fd], [], [], timeout)
+            if not ready:
+                return set()
+            buf = os.read(self.fd, 4096)
+        except OSError:
+            return None
+        names = set()
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(buf):
+            _, _, _, length = _EVENT_HEADER.unpack_from(buf, offset)
+            offset += _EVENT_HEADER.size
+            raw = buf[offset:offset + length]
+            offset += length
+            names.add(raw.rstrip(b"\0").decode(errors="ignore"))
+        return names
+
+
+# ----------------------------------------------------------------------
+#  Instances partagées (une par chemin)
+# ----------------------------------------------------------------------
+_STORES: Dict[str, ConfigStore] = {}
+_STORES_LOCK = threading.Lock()
+
+
+def get_store(path: str = CONFIG_FILE) -> ConfigStore:
+    with _STORES_LOCK:
+        store = _STORES.get(path)
+        if store is None:
+            store = _STORES[path] = ConfigStore(path)
+        return store
+
+
+def load_config(path: str = CONFIG_FILE) -> dict:
+    """Config normalisée (mise en cache tant que le fichier ne change pas)."""
+    return get_store(path).get()
+
+
+def save_config(cfg: dict, path: str = CONFIG_FILE) -> bool:
+    return get_store(path).save(cfg)
@@ -0,0 +1,140 @@
+"""
+Branchement / débranchement du modem 4G (SIM7600E), suivi par les uevents
+du noyau (netlink NETLINK_KOBJECT_UEVENT) : quand le modem se réinitialise,
+son périphérique USB et ses nœuds (/dev/ttyUSB*, /dev/cdc-wdm0, wwan0)
+disparaissent puis reviennent.
+
+    w = ModemWatcher(lambda: ["/dev/ttyUSB3", "/dev/cdc-wdm0", "/sys/class/net/wwan0"], callback)
+    w.start()     # False si netlink indisponible
+
+callback(event, detail) :
+  "lost" : un des nœuds a disparu        detail = {"missing": [...], "usb": devpath ou None}
+  "back" : tous les nœuds sont revenus   detail = {"down_s": durée d'absence, "usb": ...}
+           (après settle s sans nouvel événement : le modem répond alors aux commandes AT)
+
+Seuls les événements des sous-systèmes usb / tty / usbmisc / net déclenchent
+une vérification (quelques stat()), rien n'est fait entre deux événements.
+"""
+import os
+import time
+import socket
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+NETLINK_KOBJECT_UEVENT = 15
+# Groupe des événements émis par le noyau (le groupe 2 est celui de udev)
+UEVENT_GROUP_KERNEL = 1
+
+SUBSYSTEMS = ("usb", "tty", "usbmisc", "net")
+
+# Identifiant USB du SIM7600E (vendor:product)
+MODEM_USB_ID = "1e0e:9001"
+
+
+def node_paths(cfg: dict) -> List[str]:
+    """Nœuds attendus d'après config.json : port AT, port QMI, interface réseau."""
+    return [
+        cfg.get("serial_port") or "/dev/ttyUSB3",
+        cfg.get("qmi_device") or "/dev/cdc-wdm0",
+        f"/sys/class/net/{cfg.get('wwan_interface') or 'wwan0'}",
+    ]
+
+
+def parse_uevent(data: bytes) -> Tuple[Optional[str], Dict[str, str]]:
+    """"add@/devices/...\\0ACTION=add\\0SUBSYSTEM=usb\\0..." -> (action, {clé: valeur})."""
+    parts = data.split(b"\0")
+    if not parts or b"@" not in parts[0]:
+        return None, {}
+    props = {}
+    for part in parts[1:]:
+        key, sep, value = part.partition(b"=")
+        if sep:
+            props[key.decode(errors="replace")] = value.decode(errors="replace")
+    return props.get("ACTION") or parts[0].split(b"@", 1)[0].decode(errors="replace"), props
+
+
+def usb_id_of(props: Dict[str, str]) -> Optional[str]:
+    """PRODUCT=1e0e/9001/318 -> "1e0e:9001" (None si l'événement n'a pas d'identifiant USB)."""
+    fields = props.get("PRODUCT", "").split("/")
+    if len(fields) < 2:
+        return None
+    try:
+        return f"{int(fields[0], 16):04x}:{int(fields[1], 16):04x}"
+    except ValueError:
+        return None
+
+
+class ModemWatcher:
+    """Présence du modem et de ses nœuds, d'après les uevents du noyau."""
+
+    def __init__(self, paths: Callable[[], List[str]], callback: Callable[[str, dict], None],
+                 usb_id: str = MODEM_USB_ID, settle: float = 5):
+        self.paths = paths
+        self.callback = callback
+        self.usb_id = usb_id
+        self.settle = settle
+        self.present = self._missing() == []
+        self.usb = None          # devpath du périphérique USB du modem, dès le premier événement
+        self.lost_at = None
+        self._back_since = None
+        self._thread: Optional[threading.Thread] = None
+
+    def _missing(self) -> List[str]:
+        return [p for p in self.paths() if not os.path.exists(p)]
+
+    def start(self) -> bool:
+        if self._thread is not None:
+            return True
+        try:
+            sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_KOBJECT_UEVENT)
+            sock.bind((0, UEVENT_GROUP_KERNEL))
+            sock.settimeout(1)
+        except (OSError, AttributeError):
+            return False
+        self._thread = threading.Thread(target=self._loop, args=(sock,), name="uevent-modem", daemon=True)
+        self._thread.start()
+        return True
+
+    def handle(self, action: Optional[str], props: Dict[str, str], now: float):
+        """Un uevent : suit le périphérique USB du modem, puis revérifie les nœuds."""
+        if props.get("SUBSYSTEM") not in SUBSYSTEMS:
+            return
+        if props.get("DEVTYPE") == "usb_device" and usb_id_of(props) == self.usb_id:
+            self.usb = props.get("DEVPATH")
+        self.check(now, event=f"{action} {props.get('DEVNAME') or props.get('INTERFACE') or props.get('DEVPATH', '')}")
+
+    def check(self, now: float, event: Optional[str] = None):
+        missing = self._missing()
+        if self.present and missing:
+            self.present = False
+            self.lost_at = now
+            self._back_since = None
+            self.callback("lost", {"missing": missing, "usb": self.usb, "event": event})
+        elif not self.present and not missing:
+            # Nœuds revenus : on attend settle s sans nouvel événement avant d'annoncer le modem
+            if event is not None or self._back_since is None:
+                self._back_since = now
+            if now - self._back_since >= self.settle:
+                self.present = True
+                down_s = None if self.lost_at is None else round(now - self.lost_at, 1)
+                self._back_since = None
+                self.callback("back", {"down_s": down_s, "usb": self.usb})
+        elif missing:
+            self._back_since = None
+
+    def _loop(self, sock):
+        while True:
+            try:
+                data = sock.recv(16384)
+            except socket.timeout:
+                data = None
+            except OSError:
+                time.sleep(1)
+                continue
+            try:
+                if data:
+                    self.handle(*parse_uevent(data), time.time())
+                elif not self.present:
+                    self.check(time.time())
+            except Exception:
+                pass
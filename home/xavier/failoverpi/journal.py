@@ -0,0 +1,156 @@
+import os
+import json
+import time
+import threading
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+EVENTS_FILE = "/home/xavier/events.jsonl"
+
+# Lecture arrière : taille des blocs lus depuis la fin du fichier
+TAIL_BLOCK = 8192
+
+# ----------------------------------------------------------------------
+#  TYPES D'ÉVÉNEMENTS (émis par monitor_failover.py)
+# ----------------------------------------------------------------------
+# link : nom du lien (table links : "freebox" / "4g" / ...) / "any" (au moins
+#        une connexion) / "monitor" / "route" (lien qui porte le trafic)
+#        / "brownout" (lien prioritaire dégradé, trafic sur un autre : on / off)
+#        / "modem" (modem 4G présent sur l'USB : up / down)
+MONITOR_START = "monitor_start"
+BOOT_DECISION = "boot_decision"
+FREEBOX_LOST = "freebox_lost"
+FREEBOX_RESTORED = "freebox_restored"
+FAILOVER_4G = "failover_4g"       # journaux antérieurs à route_change
+LTE_LOST = "4g_lost"
+LTE_UP = "4g_up"
+NO_CONNECTION = "no_connection"
+CONNECTION_BACK = "connection_back"
+# Tentatives de montage (connect_4g.sh ou bring_up du lien), link = nom du lien
+LTE_ATTEMPT = "4g_attempt"
+LTE_ATTEMPT_FAILED = "4g_attempt_failed"
+BROWNOUT_START = "brownout_start"
+BROWNOUT_END = "brownout_end"
+# Liens de la table autres que Freebox / 4G
+LINK_LOST = "link_lost"
+LINK_UP = "link_up"
+# Changement de lien portant la route (new : nom du lien ou "none")
+ROUTE_CHANGE = "route_change"
+# Modem 4G disparu de l'USB (reset) / ré-énuméré
+MODEM_LOST = "modem_lost"
+MODEM_BACK = "modem_back"
+
+
+class EventJournal:
+    """
+    Journal JSONL en ajout seul : une ligne = un événement.
+
+      {"id": 42, "ts": 1736000000.0, "time": "04/01/2025 15:33:20",
+       "type": "freebox_lost", "link": "freebox", "prev": "up", "new": "down",
+       "duration": 5400.0, ...}
+
+    - id croissant, repris depuis la dernière ligne au démarrage ;
+    - duration : durée (s) de l'état précédent, None si inconnue ;
+    - un lecteur mémorise l'offset (octets) renvoyé par read_from() et
+      reprend là où il s'était arrêté, sans relire le fichier.
+    """
+
+    def __init__(self, path: str = EVENTS_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._last_id = None
+
+    # ------------------------------------------------------------------
+    #  Écriture
+    # ------------------------------------------------------------------
+    def _load_last_id(self) -> int:
+        last = self.tail(1)
+        return last[0]["id"] if last else 0
+
+    def append(self, event_type: str, link: str, prev=None, new=None,
+               duration: Optional[float] = None, **data) -> Optional[dict]:
+        """Ajoute un événement (écriture unique + fsync), renvoie l'événement ou None."""
+        with self._lock:
+            try:
+                if self._last_id is None:
+                    self._last_id = self._load_last_id()
+                now = time.time()
+                event = {
+                    "id": self._last_id + 1,
+                    "ts": round(now, 3),
+                    "time": datetime.fromtimestamp(now).strftime("%d/%m/%Y %H:%M:%S"),
+                    "type": event_type,
+                    "link": link,
+                    "prev": prev,
+                    "new": new,
+                    "duration": None if duration is None else round(duration, 1),
+                }
+                event.update(data)
+                line = (json.dumps(event, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+                fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                try:
+                    os.write(fd, line)
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+                self._last_id = event["id"]
+                return event
+            except Exception:
+                return None
+
+    # ------------------------------------------------------------------
+    #  Lecture
+    # ------------------------------------------------------------------
+    def size(self) -> int:
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def read_from(self, offset: int = 0, limit: int = 500) -> Tuple[List[dict], int]:
+        """
+        Événements à partir de l'offset (octets) donné, et l'offset suivant.
+        Une ligne incomplète (écriture en cours) n'est pas consommée.
+        Si le journal a été vidé (offset > taille), on repart de 0.
+        """
+        events = []
+        try:
+            f = open(self.path, "rb")
+        except OSError:
+            return events, 0
+        with f:
+            if offset > os.fstat(f.fileno()).st_size:
+                offset = 0
+            f.seek(offset)
+            while len(events) < limit:
+                line = f.readline()
+                if not line.endswith(b"\n"):
+                    break
+                offset += len(line)
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    continue
+        return events, offset
+
+    def tail(self, n: int = 50) -> List[dict]:
+        """Les n derniers événements, lus depuis la fin du fichier."""
+        try:
+            f = open(self.path, "rb")
+        except OSError:
+            return []
+        with f:
+            pos = os.fstat(f.fileno()).st_size
+            data = b""
+            while pos > 0 and data.count(b"\n") <= n:
+                step = min(TAIL_BLOCK, pos)
+                pos -= step
+                f.seek(pos)
+                data = f.read(step) + data
+        events = []
+        for line in data.splitlines()[-n:] if n else []:
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                continue
+        return events
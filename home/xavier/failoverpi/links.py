@@ -0,0 +1,154 @@
+"""
+Table des liens WAN (clé "links" de config.json), du plus prioritaire au
+moins prioritaire :
+
+    "links": [
+      {"name": "freebox",  "label": "Freebox",  "interface": "eth0",  "gateway": "192.168.0.254", "priority": 10},
+      {"name": "starlink", "label": "Starlink", "interface": "eth1",  "gateway": "192.168.1.1",   "priority": 20},
+      {"name": "4g",       "label": "4G",       "interface": "wwan0", "priority": 30, "cost": "metered",
+       "bring_up": "sudo /home/xavier/connect_4g.sh"}
+    ]
+
+Champs :
+  name       identifiant (journal, SLA, métriques) : minuscules, chiffres, - et _
+  label      nom affiché dans les SMS et le dashboard (défaut : name)
+  interface  interface réseau (obligatoire)
+  gateway    passerelle ; vide = lien point à point (route "dev" seule, pas de ping LAN)
+  priority   plus petit = préféré (défaut : ordre de la table)
+  bring_up   commande de montage, lancée quand le lien est KO et qu'aucun lien
+             plus prioritaire ne répond
+  cost       "fixed" ou "metered" (facturé au volume : wlan0 coupé tant qu'il porte la route)
+  probes     sondes du quorum (défaut : probes_freebox)
+  weight / table / fwmark : mode multipath (voir failoverpi/multipath.py)
+  quota_mb   forfait data mensuel d'un lien "metered" (voir failoverpi/usage.py)
+  sms_lost / sms_restored / sms_failover : textes des alertes ("" = pas de SMS)
+
+Sans table (ou table vide) : Freebox (gateway, eth0) + 4G (wwan_interface,
+connect_4g.sh), avec les SMS historiques.
+"""
+import re
+from typing import Dict, List, Optional, Tuple
+
+COST_CLASSES = ("fixed", "metered")
+
+CONNECT_4G = "sudo /home/xavier/connect_4g.sh"
+
+# Noms déjà utilisés par le journal / les rapports SLA
+RESERVED_NAMES = ("lan", "any", "route", "brownout", "monitor", "none", "modem")
+
+_NAME_RE = re.compile(r"^[a-z0-9][a-z0-9_-]*$")
+
+
+def legacy_links(cfg: dict) -> List[dict]:
+    """Freebox + 4G tels que configurés avant la table links."""
+    return [
+        {
+            "name": "freebox", "label": "Freebox", "interface": "eth0",
+            "gateway": cfg.get("gateway", ""), "priority": 10, "cost": "fixed", "bring_up": "",
+            "probes": list(cfg.get("probes_freebox") or []),
+            "sms_lost": "⚠️ La Freebox n’a plus d'accès à Internet.",
+            "sms_restored": "✅ La connexion Internet Freebox est rétablie.",
+            "sms_failover": "",
+            "weight": None, "table": None, "fwmark": None, "quota_mb": None,
+        },
+        {
+            "name": "4g", "label": "4G", "interface": cfg.get("wwan_interface") or "wwan0",
+            "gateway": "", "priority": 20, "cost": "metered", "bring_up": CONNECT_4G,
+            "probes": list(cfg.get("probes_4g") or []),
+            "sms_lost": "📵 La connexion 4G (SIM7600E) est perdue.",
+            "sms_restored": "",
+            "sms_failover": "📡 Connexion 4G établie (failover).",
+            "weight": None, "table": None, "fwmark": None, "quota_mb": cfg.get("quota_4g_mb") or None,
+        },
+    ]
+
+
+def parse_link(raw: dict, index: int, cfg: dict) -> dict:
+    """Entrée de la table -> lien complet (valeurs par défaut), ValueError si invalide."""
+    if not isinstance(raw, dict):
+        raise ValueError(f"lien n°{index + 1} : objet attendu")
+    name = str(raw.get("name") or "").strip().lower()
+    if not _NAME_RE.match(name) or name in RESERVED_NAMES:
+        raise ValueError(f"lien n°{index + 1} : nom invalide ({name or 'vide'})")
+    iface = str(raw.get("interface") or "").strip()
+    if not iface or " " in iface:
+        raise ValueError(f"lien {name} : interface manquante")
+    cost = str(raw.get("cost") or "fixed").strip().lower()
+    if cost not in COST_CLASSES:
+        raise ValueError(f"lien {name} : cost doit valoir {' / '.join(COST_CLASSES)}")
+    try:
+        priority = int(raw.get("priority", (index + 1) * 10))
+    except (TypeError, ValueError):
+        raise ValueError(f"lien {name} : priority doit être un entier")
+    optional = {}
+    for key in ("weight", "table", "fwmark", "quota_mb"):
+        try:
+            optional[key] = int(raw[key]) if raw.get(key) not in (None, "") else None
+        except (TypeError, ValueError):
+            raise ValueError(f"lien {name} : {key} doit être un entier")
+        if optional[key] is not None and optional[key] < 1:
+            raise ValueError(f"lien {name} : {key} doit être positif")
+    probes = raw.get("probes") or cfg.get("probes_freebox") or []
+    if isinstance(probes, str):
+        probes = [probes]
+    label = str(raw.get("label") or name).strip()
+    return {
+        "name": name,
+        "label": label,
+        "interface": iface,
+        "gateway": str(raw.get("gateway") or "").strip(),
+        "priority": priority,
+        "cost": cost,
+        "bring_up": str(raw.get("bring_up") or "").strip(),
+        "probes": [str(p).strip() for p in probes if str(p).strip()],
+        "sms_lost": str(raw.get("sms_lost", f"⚠️ {label} : plus d'accès à Internet.")),
+        "sms_restored": str(raw.get("sms_restored", f"✅ {label} : accès Internet rétabli.")),
+        "sms_failover": str(raw.get("sms_failover", f"📡 Bascule sur {label} (failover).")),
+        **optional,
+    }
+
+
+def load_links(cfg: dict) -> Tuple[List[dict], List[str]]:
+    """
+    (liens triés par priorité, erreurs). Les entrées invalides sont ignorées ;
+    si aucune ne reste, on retombe sur la table Freebox + 4G.
+    """
+    table = cfg.get("links") or []
+    if not table:
+        return legacy_links(cfg), []
+    links, errors, seen = [], [], set()
+    for i, raw in enumerate(table):
+        try:
+            link = parse_link(raw, i, cfg)
+        except ValueError as e:
+            errors.append(str(e))
+            continue
+        if link["name"] in seen:
+            errors.append(f"lien {link['name']} : nom en double")
+            continue
+        seen.add(link["name"])
+        links.append(link)
+    if not links:
+        errors.append("aucun lien valide, table Freebox + 4G utilisée")
+        return legacy_links(cfg), errors
+    links.sort(key=lambda l: l["priority"])
+    return links, errors
+
+
+def choose_route(links: List[dict], health: Dict[str, dict]) -> Tuple[Optional[dict], List[str]]:
+    """
+    Lien qui porte la route : le plus prioritaire parmi les liens OK et non
+    dégradés ; à défaut (tous dégradés) le plus prioritaire des liens OK.
+    Renvoie (lien ou None, noms des liens OK plus prioritaires écartés car dégradés).
+    """
+    up = [l for l in links if health.get(l["name"], {}).get("up")]
+    if not up:
+        return None, []
+    good = [l for l in up if not health[l["name"]].get("degraded")]
+    route = good[0] if good else up[0]
+    return route, [l["name"] for l in up[:up.index(route)]]
+
+
+def no_connection_text(links: List[dict]) -> str:
+    """"❌ Aucune connexion disponible (ni Freebox, ni 4G)."""
+    return f"❌ Aucune connexion disponible ({', '.join('ni ' + l['label'] for l in links)})."
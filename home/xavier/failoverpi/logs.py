@@ -0,0 +1,364 @@
+import os
+import gzip
+import json
+import lzma
+import time
+from bisect import bisect_left
+from datetime import datetime
+from typing import Iterator, List, Optional, Tuple
+
+# ----------------------------------------------------------------------
+#  ROTATION DE monitor.log
+#
+#  monitor.log est archivé en segments compressés dans logs/ :
+#    logs/monitor-20250101-000000.log.gz        segment compressé
+#    logs/monitor-20250101-000000.log.gz.idx    index (JSON)
+#
+#  Un segment est une suite de blocs compressés indépendants (membres gzip
+#  ou flux xz concaténés) : zcat / xzcat le lisent d'un trait, et l'index
+#  permet de reprendre la lecture au début de n'importe quel bloc sans
+#  décompresser ce qui précède.
+#
+#  Seul le monitor fait tourner le log (une fois par cycle) ; les autres
+#  écrivains (dashboard, send_sms) ouvrent le fichier en "a" à chaque ligne
+#  et recréent donc naturellement monitor.log après un renommage.
+# ----------------------------------------------------------------------
+
+ARCHIVE_DIRNAME = "logs"
+
+# Taille (non compressée) d'un bloc indexé
+BLOCK_SIZE = 64 * 1024
+
+# Délai après le renommage pour laisser finir une écriture en cours
+ROTATE_SETTLE = 0.2
+
+CODECS = {
+    "gz": (".gz", lambda data: gzip.compress(data, 6), gzip.GzipFile),
+    "xz": (".xz", lambda data: lzma.compress(data, preset=6), lzma.LZMAFile),
+}
+
+
+def parse_ts(line) -> Optional[float]:
+    """Epoch d'une ligne "[dd/mm/YYYY HH:MM:SS] ..." (str ou bytes), None sinon."""
+    if isinstance(line, bytes):
+        line = line[:21].decode("ascii", "replace")
+    if len(line) < 21 or line[0] != "[" or line[20] != "]":
+        return None
+    try:
+        return datetime(
+            int(line[7:11]), int(line[4:6]), int(line[1:3]),
+            int(line[12:14]), int(line[15:17]), int(line[18:20]),
+        ).timestamp()
+    except ValueError:
+        return None
+
+
+def archive_dir(log_file: str) -> str:
+    return os.path.join(os.path.dirname(log_file), ARCHIVE_DIRNAME)
+
+
+def first_timestamp(path: str) -> Optional[float]:
+    try:
+        with open(path, "rb") as f:
+            return parse_ts(f.readline())
+    except OSError:
+        return None
+
+
+# ----------------------------------------------------------------------
+#  Segments + index
+# ----------------------------------------------------------------------
+def list_segments(log_file: str) -> List[dict]:
+    """Index des segments archivés, du plus ancien au plus récent."""
+    d = archive_dir(log_file)
+    segments = []
+    if not os.path.isdir(d):
+        return segments
+    for name in os.listdir(d):
+        if not name.endswith(".idx"):
+            continue
+        idx = read_index(os.path.join(d, name))
+        if idx and os.path.exists(idx["path"]):
+            segments.append(idx)
+    segments.sort(key=lambda s: (s["first"] or 0, s["path"]))
+    return segments
+
+
+def read_index(idx_path: str) -> Optional[dict]:
+    try:
+        with open(idx_path, "r") as f:
+            idx = json.load(f)
+    except Exception:
+        return None
+    idx["path"] = idx_path[:-len(".idx")]
+    return idx
+
+
+def open_segment(segment: dict, block: int = 0):
+    """Flux binaire décompressé d'un segment, à partir du bloc `block`."""
+    _, _, opener = CODECS[segment["codec"]]
+    raw = open(segment["path"], "rb")
+    raw.seek(segment["blocks"][block][1] if segment["blocks"] else 0)
+    return opener(fileobj=raw) if opener is gzip.GzipFile else opener(raw)
+
+
+def _iter_blocks(f) -> Iterator[List[bytes]]:
+    """Découpe un fichier en paquets de lignes complètes de ~BLOCK_SIZE octets."""
+    lines, size = [], 0
+    for line in f:
+        lines.append(line)
+        size += len(line)
+        if size >= BLOCK_SIZE:
+            yield lines
+            lines, size = [], 0
+    if lines:
+        yield lines
+
+
+def _write_segment(src_path: str, seg_path: str, codec: str) -> dict:
+    _, compress, _ = CODECS[codec]
+    blocks = []
+    first = last = None
+    raw_offset = comp_offset = line_count = 0
+    tmp = seg_path + ".tmp"
+    with open(src_path, "rb") as src, open(tmp, "wb") as out:
+        for lines in _iter_blocks(src):
+            # Un bloc commence à la première ligne horodatée (ou hérite de la précédente)
+            block_ts = next((t for t in map(parse_ts, lines) if t is not None), last)
+            for line in reversed(lines):
+                t = parse_ts(line)
+                if t is not None:
+                    last = t
+                    break
+            if first is None:
+                first = block_ts
+            data = b"".join(lines)
+            packed = compress(data)
+            blocks.append([block_ts, comp_offset, raw_offset])
+            out.write(packed)
+            comp_offset += len(packed)
+            raw_offset += len(data)
+            line_count += len(lines)
+        out.flush()
+        os.fsync(out.fileno())
+    os.replace(tmp, seg_path)
+    idx = {
+        "codec": codec,
+        "first": first,
+        "last": last,
+        "lines": line_count,
+        "raw_bytes": raw_offset,
+        "stored_bytes": comp_offset,
+        "block_size": BLOCK_SIZE,
+        # [epoch de la 1re ligne, offset compressé, offset décompressé]
+        "blocks": blocks,
+    }
+    with open(seg_path + ".idx.tmp", "w") as f:
+        json.dump(idx, f, separators=(",", ":"))
+    os.replace(seg_path + ".idx.tmp", seg_path + ".idx")
+    idx["path"] = seg_path
+    return idx
+
+
+# ----------------------------------------------------------------------
+#  Rotation / rétention
+# ----------------------------------------------------------------------
+def _segment_path(log_file: str, start: float, codec: str) -> str:
+    """Nom du segment d'après l'horodatage de sa première ligne (suffixe si collision)."""
+    d = archive_dir(log_file)
+    os.makedirs(d, exist_ok=True)
+    base = "monitor-" + datetime.fromtimestamp(start).strftime("%Y%m%d-%H%M%S")
+    ext = CODECS[codec][0]
+    seg_path = os.path.join(d, base + ".log" + ext)
+    n = 1
+    while os.path.exists(seg_path):
+        seg_path = os.path.join(d, f"{base}-{n}.log{ext}")
+        n += 1
+    return seg_path
+
+
+def _archive_pending(pending: str, seg_path: str, codec: str) -> dict:
+    """
+    Segment écrit depuis .rotating.log, supprimé seulement ensuite : en cas
+    d'échec (disque plein, erreur d'E/S) le segment partiel est retiré et
+    .rotating.log conservé pour la prochaine tentative (recover()).
+    """
+    try:
+        idx = _write_segment(pending, seg_path, codec)
+    except Exception:
+        for p in (seg_path + ".tmp", seg_path, seg_path + ".idx.tmp", seg_path + ".idx"):
+            try:
+                os.remove(p)
+            except OSError:
+                pass
+        raise
+    os.remove(pending)
+    return idx
+
+
+def rotate(log_file: str, codec: str = "gz") -> Optional[dict]:
+    """Archive monitor.log en segment compressé indexé ; renvoie l'index ou None."""
+    if codec not in CODECS:
+        codec = "gz"
+    try:
+        if os.path.getsize(log_file) == 0:
+            return None
+    except OSError:
+        return None
+
+    # Rotation précédente en échec : on l'archive d'abord, sans l'écraser
+    recover(log_file, codec)
+    seg_path = _segment_path(log_file, first_timestamp(log_file) or time.time(), codec)
+    pending = os.path.join(archive_dir(log_file), ".rotating.log")
+    os.replace(log_file, pending)
+    time.sleep(ROTATE_SETTLE)
+    return _archive_pending(pending, seg_path, codec)
+
+
+def purge(log_file: str, keep_days: int) -> List[str]:
+    """Supprime les segments dont la dernière ligne a plus de keep_days jours."""
+    limit = time.time() - keep_days * 86400
+    removed = []
+    for seg in list_segments(log_file):
+        if (seg["last"] or 0) < limit:
+            for p in (seg["path"], seg["path"] + ".idx"):
+                try:
+                    os.remove(p)
+                except OSError:
+                    pass
+            removed.append(os.path.basename(seg["path"]))
+    return removed
+
+
+def recover(log_file: str, codec: str = "gz") -> Optional[dict]:
+    """Termine une rotation interrompue (coupure de courant, disque plein pendant la compression)."""
+    if codec not in CODECS:
+        codec = "gz"
+    pending = os.path.join(archive_dir(log_file), ".rotating.log")
+    if not os.path.exists(pending):
+        return None
+    seg_path = _segment_path(log_file, first_timestamp(pending) or os.path.getmtime(pending), codec)
+    return _archive_pending(pending, seg_path, codec)
+
+
+def maybe_rotate(log_file: str, cfg: dict) -> dict:
+    """
+    Rotation si monitor.log dépasse log_max_bytes ou si sa première ligne a plus
+    de log_rotate_hours heures, puis purge des segments de plus de log_keep_days jours.
+    Renvoie {"rotated": index ou None, "purged": [...]}.
+    """
+    rotated = None
+    try:
+        size = os.path.getsize(log_file)
+    except OSError:
+        size = 0
+    if size:
+        first = first_timestamp(log_file)
+        too_big = size >= cfg["log_max_bytes"]
+        too_old = first is not None and time.time() - first >= cfg["log_rotate_hours"] * 3600
+        if too_big or too_old:
+            rotated = rotate(log_file, cfg["log_compression"])
+    return {"rotated": rotated, "purged": purge(log_file, cfg["log_keep_days"])}
+
+
+# ----------------------------------------------------------------------
+#  Recherche par plage horaire (segments archivés + monitor.log)
+#
+#  Les lignes sont triées par horodatage : on ne lit jamais tout.
+#    - segments : bisection sur l'index des blocs, lecture depuis le bon bloc
+#    - monitor.log : bisection sur les offsets du fichier
+#  Une ligne sans horodatage (suite d'un message) hérite de la précédente.
+# ----------------------------------------------------------------------
+
+# Pseudo-niveau : lignes signalant une erreur, quel que soit leur tag
+ERROR_LEVEL = "ERREUR"
+ERROR_WORDS = ("erreur", "error", "échec", "échou", "❌")
+
+
+def line_tag(line: str) -> str:
+    """Tag "[XXX]" qui suit l'horodatage ("INFO" si absent)."""
+    rest = line[22:]
+    if rest.startswith("["):
+        end = rest.find("]")
+        if end > 0:
+            return rest[1:end].upper()
+    return "INFO"
+
+
+def _seek_time(f, size: int, start: float) -> int:
+    """Offset de la première ligne horodatée >= start (fichier trié, ouvert en binaire)."""
+    lo, hi = 0, size
+    while lo < hi:
+        mid = (lo + hi) // 2
+        f.seek(max(0, mid - 1))
+        if mid:
+            f.readline()  # début de la ligne suivante (ou mid lui-même)
+        t = None
+        while t is None:
+            line = f.readline()
+            if not line:
+                break
+            t = parse_ts(line)
+        if t is None or t >= start:
+            hi = mid
+        else:
+            lo = mid + 1
+    f.seek(max(0, lo - 1))
+    if lo:
+        f.readline()
+    return f.tell()
+
+
+def _in_range(lines, start: float, end: float, cur: Optional[float] = None) -> Iterator[Tuple[float, str]]:
+    for raw in lines:
+        t = parse_ts(raw)
+        if t is not None:
+            cur = t
+        if cur is None or cur < start:
+            continue
+        if cur > end:
+            return
+        yield cur, raw.decode("utf-8", "replace").rstrip("\n")
+
+
+def iter_range(log_file: str, start: float, end: float) -> Iterator[Tuple[float, str]]:
+    """(epoch, ligne) de start à end inclus, dans l'ordre chronologique."""
+    for seg in list_segments(log_file):
+        if seg["last"] is not None and seg["last"] < start:
+            continue
+        if seg["first"] is not None and seg["first"] > end:
+            return
+        # Dernier bloc commençant avant start : les lignes à start peuvent y débuter
+        epochs = [b[0] if b[0] is not None else 0 for b in seg["blocks"]]
+        block = max(0, bisect_left(epochs, start) - 1)
+        try:
+            with open_segment(seg, block) as f:
+                yield from _in_range(f, start, end)
+        except (OSError, EOFError, lzma.LZMAError):
+            continue
+
+    try:
+        f = open(log_file, "rb")
+    except OSError:
+        return
+    with f:
+        size = os.fstat(f.fileno()).st_size
+        f.seek(_seek_time(f, size, start))
+        yield from _in_range(f, start, end)
+
+
+def search(log_file: str, start: float, end: float, q: str = "", level: str = "") -> Iterator[Tuple[float, str]]:
+    """iter_range() filtré : texte (insensible à la casse) et tag / ERREUR."""
+    q = (q or "").lower()
+    level = (level or "").upper()
+    for t, line in iter_range(log_file, start, end):
+        if q and q not in line.lower():
+            continue
+        if level:
+            if level == ERROR_LEVEL:
+                low = line.lower()
+                if not any(w in low for w in ERROR_WORDS):
+                    continue
+            elif line_tag(line) != level:
+                continue
+        yield t, line
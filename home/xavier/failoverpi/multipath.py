@@ -0,0 +1,233 @@
+"""
+Mode actif/actif (route_mode = "multipath" dans config.json) : au lieu d'un
+seul lien, une route par défaut multichemin pondérée sur tous les liens OK.
+
+    ip route replace default metric 10 \\
+        nexthop via 192.168.0.254 dev eth0 weight 8 \\
+        nexthop dev wwan0 weight 2
+
+Poids d'un lien : weight de la table links (défaut 10, 3 si facturé au
+volume), réduit par la perte et le RTT mesurés sur la fenêtre de qualité,
+et par la part de quota restante. Chaque flux reste sur un seul lien
+(hash L4 : net.ipv4.fib_multipath_hash_policy=1).
+
+Règles de routage par lien (table 100 + rang dans la table links) :
+    fwmark <mark> lookup <table>           trafic marqué (nft / iptables) forcé sur le lien
+    from <adresse du lien> lookup <table>  les réponses repartent par le lien d'arrivée
+
+Retrait rapide d'un lien, sans attendre le cycle du monitor :
+  - porteuse perdue : le noyau ignore le saut (ignore_routes_with_linkdown=1)
+    et LinkWatcher (netlink RTMGRP_LINK) fait reconstruire la route ;
+  - sonde légère (DNS / TCP, dans le processus) toutes les
+    multipath_probe_interval s, lien retiré après multipath_fail_count échecs.
+Un lien retiré ne revient qu'au cycle suivant, sur verdict du quorum.
+"""
+import socket
+import struct
+import fcntl
+import threading
+from typing import Callable, Dict, List, Optional
+
+from .probes import parse_probe
+
+ROUTE_MODES = ("failover", "multipath")
+
+# Poids max d'un saut (noyau : 1..256)
+WEIGHT_MAX = 256
+
+# Tables de routage par lien et priorités des règles (ip rule pref)
+TABLE_BASE = 100
+PREF_FWMARK = 1000
+PREF_SOURCE = 1100
+
+SYSCTLS = (
+    "net.ipv4.fib_multipath_hash_policy=1",
+    "net.ipv4.conf.all.ignore_routes_with_linkdown=1",
+)
+
+# ----------------------------------------------------------------------
+#  Poids
+# ----------------------------------------------------------------------
+def base_weight(link: dict) -> int:
+    return link.get("weight") or (3 if link["cost"] == "metered" else 10)
+
+
+def link_weight(link: dict, stats: Optional[dict], cfg: dict, quota: Optional[float] = None) -> int:
+    """
+    Poids du lien (0 = hors de la route) :
+      base x (100 - perte %) / 100 x min(1, multipath_rtt_ref_ms / RTT) x quota restant (0..1)
+    """
+    w = float(base_weight(link))
+    stats = stats or {}
+    if stats.get("loss_pct") is not None:
+        w *= max(0.0, 100 - stats["loss_pct"]) / 100
+    ref, rtt = cfg.get("multipath_rtt_ref_ms") or 0, stats.get("rtt_ms")
+    if ref and rtt and rtt > ref:
+        w *= ref / rtt
+    if quota is not None:
+        w *= max(0.0, min(1.0, quota))
+    if w <= 0:
+        return 0
+    return min(WEIGHT_MAX, max(1, round(w)))
+
+
+def weights(members: List[dict], stats: Dict[str, dict], cfg: dict,
+            quotas: Optional[Dict[str, float]] = None) -> Dict[str, int]:
+    """{nom: poids} des liens de la route ; un lien seul garde au moins 1."""
+    quotas = quotas or {}
+    out = {l["name"]: link_weight(l, stats.get(l["name"]), cfg, quotas.get(l["name"])) for l in members}
+    if members and not any(out.values()):
+        out[members[0]["name"]] = 1
+    return out
+
+
+def fmt_weights(links: List[dict], w: Dict[str, int]) -> str:
+    """"Freebox 8 / 4G 2" pour les logs."""
+    return " / ".join(f"{l['label']} {w[l['name']]}" for l in links if w.get(l["name"]))
+
+
+# ----------------------------------------------------------------------
+#  Commandes ip (sans sudo)
+# ----------------------------------------------------------------------
+def _via(link: dict) -> str:
+    return f"via {link['gateway']} " if link["gateway"] else ""
+
+
+def route_command(members: List[dict], w: Dict[str, int], metric: int) -> Optional[str]:
+    """ip route replace ... pour les liens de poids > 0 (None si aucun)."""
+    hops = [l for l in members if w.get(l["name"])]
+    if not hops:
+        return None
+    if len(hops) == 1:
+        return f"ip route replace default {_via(hops[0])}dev {hops[0]['interface']} metric {metric}"
+    nexthops = " ".join(f"nexthop {_via(l)}dev {l['interface']} weight {w[l['name']]}" for l in hops)
+    return f"ip route replace default metric {metric} {nexthops}"
+
+
+def table_of(link: dict, rank: int) -> int:
+    return link.get("table") or TABLE_BASE + rank
+
+
+def fwmark_of(link: dict, rank: int) -> int:
+    return link.get("fwmark") or rank + 1
+
+
+def policy_commands(link: dict, rank: int, addr: Optional[str]) -> List[str]:
+    """Table du lien + règles fwmark / adresse source (anciennes règles de même priorité remplacées)."""
+    table = table_of(link, rank)
+    cmds = [
+        f"ip route replace default {_via(link)}dev {link['interface']} table {table}",
+        f"ip rule del pref {PREF_FWMARK + rank}",
+        f"ip rule add fwmark {fwmark_of(link, rank)} lookup {table} pref {PREF_FWMARK + rank}",
+        f"ip rule del pref {PREF_SOURCE + rank}",
+    ]
+    if addr:
+        cmds.append(f"ip rule add from {addr} lookup {table} pref {PREF_SOURCE + rank}")
+    return cmds
+
+
+def cleanup_commands(count: int) -> List[str]:
+    """Retire les règles posées pour `count` liens (retour au mode failover)."""
+    return [f"ip rule del pref {pref + rank}" for rank in range(count) for pref in (PREF_FWMARK, PREF_SOURCE)]
+
+
+def iface_addr(iface: str) -> Optional[str]:
+    """Adresse IPv4 de l'interface (ioctl SIOCGIFADDR, sans lancer ip), None si aucune."""
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        res = fcntl.ioctl(s.fileno(), 0x8915, struct.pack("256s", iface.encode()[:15]))
+        return socket.inet_ntoa(res[20:24])
+    except OSError:
+        return None
+    finally:
+        s.close()
+
+
+def fast_probe_spec(specs: List[str]) -> Optional[str]:
+    """Première sonde DNS / TCP du lien (pas de sous-process), à défaut la première sonde."""
+    valid = []
+    for spec in specs:
+        try:
+            kind = parse_probe(spec)[0]
+        except ValueError:
+            continue
+        if kind in ("dns", "tcp"):
+            return spec
+        valid.append(spec)
+    return valid[0] if valid else None
+
+
+# ----------------------------------------------------------------------
+#  Porteuse des interfaces (netlink)
+# ----------------------------------------------------------------------
+RTMGRP_LINK = 1
+RTM_NEWLINK, RTM_DELLINK = 16, 17
+IFLA_IFNAME = 3
+IFF_RUNNING = 0x40
+IFF_LOWER_UP = 0x10000
+
+
+class LinkWatcher:
+    """
+    Abonnement netlink aux changements d'état des interfaces : callback(iface,
+    running) dès qu'une interface perd (ou retrouve) sa porteuse, ou disparaît
+    (modem 4G réinitialisé, câble débranché).
+    """
+
+    def __init__(self, callback: Callable[[str, bool], None]):
+        self.callback = callback
+        self._thread: Optional[threading.Thread] = None
+        self._running: Dict[str, bool] = {}
+
+    def start(self) -> bool:
+        if self._thread is not None:
+            return True
+        try:
+            sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE)
+            sock.bind((0, RTMGRP_LINK))
+        except (OSError, AttributeError):
+            return False
+        self._thread = threading.Thread(target=self._loop, args=(sock,), name="netlink-link", daemon=True)
+        self._thread.start()
+        return True
+
+    @staticmethod
+    def parse(data: bytes):
+        """Messages RTM_NEWLINK / RTM_DELLINK -> [(iface, running)]."""
+        out = []
+        offset = 0
+        while offset + 16 <= len(data):
+            length, msg_type = struct.unpack_from("=IH", data, offset)
+            if length < 16:
+                break
+            if msg_type in (RTM_NEWLINK, RTM_DELLINK) and length >= 32:
+                flags = struct.unpack_from("=I", data, offset + 24)[0]
+                name = None
+                pos = offset + 32
+                while pos + 4 <= offset + length:
+                    rta_len, rta_type = struct.unpack_from("=HH", data, pos)
+                    if rta_len < 4:
+                        break
+                    if rta_type == IFLA_IFNAME:
+                        name = data[pos + 4:pos + rta_len].split(b"\0", 1)[0].decode(errors="replace")
+                    pos += (rta_len + 3) & ~3
+                if name:
+                    running = msg_type == RTM_NEWLINK and bool(flags & IFF_RUNNING) and bool(flags & IFF_LOWER_UP)
+                    out.append((name, running))
+            offset += (length + 3) & ~3
+        return out
+
+    def _loop(self, sock):
+        while True:
+            try:
+                data = sock.recv(65536)
+            except OSError:
+                continue
+            for iface, running in self.parse(data):
+                if self._running.get(iface) == running:
+                    continue
+                self._running[iface] = running
+                try:
+                    self.callback(iface, running)
+                except Exception:
+                    pass
@@ -0,0 +1,285 @@
+"""
+Accès Internet d'un lien jugé par un quorum de sondes : plusieurs cibles
+ICMP (anycast), une requête DNS et une connexion TCP, toutes liées à
+l'interface (ping -I, SO_BINDTODEVICE).
+
+    verdict = run_quorum("eth0", ["icmp:8.8.8.8", "icmp:1.1.1.1", "dns:1.1.1.1", "tcp:1.1.1.1:443"], k=3)
+    verdict["up"], verdict["ok"], verdict["total"], verdict["elapsed_ms"]
+
+Les sondes démarrent à STAGGER d'intervalle (façon happy eyeballs) et
+tournent en parallèle ; le verdict tombe dès que k réussites sont acquises
+(lien OK) ou que k ne peut plus être atteint (lien KO). Les sondes encore en
+cours sont abandonnées, celles pas encore lancées ne partent pas.
+
+Un filtre ICMP ou une panne chez Google ne suffit plus à déclencher une
+bascule ; une box qui répond au ping sans rien router d'autre est vue KO.
+"""
+import time
+import queue
+import random
+import socket
+import struct
+import threading
+import subprocess
+from typing import List, Optional
+
+from .quality import parse_ping
+
+PROBE_KINDS = ("icmp", "dns", "tcp")
+
+# Décalage entre deux départs de sondes (s) : sur une ligne saine, les
+# premières réponses arrivent avant que les dernières sondes ne partent.
+STAGGER = 0.05
+
+# Linux >= 5.7 : autorisé sans privilège tant que le socket n'est pas lié
+SO_BINDTODEVICE = getattr(socket, "SO_BINDTODEVICE", 25)
+
+
+class ProbeUnsupported(Exception):
+    """Sonde impossible sur ce système (exclue du quorum)."""
+
+
+def parse_probe(spec: str):
+    """"icmp:8.8.8.8" / "dns:1.1.1.1" / "tcp:1.1.1.1:443" -> (type, hôte, port)."""
+    kind, _, rest = spec.strip().partition(":")
+    kind = kind.lower()
+    if kind not in PROBE_KINDS or not rest:
+        raise ValueError(f"sonde invalide : {spec}")
+    if kind == "tcp":
+        host, _, port = rest.rpartition(":")
+        if not host or not port.isdigit():
+            raise ValueError(f"sonde TCP sans port : {spec}")
+        return kind, host, int(port)
+    return kind, rest, 53 if kind == "dns" else None
+
+
+def first_icmp_target(specs: List[str], default: str = "8.8.8.8") -> str:
+    for spec in specs:
+        try:
+            kind, host, _ = parse_probe(spec)
+        except ValueError:
+            continue
+        if kind == "icmp":
+            return host
+    return default
+
+
+# ----------------------------------------------------------------------
+#  Sondes (une par thread ; renvoient la durée en ms ou lèvent une exception)
+# ----------------------------------------------------------------------
+def _bound_socket(iface: str, kind: int) -> socket.socket:
+    s = socket.socket(socket.AF_INET, kind)
+    try:
+        s.setsockopt(socket.SOL_SOCKET, SO_BINDTODEVICE, iface.encode())
+    except PermissionError:
+        s.close()
+        raise ProbeUnsupported("SO_BINDTODEVICE refusé (noyau < 5.7)")
+    return s
+
+
+def probe_icmp(iface: str, host: str, timeout: float, cancel: threading.Event) -> float:
+    """Un ping (-c 1), tué si le verdict tombe avant la réponse."""
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(
+        ["ping", "-I", iface, "-c", "1", "-W", str(max(1, round(timeout))), host],
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+    )
+    deadline = time.monotonic() + timeout + 1
+    try:
+        while proc.poll() is None:
+            if cancel.is_set() or time.monotonic() > deadline:
+                raise TimeoutError("annulé" if cancel.is_set() else "timeout")
+            cancel.wait(0.01)
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+    out = proc.stdout.read()
+    proc.stdout.close()
+    if proc.returncode != 0:
+        raise OSError("pas de réponse")
+    rtt = parse_ping(out)[2]
+    return rtt if rtt is not None else (time.perf_counter() - t0) * 1000
+
+
+def _dns_query(name: str, qid: int) -> bytes:
+    header = struct.pack(">HHHHHH", qid, 0x0100, 1, 0, 0, 0)  # RD, 1 question
+    qname = b"".join(bytes([len(p)]) + p.encode("ascii") for p in name.strip(".").split(".")) + b"\0"
+    return header + qname + struct.pack(">HH", 1, 1)  # A, IN
+
+
+def probe_dns(iface: str, server: str, timeout: float, name: str) -> float:
+    """Requête A en UDP ; toute réponse valide (y compris NXDOMAIN) compte."""
+    qid = random.randrange(1 << 16)
+    s = _bound_socket(iface, socket.SOCK_DGRAM)
+    try:
+        t0 = time.perf_counter()
+        deadline = time.monotonic() + timeout
+        s.sendto(_dns_query(name, qid), (server, 53))
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError("timeout")
+            s.settimeout(remaining)
+            data, addr = s.recvfrom(2048)
+            if len(data) < 12 or addr[0] != server:
+                continue
+            rid, flags = struct.unpack(">HH", data[:4])
+            if rid != qid or not flags & 0x8000:
+                continue
+            if flags & 0x000F not in (0, 3):
+                raise OSError(f"rcode {flags & 0x000F}")
+            return (time.perf_counter() - t0) * 1000
+    finally:
+        s.close()
+
+
+def probe_tcp(iface: str, host: str, port: int, timeout: float) -> float:
+    """Connexion TCP complète (SYN / SYN-ACK / ACK), fermée aussitôt."""
+    s = _bound_socket(iface, socket.SOCK_STREAM)
+    try:
+        s.settimeout(timeout)
+        t0 = time.perf_counter()
+        s.connect((host, port))
+        return (time.perf_counter() - t0) * 1000
+    finally:
+        s.close()
+
+
+def _run_probe(spec: str, iface: str, timeout: float, dns_name: str, cancel: threading.Event) -> dict:
+    result = {"probe": spec, "ok": False, "ms": None, "error": None}
+    try:
+        kind, host, port = parse_probe(spec)
+        if kind == "icmp":
+            ms = probe_icmp(iface, host, timeout, cancel)
+        elif kind == "dns":
+            ms = probe_dns(iface, host, timeout, dns_name)
+        else:
+            ms = probe_tcp(iface, host, port, timeout)
+        result.update(ok=True, ms=round(ms, 1))
+    except ProbeUnsupported as e:
+        result.update(error=str(e), unsupported=True)
+    except socket.timeout:
+        result["error"] = "timeout"
+    except Exception as e:
+        result["error"] = str(e) or e.__class__.__name__
+    return result
+
+
+def probe_once(iface: str, spec: str, timeout: float = 1, dns_name: str = "example.com") -> dict:
+    """Une seule sonde, hors quorum : {"probe", "ok", "ms", "error"}."""
+    return _run_probe(spec, iface, timeout, dns_name, threading.Event())
+
+
+# ----------------------------------------------------------------------
+#  Quorum
+# ----------------------------------------------------------------------
+def run_quorum(iface: str, specs: List[str], k: int, timeout: float = 2,
+               dns_name: str = "example.com", stagger: float = STAGGER) -> dict:
+    """
+    Lance les sondes de `specs` sur `iface` et rend le verdict k-sur-n :
+      {"up": bool, "ok": 3, "failed": 0, "total": 5, "quorum": 3,
+       "elapsed_ms": 41.2, "rtt_ms": 9.8, "results": [...]}
+    rtt_ms : plus petit RTT ICMP obtenu (None si aucun).
+    Les sondes non supportées sont retirées de n (k ramené à n si besoin).
+    """
+    t0 = time.perf_counter()
+    results: queue.Queue = queue.Queue()
+    cancel = threading.Event()
+    done, started = [], 0
+    total = len(specs)
+
+    def worker(spec):
+        results.put(_run_probe(spec, iface, timeout, dns_name, cancel))
+
+    def verdict():
+        ok = sum(1 for r in done if r["ok"])
+        failed = sum(1 for r in done if not r["ok"] and not r.get("unsupported"))
+        n = total - sum(1 for r in done if r.get("unsupported"))
+        need = max(1, min(k, n))
+        if n == 0:
+            return False, ok, failed, n, need
+        if ok >= need:
+            return True, ok, failed, n, need
+        if failed > n - need:
+            return False, ok, failed, n, need
+        return None, ok, failed, n, need
+
+    deadline = time.monotonic() + timeout + 1
+    up = None
+    while up is None:
+        # Départ échelonné : la sonde suivante part après `stagger` sans verdict
+        if started < total:
+            threading.Thread(target=worker, args=(specs[started],), name=f"probe-{iface}", daemon=True).start()
+            started += 1
+            wait = stagger if started < total else None
+        else:
+            wait = None
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            done.append(results.get(timeout=min(wait, remaining) if wait is not None else remaining))
+            while True:
+                done.append(results.get_nowait())
+        except queue.Empty:
+            pass
+        up = verdict()[0]
+        if up is None and started >= total and len(done) >= total:
+            break
+
+    cancel.set()
+    up, ok, failed, n, need = verdict()
+    rtts = [r["ms"] for r in done if r["ok"] and r["probe"].startswith("icmp:")]
+    return {
+        "up": bool(up),
+        "ok": ok,
+        "failed": failed,
+        "total": n,
+        "quorum": need,
+        "elapsed_ms": round((time.perf_counter() - t0) * 1000, 1),
+        "rtt_ms": min(rtts) if rtts else None,
+        "results": done,
+        "pending": [s for s in specs if s not in {r["probe"] for r in done}],
+    }
+
+
+def fmt_verdict(v: dict) -> str:
+    """"3/5 en 41 ms" pour la ligne [STATUS]."""
+    return f"{v['ok']}/{v['total']} en {v['elapsed_ms']:.0f} ms"
+
+
+def fmt_failures(v: dict) -> str:
+    """Sondes en échec : "icmp:8.8.8.8 (timeout), dns:8.8.8.8 (timeout)"."""
+    return ", ".join(f"{r['probe']} ({r['error']})" for r in v["results"] if not r["ok"])
+
+
+class PingSampler:
+    """
+    Ping de mesure de qualité (N paquets) lancé en arrière-plan pour ne pas
+    retarder le verdict ; son résultat est relevé au cycle suivant.
+    """
+
+    def __init__(self, iface: str):
+        self.iface = iface
+        self.proc: Optional[subprocess.Popen] = None
+
+    def collect(self):
+        """(envoyés, reçus, RTT, mdev) du ping terminé, None si rien (ou encore en cours)."""
+        if self.proc is None or self.proc.poll() is None:
+            return None
+        out = self.proc.stdout.read()
+        self.proc.stdout.close()
+        self.proc = None
+        return parse_ping(out)
+
+    def start(self, host: str, count: int, timeout: int = 2):
+        if self.proc is not None:
+            return
+        args = ["ping", "-I", self.iface, "-c", str(count), "-W", str(timeout), host]
+        if count > 2:
+            args[3:3] = ["-i", "0.2"]
+        try:
+            self.proc = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        except Exception:
+            self.proc = None
@@ -0,0 +1,173 @@
+"""
+Qualité des liens (perte, RTT, gigue) sur une fenêtre glissante de cycles,
+et détection de « brownout » : un lien joignable mais trop dégradé pour
+qu'on y laisse passer le trafic.
+
+    q = LinkQuality(window=10)
+    q.add(*parse_ping(out))          # un échantillon par cycle du monitor
+    q.stats()                        # {"loss_pct": 40.0, "rtt_ms": 850.2, "jitter_ms": 120.4, "samples": 10, ...}
+
+    b = Brownout()
+    b.update(q.stats(), cfg, time.time())   # True si l'état (dégradé ou non) change
+
+Seuils (config.json, 0 = critère ignoré) :
+  brownout_loss_pct / brownout_rtt_ms / brownout_jitter_ms : entrée en dégradation,
+      à tenir pendant brownout_dwell secondes ;
+  recover_loss_pct / recover_rtt_ms / recover_jitter_ms : seuils de retour, plus
+      bas (hystérésis), tous respectés pendant recover_dwell secondes.
+"""
+import re
+from collections import deque
+from typing import List, Optional, Tuple
+
+# Échantillons minimum dans la fenêtre avant de juger un lien
+MIN_SAMPLES = 3
+
+# Clés config.json réglables depuis le dashboard (/config)
+CONFIG_KEYS = (
+    "quality_window",
+    "brownout_loss_pct", "brownout_rtt_ms", "brownout_jitter_ms", "brownout_dwell",
+    "recover_loss_pct", "recover_rtt_ms", "recover_jitter_ms", "recover_dwell",
+)
+
+_SENT_RE = re.compile(r"(\d+) packets transmitted, (\d+) (?:packets )?received")
+_RTT_RE = re.compile(r"= [\d.]+/([\d.]+)/[\d.]+/([\d.]+) ms")
+
+
+def parse_ping(out: str) -> Tuple[int, int, Optional[float], Optional[float]]:
+    """
+    (envoyés, reçus, RTT moyen ms, mdev ms) depuis la sortie de ping (iputils / busybox).
+    RTT / mdev à None si aucune réponse.
+    """
+    sent = received = 0
+    avg = mdev = None
+    m = _SENT_RE.search(out or "")
+    if m:
+        sent, received = int(m.group(1)), int(m.group(2))
+    m = _RTT_RE.search(out or "")
+    if m:
+        avg, mdev = float(m.group(1)), float(m.group(2))
+    return sent, received, avg, mdev
+
+
+class LinkQuality:
+    """Fenêtre des `window` derniers échantillons (un par cycle) d'un lien."""
+
+    def __init__(self, window: int = 10):
+        self.samples = deque(maxlen=max(1, window))
+
+    def resize(self, window: int):
+        window = max(1, window)
+        if window != self.samples.maxlen:
+            self.samples = deque(self.samples, maxlen=window)
+
+    def add(self, sent: int, received: int, rtt_ms: Optional[float] = None, mdev_ms: Optional[float] = None):
+        if sent > 0:
+            self.samples.append((sent, received, rtt_ms, mdev_ms))
+
+    def stats(self) -> dict:
+        """
+        loss_pct  : paquets perdus / envoyés sur la fenêtre ;
+        rtt_ms    : RTT moyen pondéré par les réponses ;
+        jitter_ms : écart moyen entre RTT moyens successifs (variation d'un
+                    cycle à l'autre), à défaut mdev moyen de ping.
+        """
+        samples = list(self.samples)
+        sent = sum(s[0] for s in samples)
+        received = sum(s[1] for s in samples)
+        rtts = [(s[1], s[2]) for s in samples if s[1] and s[2] is not None]
+        weight = sum(n for n, _ in rtts)
+        rtt = sum(n * r for n, r in rtts) / weight if weight else None
+
+        series = [r for _, r in rtts]
+        if len(series) >= 2:
+            jitter = sum(abs(b - a) for a, b in zip(series, series[1:])) / (len(series) - 1)
+        else:
+            mdevs = [s[3] for s in samples if s[3] is not None]
+            jitter = sum(mdevs) / len(mdevs) if mdevs else None
+
+        return {
+            "samples": len(samples),
+            "sent": sent,
+            "received": received,
+            "loss_pct": round(100.0 * (sent - received) / sent, 1) if sent else None,
+            "rtt_ms": None if rtt is None else round(rtt, 1),
+            "jitter_ms": None if jitter is None else round(jitter, 1),
+        }
+
+
+def _breaches(stats: dict, cfg: dict, prefix: str) -> List[str]:
+    out = []
+    for key, label, unit in (("loss_pct", "perte", "%"), ("rtt_ms", "RTT", " ms"), ("jitter_ms", "gigue", " ms")):
+        limit = cfg.get(f"{prefix}_{key}") or 0
+        value = stats.get(key)
+        if limit and value is not None and value >= limit:
+            out.append(f"{label} {value:g}{unit} ≥ {limit}{unit}")
+    return out
+
+
+def degraded_reasons(stats: Optional[dict], cfg: dict) -> List[str]:
+    """Seuils brownout_* dépassés (vide si assez d'échantillons et rien de dépassé)."""
+    if not stats or stats.get("samples", 0) < MIN_SAMPLES:
+        return []
+    if stats.get("received") == 0:
+        return ["aucune réponse"]
+    return _breaches(stats, cfg, "brownout")
+
+
+def is_good(stats: Optional[dict], cfg: dict) -> bool:
+    """Tous les seuils de retour recover_* respectés."""
+    if not stats or stats.get("samples", 0) < MIN_SAMPLES or not stats.get("received"):
+        return False
+    return not _breaches(stats, cfg, "recover")
+
+
+def fmt_quality(stats: Optional[dict]) -> str:
+    """"perte 12% RTT 85 ms gigue 20 ms (10 cycles)" pour les logs."""
+    if not stats or not stats.get("samples"):
+        return "pas de mesure"
+
+    def f(v, unit):
+        return "?" if v is None else f"{v:g}{unit}"
+
+    return (f"perte {f(stats['loss_pct'], '%')} RTT {f(stats['rtt_ms'], ' ms')} "
+            f"gigue {f(stats['jitter_ms'], ' ms')} ({stats['samples']} cycles)")
+
+
+class Brownout:
+    """
+    État dégradé d'un lien, avec hystérésis et temps de séjour minimal :
+    on n'entre en dégradation qu'après brownout_dwell secondes au-delà des
+    seuils brownout_*, on n'en sort qu'après recover_dwell secondes sous les
+    seuils recover_* (plus bas).
+    """
+
+    def __init__(self):
+        self.degraded = False
+        self.since = None        # début de l'état courant (time.time())
+        self._pending = None     # début du dépassement / retour en cours
+        self.reasons = []        # seuils dépassés au dernier passage en dégradation
+
+    def update(self, stats: Optional[dict], cfg: dict, now: float) -> bool:
+        """Prend en compte la fenêtre courante ; True si l'état vient de changer."""
+        if self.since is None:
+            self.since = now
+        if not self.degraded:
+            reasons = degraded_reasons(stats, cfg)
+            if not reasons:
+                self._pending = None
+                return False
+            self._pending = self._pending or now
+            if now - self._pending < cfg.get("brownout_dwell", 0):
+                return False
+            self.reasons = reasons
+        else:
+            if not is_good(stats, cfg):
+                self._pending = None
+                return False
+            self._pending = self._pending or now
+            if now - self._pending < cfg.get("recover_dwell", 0):
+                return False
+        self.degraded = not self.degraded
+        self.since, self._pending = now, None
+        return True
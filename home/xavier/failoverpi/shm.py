@@ -0,0 +1,97 @@
+import os
+import json
+import time
+import threading
+from typing import Optional
+
+# tmpfs : aucune écriture sur la carte SD, lecture en quelques microsecondes
+SHM_DIR = os.environ.get("FAILOVERPI_SHM", "/dev/shm/failoverpi")
+
+# État publié par le monitor à chaque cycle (et à chaque SMS)
+MONITOR_SNAPSHOT = os.path.join(SHM_DIR, "monitor.json")
+
+# Au-delà de N intervalles de check sans publication, le monitor est considéré arrêté
+STALE_CYCLES = 3
+
+
+class SharedSnapshot:
+    """
+    Instantané JSON partagé entre process via un fichier en mémoire (/dev/shm).
+
+    - un seul écrivain (le monitor) : publish() remplace le fichier par
+      rename atomique, un lecteur ne voit jamais un état à moitié écrit ;
+    - chaque publication porte un numéro de séquence croissant ("seq") et
+      l'heure de publication ("published") ;
+    - read() ne re-parse le JSON que si le fichier a changé (mtime + taille).
+    """
+
+    def __init__(self, path: str = MONITOR_SNAPSHOT):
+        self.path = path
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._cache_key = None
+        self._cache = None
+
+    # ------------------------------------------------------------------
+    #  Écrivain
+    # ------------------------------------------------------------------
+    def publish(self, data: dict) -> Optional[int]:
+        """Publie data (+ seq, published), renvoie le numéro de séquence ou None."""
+        with self._lock:
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                if not self._seq:
+                    # Monitor relancé : la séquence reprend après la dernière publiée
+                    self._seq = (self._read_file() or {}).get("seq", 0)
+                seq = self._seq + 1
+                payload = dict(data, seq=seq, published=round(time.time(), 3), pid=os.getpid())
+                tmp = f"{self.path}.{os.getpid()}.tmp"
+                with open(tmp, "w") as f:
+                    json.dump(payload, f, separators=(",", ":"))
+                os.replace(tmp, self.path)
+                self._seq = seq
+                return seq
+            except Exception:
+                return None
+
+    # ------------------------------------------------------------------
+    #  Lecteurs
+    # ------------------------------------------------------------------
+    def read(self) -> Optional[dict]:
+        """Dernier instantané publié (None si absent ou illisible)."""
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        key = (st.st_mtime_ns, st.st_size, st.st_ino)
+        with self._lock:
+            if key == self._cache_key:
+                return self._cache
+        data = self._read_file()
+        if data is None:
+            return None
+        with self._lock:
+            self._cache_key, self._cache = key, data
+        return data
+
+    def _read_file(self) -> Optional[dict]:
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except Exception:
+            return None
+
+    def age(self, data: Optional[dict] = None) -> Optional[float]:
+        """Secondes depuis la dernière publication (None si rien de publié)."""
+        data = self.read() if data is None else data
+        if not data:
+            return None
+        return max(0.0, time.time() - data.get("published", 0))
+
+
+def monitor_alive(data: Optional[dict]) -> bool:
+    """Vrai si l'instantané du monitor a été publié il y a moins de STALE_CYCLES checks."""
+    if not data:
+        return False
+    interval = data.get("check_interval") or 60
+    return time.time() - data.get("published", 0) <= STALE_CYCLES * interval
@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""
+Rapports de disponibilité (SLA) construits sur le journal events.jsonl.
+
+Les événements sont agrégés au fil de l'eau en compteurs par jour et par lien ;
+un rapport (jour / semaine / mois) ne fait que sommer des jours : O(jours),
+jamais O(mesures).
+
+Usage :
+    python3 -m failoverpi.sla [day|week|month] [--last N]
+"""
+import os
+import sys
+import copy
+import json
+import time
+import argparse
+import threading
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+from .journal import EVENTS_FILE, EventJournal
+from . import journal as ev
+
+SLA_FILE = "/home/xavier/sla_daily.json"
+
+# Liens suivis en up/down (toujours présents dans les rapports ; les autres
+# liens de la table links s'y ajoutent dès qu'ils ont un historique)
+UPDOWN_LINKS = ("freebox", "4g", "any")
+
+# Par où passe le trafic (nom du lien / none) : événements route_change du
+# monitor, ou dérivé de Freebox / 4G / brownout pour les journaux plus anciens
+ROUTE = "route"
+
+# Freebox joignable mais dégradée, trafic sur la 4G (on / off)
+BROWNOUT = "brownout"
+
+PERIODS = ("day", "week", "month")
+
+
+def _empty_state() -> dict:
+    return {"offset": 0, "last_id": 0, "links": {}, "days": {}}
+
+
+def route_of(freebox: Optional[str], lte: Optional[str], brownout: Optional[str] = None) -> str:
+    if freebox == "up" and not (brownout == "on" and lte == "up"):
+        return "freebox"
+    if lte == "up":
+        return "4g"
+    return "none"
+
+
+def _split_days(start: float, end: float):
+    """Découpe [start, end[ en morceaux (jour local 'YYYY-mm-dd', secondes)."""
+    while start < end:
+        d = datetime.fromtimestamp(start)
+        midnight = (datetime(d.year, d.month, d.day) + timedelta(days=1)).timestamp()
+        cut = min(end, midnight)
+        yield d.strftime("%Y-%m-%d"), cut - start
+        start = cut
+
+
+def _day(ts: float) -> str:
+    return datetime.fromtimestamp(ts).strftime("%Y-%m-%d")
+
+
+class SlaEngine:
+    """
+    Agrégats journaliers par lien, mis à jour incrémentalement depuis le journal.
+
+    days["2025-01-04"]["freebox"] = {
+        "up_s", "down_s",           temps passé dans chaque état
+        "outages",                  passages up -> down ce jour-là
+        "repairs", "repair_s",      coupures terminées ce jour-là et leur durée (MTTR)
+        "longest_s",                plus longue coupure terminée ce jour-là
+    }
+    days[...]["route"] = {"freebox_s", "4g_s", "none_s", "failovers", "failbacks", "failback_s"}
+        (un "<lien>_s" par lien ayant porté la route ; bascule = départ du lien principal)
+    days[...]["4g"] contient aussi "attempts" / "attempt_failures" (tentatives connect_4g.sh).
+
+    L'état (offset + dernier id lus, état courant de chaque lien) est sauvegardé avec
+    les agrégats : le monitor et le dashboard peuvent tous deux appeler update(),
+    le résultat est le même. Si le journal a été vidé ou restauré (ids non contigus),
+    tout est recalculé depuis le début.
+    """
+
+    def __init__(self, path: str = SLA_FILE, journal: Optional[EventJournal] = None):
+        self.path = path
+        self.journal = journal or EventJournal(EVENTS_FILE)
+        self._lock = threading.Lock()
+        self._state = None
+
+    # ------------------------------------------------------------------
+    #  Persistance
+    # ------------------------------------------------------------------
+    def _load(self) -> dict:
+        try:
+            with open(self.path, "r") as f:
+                state = json.load(f)
+            if "days" in state and "links" in state:
+                return state
+        except Exception:
+            pass
+        return _empty_state()
+
+    def _save(self):
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump(self._state, f, separators=(",", ":"))
+            os.replace(tmp, self.path)
+        except Exception:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+    # ------------------------------------------------------------------
+    #  Agrégation
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _add(state: dict, day: str, link: str, key: str, value: float = 1):
+        stats = state["days"].setdefault(day, {}).setdefault(link, {})
+        stats[key] = stats.get(key, 0) + value
+
+    def _close(self, state: dict, link: str, end: float):
+        """Comptabilise l'intervalle ouvert du lien jusqu'à end."""
+        cur = state["links"].get(link)
+        if not cur:
+            return
+        value, since = cur
+        for day, secs in _split_days(since, end):
+            self._add(state, day, link, f"{value}_s", secs)
+        cur[1] = max(since, end)
+
+    def _transition(self, state: dict, link: str, new: str, ts: float):
+        cur = state["links"].get(link)
+        if cur and cur[0] == new:
+            return
+        if cur:
+            old, since = cur
+            self._close(state, link, ts)
+            day = _day(ts)
+            if link == ROUTE:
+                primary = state.get("primary", "freebox")
+                if new not in (primary, "none"):
+                    self._add(state, day, link, "failovers")
+                if old not in (primary, "none") and new == primary:
+                    self._add(state, day, link, "failbacks")
+                    self._add(state, day, link, "failback_s", ts - since)
+            elif new == "down":
+                self._add(state, day, link, "outages")
+            elif old == "down":
+                dur = ts - since
+                self._add(state, day, link, "repairs")
+                self._add(state, day, link, "repair_s", dur)
+                stats = state["days"][day][link]
+                stats["longest_s"] = max(stats.get("longest_s", 0), dur)
+        state["links"][link] = [new, ts]
+
+    def _update_route(self, state: dict, ts: float):
+        if state.get("primary"):
+            return  # route donnée explicitement par le monitor (route_change)
+        fb = state["links"].get("freebox", [None])[0]
+        lte = state["links"].get("4g", [None])[0]
+        brownout = state["links"].get(BROWNOUT, [None])[0]
+        self._transition(state, ROUTE, route_of(fb, lte, brownout), ts)
+
+    def _apply(self, state: dict, e: dict):
+        ts, etype, link = e["ts"], e["type"], e.get("link")
+        if etype == ev.MONITOR_START:
+            # Pi éteint / monitor arrêté : si la dernière activité est connue,
+            # la coupure n'est comptée dans aucun état.
+            last_seen = e.get("last_seen")
+            for name in list(state["links"]):
+                self._close(state, name, last_seen or ts)
+                if last_seen:
+                    state["links"][name][1] = ts
+            if BROWNOUT in state["links"]:
+                self._transition(state, BROWNOUT, "off", ts)
+            fb, lte = e.get("freebox"), e.get("lte")
+            if e.get("links"):
+                for name, new in e["links"].items():
+                    self._transition(state, name, new, ts)
+                self._transition(state, "any", "up" if "up" in e["links"].values() else "down", ts)
+                self._update_route(state, ts)
+            elif fb and lte:
+                self._transition(state, "freebox", fb, ts)
+                self._transition(state, "4g", lte, ts)
+                self._transition(state, "any", "up" if "up" in (fb, lte) else "down", ts)
+                self._update_route(state, ts)
+        elif etype == ev.LTE_ATTEMPT:
+            self._add(state, _day(ts), link or "4g", "attempts")
+        elif etype == ev.LTE_ATTEMPT_FAILED:
+            self._add(state, _day(ts), link or "4g", "attempt_failures")
+        elif etype == ev.ROUTE_CHANGE and e.get("new"):
+            state["primary"] = e.get("primary") or "freebox"
+            self._transition(state, ROUTE, e["new"], ts)
+        elif link == BROWNOUT and e.get("new") in ("on", "off"):
+            self._transition(state, link, e["new"], ts)
+            self._update_route(state, ts)
+        elif link not in (ROUTE, "monitor") and e.get("new") in ("up", "down"):
+            # Lien encore inconnu (ex : modem, absent de monitor_start) : l'état
+            # précédent est celui de l'événement, la coupure est bien comptée
+            if link not in state["links"] and e.get("prev") in ("up", "down"):
+                state["links"][link] = [e["prev"], ts]
+            self._transition(state, link, e["new"], ts)
+            if link != "any":
+                self._update_route(state, ts)
+
+    def update(self) -> int:
+        """Intègre les nouveaux événements du journal ; renvoie leur nombre."""
+        with self._lock:
+            if self._state is None:
+                self._state = self._load()
+            state = self._state
+            applied = 0
+            while True:
+                events, offset = self.journal.read_from(state["offset"], 1000)
+                if not events:
+                    if offset < state["offset"]:
+                        # Journal vidé : on repart de zéro
+                        self._state = state = _empty_state()
+                    break
+                if state["offset"] and events[0].get("id") != state["last_id"] + 1:
+                    # Journal restauré / tronqué : recalcul complet
+                    self._state = state = _empty_state()
+                    continue
+                for e in events:
+                    try:
+                        self._apply(state, e)
+                    except (KeyError, TypeError, ValueError):
+                        pass
+                    state["last_id"] = e.get("id", state["last_id"])
+                state["offset"] = offset
+                applied += len(events)
+            if applied:
+                self._save()
+            return applied
+
+    # ------------------------------------------------------------------
+    #  Rapports
+    # ------------------------------------------------------------------
+    def _days_until_now(self, now: float) -> Dict[str, dict]:
+        """Agrégats journaliers, intervalles en cours clos (virtuellement) à now."""
+        state = {"days": {}, "links": copy.deepcopy(self._state["links"])}
+        # Seuls les jours touchés par les intervalles ouverts sont copiés
+        oldest = min((since for _, since in state["links"].values()), default=now)
+        for day, stats in self._state["days"].items():
+            if day >= _day(oldest):
+                state["days"][day] = copy.deepcopy(stats)
+        for link in list(state["links"]):
+            self._close(state, link, now)
+        days = dict(self._state["days"])
+        days.update(state["days"])
+        return days
+
+    def report(self, period: str = "day", last: int = 7, now: Optional[float] = None) -> List[dict]:
+        """
+        Les `last` dernières périodes (jour / semaine ISO / mois), la plus récente
+        en premier, avec pour chaque lien : disponibilité %, coupures, MTTR,
+        plus longue coupure, et temps passé sur la 4G.
+        """
+        if period not in PERIODS:
+            period = "day"
+        now = now or time.time()
+        self.update()
+        with self._lock:
+            days = self._days_until_now(now)
+
+        today = datetime.fromtimestamp(now).date()
+        keys = []
+        for i in range(last):
+            if period == "day":
+                keys.append(today - timedelta(days=i))
+            elif period == "week":
+                keys.append(today - timedelta(days=today.weekday() + 7 * i))
+            else:
+                y, m = today.year, today.month - i
+                while m <= 0:
+                    y, m = y - 1, m + 12
+                keys.append(date(y, m, 1))
+
+        rows = []
+        for start in keys:
+            if period == "day":
+                end = start + timedelta(days=1)
+                label = start.strftime("%d/%m/%Y")
+            elif period == "week":
+                end = start + timedelta(days=7)
+                label = f"Semaine {start.isocalendar()[1]} ({start.strftime('%d/%m')})"
+            else:
+                end = date(start.year + start.month // 12, start.month % 12 + 1, 1)
+                label = start.strftime("%m/%Y")
+            totals = {}
+            d = start
+            while d < end:
+                for link, stats in days.get(d.strftime("%Y-%m-%d"), {}).items():
+                    acc = totals.setdefault(link, {})
+                    for k, v in stats.items():
+                        acc[k] = max(acc.get(k, 0), v) if k == "longest_s" else acc.get(k, 0) + v
+                d += timedelta(days=1)
+            rows.append(summarize(label, totals))
+        return rows
+
+
+def summarize(label: str, totals: dict) -> dict:
+    """Indicateurs lisibles à partir des compteurs sommés d'une période."""
+    row = {"label": label}
+    others = sorted(k for k in totals if k not in UPDOWN_LINKS and k not in (ROUTE, BROWNOUT))
+    for link in UPDOWN_LINKS + tuple(others):
+        s = totals.get(link, {})
+        observed = s.get("up_s", 0) + s.get("down_s", 0)
+        row[link] = {
+            "uptime_pct": round(100 * s.get("up_s", 0) / observed, 3) if observed else None,
+            "observed_s": round(observed),
+            "down_s": round(s.get("down_s", 0)),
+            "outages": int(s.get("outages", 0)),
+            "mttr_s": round(s["repair_s"] / s["repairs"]) if s.get("repairs") else None,
+            "longest_s": round(s.get("longest_s", 0)),
+        }
+    for link in ("4g",) + tuple(others):
+        row[link]["attempts"] = int(totals.get(link, {}).get("attempts", 0))
+        row[link]["attempt_failures"] = int(totals.get(link, {}).get("attempt_failures", 0))
+    r = totals.get(ROUTE, {})
+    row[ROUTE] = {
+        "freebox_s": round(r.get("freebox_s", 0)),
+        "4g_s": round(r.get("4g_s", 0)),
+        "none_s": round(r.get("none_s", 0)),
+        "failovers": int(r.get("failovers", 0)),
+        "failbacks": int(r.get("failbacks", 0)),
+        "mean_failback_s": round(r["failback_s"] / r["failbacks"]) if r.get("failbacks") else None,
+        "links_s": {k[:-2]: round(v) for k, v in r.items() if k.endswith("_s") and k != "failback_s"},
+    }
+    return row
+
+
+def fmt_duration(secs) -> str:
+    """3725 -> '1h02m05s' ; None -> '-'."""
+    if secs is None:
+        return "-"
+    secs = int(secs)
+    d, rem = divmod(secs, 86400)
+    h, rem = divmod(rem, 3600)
+    m, s = divmod(rem, 60)
+    if d:
+        return f"{d}j{h:02d}h{m:02d}m"
+    if h:
+        return f"{h}h{m:02d}m{s:02d}s"
+    if m:
+        return f"{m}m{s:02d}s"
+    return f"{s}s"
+
+
+# ----------------------------------------------------------------------
+#  CLI
+# ----------------------------------------------------------------------
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Rapport de disponibilité Freebox / 4G")
+    parser.add_argument("period", nargs="?", default="day", choices=PERIODS)
+    parser.add_argument("--last", type=int, default=7, help="nombre de périodes (défaut 7)")
+    parser.add_argument("--json", action="store_true", help="sortie JSON")
+    parser.add_argument("--events", default=EVENTS_FILE)
+    parser.add_argument("--state", default=SLA_FILE)
+    args = parser.parse_args(argv)
+
+    engine = SlaEngine(args.state, EventJournal(args.events))
+    rows = engine.report(args.period, max(1, args.last))
+    if args.json:
+        json.dump(rows, sys.stdout, indent=2, ensure_ascii=False)
+        print()
+        return 0
+
+    header = f"{'Période':<24}{'Freebox %':>10}{'Coupures':>10}{'MTTR':>10}{'+ longue':>10}{'Sur 4G':>10}{'Bascules':>10}{'Aucune':>10}"
+    print(header)
+    print("-" * len(header))
+    for r in rows:
+        fb = r["freebox"]
+        pct = "-" if fb["uptime_pct"] is None else f"{fb['uptime_pct']:.2f}"
+        print(
+            f"{r['label']:<24}{pct:>10}{fb['outages']:>10}{fmt_duration(fb['mttr_s']):>10}"
+            f"{fmt_duration(fb['longest_s'] or None):>10}{fmt_duration(r['route']['4g_s']):>10}"
+            f"{r['route']['failovers']:>10}{fmt_duration(r['route']['none_s']):>10}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
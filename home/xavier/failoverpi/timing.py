@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Mesure légère des temps d'exécution (spans) + histogrammes type HDR.
+
+    from failoverpi.timing import TIMINGS
+    with TIMINGS.span("check_status"):
+        ...
+
+Chaque nom de span a son histogramme (en microsecondes, précision ~6 %) :
+enregistrer une mesure coûte quelques opérations entières, sans allocation
+une fois le seau créé. Le monitor écrit régulièrement un résumé
+(p50 / p95 / p99) dans monitor_stats.json.
+
+Usage :
+    python3 -m failoverpi.timing [monitor_stats.json]
+"""
+import os
+import sys
+import json
+import time
+import threading
+from contextlib import contextmanager
+from typing import Dict
+
+STATS_FILE = "/home/xavier/monitor_stats.json"
+
+PERCENTILES = (50, 95, 99)
+
+
+class Histogram:
+    """
+    Histogramme log-linéaire (principe HDR) : chaque puissance de 2 est
+    découpée en 2**SUB_BITS seaux. Erreur relative < 1 / 2**SUB_BITS.
+    """
+
+    SUB_BITS = 4
+
+    __slots__ = ("counts", "count", "total", "min", "max")
+
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    @classmethod
+    def _key(cls, value: int) -> int:
+        shift = max(0, value.bit_length() - 1 - cls.SUB_BITS)
+        return (shift << (cls.SUB_BITS + 1)) | (value >> shift)
+
+    @classmethod
+    def _value(cls, key: int) -> float:
+        """Milieu du seau."""
+        shift = key >> (cls.SUB_BITS + 1)
+        mant = key & ((1 << (cls.SUB_BITS + 1)) - 1)
+        low = mant << shift
+        return low + ((1 << shift) - 1) / 2
+
+    def record(self, value: int):
+        value = max(1, int(value))
+        key = self._key(value)
+        self.counts[key] = self.counts.get(key, 0) + 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, p: float) -> float:
+        if not self.count:
+            return 0.0
+        target = max(1, -(-self.count * p // 100))  # arrondi supérieur
+        seen = 0
+        for key in sorted(self.counts):
+            seen += self.counts[key]
+            if seen >= target:
+                return min(self._value(key), self.max)
+        return float(self.max)
+
+    def summary(self) -> dict:
+        """Résumé en millisecondes."""
+        out = {
+            "count": self.count,
+            "min_ms": round((self.min or 0) / 1000, 3),
+            "mean_ms": round(self.total / self.count / 1000, 3) if self.count else 0.0,
+            "max_ms": round(self.max / 1000, 3),
+            "sum_ms": round(self.total / 1000, 3),
+        }
+        for p in PERCENTILES:
+            out[f"p{p}_ms"] = round(self.percentile(p) / 1000, 3)
+        return out
+
+
+class Timings:
+    """Registre de spans nommés, utilisable depuis plusieurs threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hists: Dict[str, Histogram] = {}
+        self.started = time.time()
+
+    def record(self, name: str, seconds: float):
+        with self._lock:
+            hist = self._hists.get(name)
+            if hist is None:
+                hist = self._hists[name] = Histogram()
+            hist.record(seconds * 1_000_000)
+
+    @contextmanager
+    def span(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - t0)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            spans = {name: h.summary() for name, h in sorted(self._hists.items())}
+        return {"since": round(self.started), "generated": round(time.time()), "spans": spans}
+
+    def dump(self, path: str = STATS_FILE) -> bool:
+        """Écriture atomique du résumé (JSON), True si OK."""
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump(self.snapshot(), f, indent=1)
+            os.replace(tmp, path)
+            return True
+        except Exception:
+            return False
+
+
+# Registre du process courant
+TIMINGS = Timings()
+
+
+# ----------------------------------------------------------------------
+#  CLI : affichage du dernier résumé écrit par le monitor
+# ----------------------------------------------------------------------
+def format_table(stats: dict) -> str:
+    cols = ("count", "p50_ms", "p95_ms", "p99_ms", "max_ms")
+    lines = [f"{'Span':<28}" + "".join(f"{c:>11}" for c in cols)]
+    lines.append("-" * len(lines[0]))
+    for name, s in stats.get("spans", {}).items():
+        lines.append(f"{name:<28}" + "".join(f"{s.get(c, 0):>11}" for c in cols))
+    return "\n".join(lines)
+
+
+def main(argv=None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    path = argv[0] if argv else STATS_FILE
+    try:
+        with open(path, "r") as f:
+            stats = json.load(f)
+    except Exception as e:
+        print(f"Impossible de lire {path} : {e}", file=sys.stderr)
+        return 1
+    since = time.strftime("%d/%m/%Y %H:%M:%S", time.localtime(stats.get("since", 0)))
+    generated = time.strftime("%d/%m/%Y %H:%M:%S", time.localtime(stats.get("generated", 0)))
+    print(f"Mesures depuis le {since} (écrit le {generated})")
+    print(format_table(stats))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+"""
+Consommation data des liens facturés au volume (cost "metered" : la 4G),
+lue dans les compteurs du noyau : /sys/class/net/<iface>/statistics/
+{rx,tx}_bytes, deux petites lectures de fichier, sans sous-process.
+
+    u = UsageMeter()
+    u.sample({"4g": "wwan0"}, time.time())     # octets échangés depuis la lecture précédente
+    u.period("4g", cfg["quota_reset_day"])     # (rx + tx depuis le début de la période, début)
+
+Les compteurs repartent de 0 quand l'interface est recréée (modem réinitialisé,
+connect_4g.sh) : une valeur plus petite que la précédente compte pour elle-même.
+Le trafic échangé entre la dernière lecture et la disparition de l'interface
+est perdu, d'où un intervalle de lecture court (usage_interval).
+
+usage.json, compact, réécrit au plus toutes les SAVE_INTERVAL s :
+    {"last":   {"4g": ["wwan0", rx, tx]},           dernière lecture des compteurs
+     "days":   {"2025-01-04": {"4g": [rx, tx]}},    USAGE_KEEP_DAYS jours
+     "months": {"2025-01": {"4g": [rx, tx]}},       mois calendaires, sans limite
+     "alerts": {"4g": ["2025-01-05", 80]}}          dernier seuil de quota alerté (par période)
+"""
+import os
+import json
+import threading
+from datetime import date, datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+USAGE_FILE = "/home/xavier/usage.json"
+
+# Jours conservés (une période de facturation complète + la précédente)
+USAGE_KEEP_DAYS = 62
+
+# Écriture de usage.json (carte SD) : au plus une fois par SAVE_INTERVAL s
+SAVE_INTERVAL = 300
+
+# Clés config.json réglables depuis le dashboard (/config)
+CONFIG_KEYS = ("quota_4g_mb", "quota_reset_day", "quota_failback_pct", "quota_recover_dwell")
+
+MB = 1024 * 1024
+
+
+def read_counters(iface: str) -> Optional[Tuple[int, int]]:
+    """(rx_bytes, tx_bytes) de l'interface, None si elle n'existe pas."""
+    base = f"/sys/class/net/{iface}/statistics"
+    try:
+        with open(f"{base}/rx_bytes") as f:
+            rx = int(f.read())
+        with open(f"{base}/tx_bytes") as f:
+            tx = int(f.read())
+        return rx, tx
+    except (OSError, ValueError):
+        return None
+
+
+def period_start(day: date, reset_day: int) -> date:
+    """Premier jour de la période de facturation contenant `day` (remise à zéro le reset_day du mois)."""
+    reset_day = min(28, max(1, reset_day))
+    if day.day >= reset_day:
+        return day.replace(day=reset_day)
+    prev = day.replace(day=1) - timedelta(days=1)
+    return prev.replace(day=reset_day)
+
+
+def fmt_bytes(n) -> str:
+    """"1,2 Go" / "350 Mo" pour les SMS et le dashboard."""
+    if n is None:
+        return "?"
+    if n >= 1024 * MB:
+        return f"{n / (1024 * MB):.1f} Go".replace(".", ",")
+    return f"{n / MB:.0f} Mo"
+
+
+class UsageMeter:
+    """Totaux rx / tx par lien, par jour et par mois, mis à jour par sample()."""
+
+    def __init__(self, path: str = USAGE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._state = self._load()
+        self._dirty = False
+        self._saved = 0.0
+
+    # ------------------------------------------------------------------
+    #  Persistance
+    # ------------------------------------------------------------------
+    def _load(self) -> dict:
+        try:
+            with open(self.path, "r") as f:
+                state = json.load(f)
+            if all(k in state for k in ("last", "days", "months")):
+                state.setdefault("alerts", {})
+                return state
+        except Exception:
+            pass
+        return {"last": {}, "days": {}, "months": {}, "alerts": {}}
+
+    def save(self, now: Optional[float] = None, force: bool = False):
+        """Écrit usage.json si des octets ont été comptés (au plus toutes les SAVE_INTERVAL s)."""
+        with self._lock:
+            if not self._dirty or (not force and now is not None and now - self._saved < SAVE_INTERVAL):
+                return
+            data = json.dumps(self._state, separators=(",", ":"))
+            self._dirty = False
+            self._saved = now or 0.0
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w") as f:
+                f.write(data)
+            os.replace(tmp, self.path)
+        except Exception:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+    # ------------------------------------------------------------------
+    #  Comptage
+    # ------------------------------------------------------------------
+    def sample(self, ifaces: Dict[str, str], now: float) -> Dict[str, int]:
+        """
+        Lit les compteurs de chaque lien {nom: interface} et ajoute les octets
+        échangés depuis la lecture précédente ; renvoie {nom: octets ajoutés}.
+        """
+        d = datetime.fromtimestamp(now)
+        day, month = d.strftime("%Y-%m-%d"), d.strftime("%Y-%m")
+        added = {}
+        with self._lock:
+            for name, iface in ifaces.items():
+                cur = read_counters(iface)
+                if cur is None:
+                    continue
+                last = self._state["last"].get(name)
+                self._state["last"][name] = [iface, cur[0], cur[1]]
+                self._dirty = True
+                if last is None or last[0] != iface:
+                    continue
+                # Compteur plus petit : interface recréée, il est reparti de 0
+                delta = [c - l if c >= l else c for c, l in zip(cur, last[1:])]
+                if not any(delta):
+                    continue
+                for bucket in (self._state["days"].setdefault(day, {}), self._state["months"].setdefault(month, {})):
+                    total = bucket.setdefault(name, [0, 0])
+                    total[0] += delta[0]
+                    total[1] += delta[1]
+                added[name] = sum(delta)
+            if day not in self._state["days"] or len(self._state["days"]) > USAGE_KEEP_DAYS:
+                oldest = (d.date() - timedelta(days=USAGE_KEEP_DAYS)).isoformat()
+                for k in [k for k in self._state["days"] if k < oldest]:
+                    del self._state["days"][k]
+        return added
+
+    def day(self, name: str, when: date) -> int:
+        with self._lock:
+            return sum(self._state["days"].get(when.isoformat(), {}).get(name, (0, 0)))
+
+    def month(self, name: str, when: date) -> int:
+        with self._lock:
+            return sum(self._state["months"].get(when.strftime("%Y-%m"), {}).get(name, (0, 0)))
+
+    def period(self, name: str, reset_day: int, today: Optional[date] = None) -> Tuple[int, date]:
+        """(octets depuis le début de la période de facturation en cours, premier jour)."""
+        start = period_start(today or date.today(), reset_day)
+        first = start.isoformat()
+        with self._lock:
+            total = sum(sum(v.get(name, (0, 0))) for k, v in self._state["days"].items() if k >= first)
+        return total, start
+
+    # ------------------------------------------------------------------
+    #  Seuils de quota
+    # ------------------------------------------------------------------
+    def crossed(self, name: str, pct: float, thresholds, start: date) -> Optional[int]:
+        """
+        Plus haut seuil (%) franchi et pas encore alerté sur cette période,
+        None sinon ; le seuil est alors marqué alerté.
+        """
+        reached = [t for t in thresholds if pct >= t]
+        if not reached:
+            return None
+        with self._lock:
+            prev = self._state["alerts"].get(name)
+            done = prev[1] if prev and prev[0] == start.isoformat() else 0
+            top = max(reached)
+            if top <= done:
+                return None
+            self._state["alerts"][name] = [start.isoformat(), top]
+            self._dirty = True
+        return top
+
+    def history(self, name: str, months: int = 12) -> Dict[str, int]:
+        """{"YYYY-mm": octets} des derniers mois, du plus ancien au plus récent."""
+        with self._lock:
+            keys = sorted(self._state["months"])[-months:]
+            return {k: sum(self._state["months"][k].get(name, (0, 0))) for k in keys}
@@ -2,11 +2,12 @@
 # ============================================================================
 #  Failover-Pi : Surveillance Freebox <-> 4G SIM7600E
 #
-#  - Surveille l'accès Internet via la Freebox (LAN + ping 8.8.8.8 via Freebox)
-#  - Surveille l'accès Internet via la 4G (ping 8.8.8.8 via wwan0)
-#  - Lance /home/xavier/connect_4g.sh en cas de perte Freebox
+#  - Surveille l'accès Internet de chaque lien de la table "links" de
+#    config.json (par défaut Freebox via eth0 + 4G via wwan0), en parallèle
+#  - Route par défaut sur le lien OK le plus prioritaire (hors liens dégradés)
+#  - Lance la commande de montage d'un lien KO (4G : /home/xavier/connect_4g.sh)
 #  - Envoie des SMS via /home/xavier/send_sms.py
-#  - Gère les messages :
+#  - Gère les messages (table par défaut) :
 #       ⚠️ La Freebox n’a plus d'accès à Internet.
 #       ✅ La connexion Internet Freebox est rétablie.
 #       📡 Connexion 4G établie (failover).
@@ -18,20 +19,55 @@
 import os
 import json
 import time
+import signal
+import queue
+import threading
 import subprocess
-from datetime import datetime
+from collections import deque
+from datetime import date, datetime
+
+from failoverpi.config import get_store
+from failoverpi import logs as logrotate
+from failoverpi import journal as ev
+from failoverpi import quality
+from failoverpi import probes
+from failoverpi import multipath
+from failoverpi import usage
+from failoverpi import hotplug
+from failoverpi.links import load_links, choose_route, no_connection_text
+from failoverpi.sla import SlaEngine
+from failoverpi.timing import TIMINGS
+from failoverpi.shm import SharedSnapshot, MONITOR_SNAPSHOT
 
 
 CONFIG_FILE = "/home/xavier/config.json"
 LOG_FILE = "/home/xavier/monitor.log"
 SMS_SCRIPT = "/home/xavier/send_sms.py"
-CONNECT_4G_SCRIPT = "/home/xavier/connect_4g.sh"
+EVENTS_FILE = "/home/xavier/events.jsonl"
+SLA_FILE = "/home/xavier/sla_daily.json"
+STATE_FILE = "/home/xavier/monitor_state.json"
+USAGE_FILE = "/home/xavier/usage.json"
+
+# Dernier état connu : réécrit à chaque changement, sinon au plus toutes les
+# 10 min (usure de la carte SD) ; last_seen sert aussi à dater un arrêt.
+STATE_HEARTBEAT = 600
+
+# Histogrammes de durées (spans) : résumé écrit toutes les 5 min, ou sur
+# demande avec `sudo systemctl kill -s USR1 failover-monitor`.
+STATS_FILE = "/home/xavier/monitor_stats.json"
+STATS_DUMP_INTERVAL = 300
+STATS_DUMP = threading.Event()
+
+# État courant + compteurs publiés en mémoire partagée (/dev/shm) pour le
+# dashboard (/metrics) : une lecture ne coûte ni ping ni écriture sur la SD.
+SNAPSHOT = SharedSnapshot(MONITOR_SNAPSHOT)
+STARTED = round(time.time())
 
-# Intervalle entre deux checks (en secondes)
-CHECK_INTERVAL = 60
+# Intervalle entre deux checks et délai minimal entre deux tentatives 4G :
+# clés "check_interval" / "min_4g_retry_delay" de config.json (60s / 90s).
 
-# Délai minimal entre deux tentatives d'activation 4G (en secondes)
-MIN_4G_RETRY_DELAY = 90
+# Réveil anticipé de la boucle principale (ex: config modifiée via /config)
+WAKE_UP = threading.Event()
 
 
 # ----------------------------------------------------------------------------
@@ -53,29 +89,168 @@ def log(msg: str):
         pass
 
 
+def rotate_logs(cfg: dict):
+    """Rotation taille/âge de monitor.log + purge des segments trop anciens."""
+    try:
+        res = logrotate.maybe_rotate(LOG_FILE, cfg)
+    except Exception as e:
+        log(f"[LOG] Erreur rotation: {e}")
+        return
+    seg = res["rotated"]
+    if seg:
+        log(
+            f"[LOG] Rotation : {os.path.basename(seg['path'])} "
+            f"({seg['lines']} lignes, {seg['raw_bytes'] // 1024} Ko -> {seg['stored_bytes'] // 1024} Ko)"
+        )
+    for name in res["purged"]:
+        log(f"[LOG] Segment supprimé (rétention) : {name}")
+
+
+# ----------------------------------------------------------------------------
+# Journal d'événements (events.jsonl)
+# ----------------------------------------------------------------------------
+JOURNAL = ev.EventJournal(EVENTS_FILE)
+
+# Début de l'état courant de chaque lien (time.monotonic()), pour les durées.
+# Au démarrage, la durée du premier état est comptée depuis la 1re mesure.
+STATE_SINCE = {}
+
+
+def up_down(ok: bool) -> str:
+    return "up" if ok else "down"
+
+
+def record(event_type: str, link: str, prev=None, new=None, **data):
+    """Ajoute un événement typé au journal ; un changement d'état relance le chrono du lien."""
+    now = time.monotonic()
+    since = STATE_SINCE.get(link)
+    if prev != new:
+        STATE_SINCE[link] = now
+    if event_type in EVENT_COUNTERS:
+        count(EVENT_COUNTERS[event_type])
+    event = JOURNAL.append(event_type, link, prev, new, None if since is None else now - since, **data)
+    if prev != new and prev is not None:
+        CURRENT["last_transition"] = {
+            "type": event_type, "link": link, "prev": prev, "new": new,
+            "ts": event["ts"] if event else round(time.time(), 3),
+        }
+
+
+# Agrégats de disponibilité par jour, alimentés par les événements du cycle
+SLA = SlaEngine(SLA_FILE, JOURNAL)
+
+
+# ----------------------------------------------------------------------------
+# Compteurs & état publiés (SharedSnapshot)
+# ----------------------------------------------------------------------------
+# Compteurs cumulés depuis le démarrage du monitor (remis à zéro au redémarrage)
+COUNTERS = {
+    "failovers": 0,            # route -> lien de secours (4G, ...)
+    "failbacks": 0,            # route -> retour sur le lien principal
+    "freebox_outages": 0,
+    "lte_outages": 0,
+    "no_connection": 0,
+    "brownouts": 0,            # route -> secours sur lien principal dégradé
+    "lte_attempts": 0,         # tentatives de montage (connect_4g.sh, bring_up)
+    "lte_attempts_failed": 0,
+    "sms_sent": 0,
+    "sms_failed": 0,
+    "multipath_drops": 0,      # liens retirés de la route multichemin entre deux cycles
+    "quota_alerts": 0,
+    "modem_resets": 0,         # modem 4G disparu de l'USB puis revenu (uevents)
+}
+COUNTERS_LOCK = threading.Lock()
+
+# Événements du journal comptés au passage (voir record())
+EVENT_COUNTERS = {
+    ev.FREEBOX_LOST: "freebox_outages",
+    ev.LTE_LOST: "lte_outages",
+    ev.NO_CONNECTION: "no_connection",
+    ev.BROWNOUT_START: "brownouts",
+    ev.LTE_ATTEMPT: "lte_attempts",
+    ev.LTE_ATTEMPT_FAILED: "lte_attempts_failed",
+    ev.MODEM_LOST: "modem_resets",
+}
+
+# Types historiques des événements Freebox / 4G ; les autres liens de la
+# table utilisent link_lost / link_up
+LOST_EVENTS = {"freebox": ev.FREEBOX_LOST, "4g": ev.LTE_LOST}
+UP_EVENTS = {"freebox": ev.FREEBOX_RESTORED, "4g": ev.LTE_UP}
+
+# Dernier état mesuré (rempli par la boucle principale)
+LINKS = {}
+CURRENT = {
+    "route": None, "route_since": None, "check_interval": None, "last_transition": None,
+    "brownout": False, "primary": None, "multipath": None, "usage": {},
+}
+
+
+def count(name: str, n: int = 1):
+    with COUNTERS_LOCK:
+        COUNTERS[name] += n
+
+
+def publish():
+    """Publie l'état courant, les compteurs et les durées mesurées."""
+    with COUNTERS_LOCK:
+        counters = dict(COUNTERS)
+        sms_queue = SMS_PENDING
+    SNAPSHOT.publish({
+        "started": STARTED,
+        "check_interval": CURRENT["check_interval"],
+        "links": LINKS,
+        "route": CURRENT["route"],
+        "route_since": CURRENT["route_since"],
+        "last_transition": CURRENT["last_transition"],
+        "brownout": CURRENT["brownout"],
+        "primary": CURRENT["primary"],
+        "multipath": CURRENT["multipath"],
+        "usage": CURRENT["usage"],
+        "counters": counters,
+        "sms_queue": sms_queue,
+        "sms_retry": len(SMS_RETRY),
+        "modem_present": MODEM["lost_at"] is None,
+        "spans": TIMINGS.snapshot()["spans"],
+    })
+
+
 # ----------------------------------------------------------------------------
 # Config
 # ----------------------------------------------------------------------------
-def load_config(path: str):
-    cfg = {}
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            cfg = json.load(f)
-    except Exception:
-        pass
-    # Valeurs par défaut
-    cfg.setdefault("gateway", "192.168.0.254")
-    cfg.setdefault("apn", "free")
-    return cfg
+CONFIG = get_store(CONFIG_FILE)
+
+
+def on_config_change(cfg: dict):
+    """Callback inotify : on journalise et on relance un cycle immédiatement."""
+    links, errors = load_links(cfg)
+    log(
+        f"[CONFIG] Rechargement config.json : liens={','.join(l['name'] for l in links)} "
+        f"gateway={cfg['gateway']} intervalle={cfg['check_interval']}s retry4G={cfg['min_4g_retry_delay']}s"
+    )
+    for error in errors:
+        log(f"[CONFIG] Table links : {error}")
+    WAKE_UP.set()
 
 
 # ----------------------------------------------------------------------------
 # Commandes & ping
 # ----------------------------------------------------------------------------
+# RTT moyen (ms) du dernier ping réussi, par (interface, hôte) ; None si échec
+RTT = {}
+
+
 def run_cmd(cmd: str, timeout: int = 10):
     """
     Exécute une commande shell, retourne (rc, stdout, stderr)
+    Durée mesurée par programme ("cmd:ping", "cmd:ip", ...).
     """
+    words = cmd.split()
+    name = words[1] if words[:1] == ["sudo"] and len(words) > 1 else (words[0] if words else "?")
+    with TIMINGS.span(f"cmd:{name}"):
+        return _run_cmd(cmd, timeout)
+
+
+def _run_cmd(cmd: str, timeout: int):
     try:
         res = subprocess.run(
             cmd,
@@ -93,26 +268,97 @@ def run_cmd(cmd: str, timeout: int = 10):
 
 def ping(host: str, iface: str | None = None, count: int = 1, timeout: int = 2) -> bool:
     """
-    Ping simple, True si OK.
-    On ignore la sortie, seul le code retour compte.
+    Ping simple, True si OK (code retour).
+    Le RTT moyen est gardé dans RTT pour les métriques.
     """
     if iface:
         cmd = f"ping -I {iface} -c {count} -W {timeout} {host}"
     else:
         cmd = f"ping -c {count} -W {timeout} {host}"
 
-    rc, _, _ = run_cmd(cmd, timeout=timeout + 1)
+    with TIMINGS.span(f"ping:{iface or 'default'}:{host}"):
+        rc, out, _ = run_cmd(cmd, timeout=timeout + 1)
+    RTT[(iface, host)] = quality.parse_ping(out)[2] if rc == 0 else None
     return rc == 0
 
 
 # ----------------------------------------------------------------------------
 # SMS
 # ----------------------------------------------------------------------------
-def send_sms(message: str):
+# Un seul envoi à la fois sur le port série
+SMS_LOCK = threading.Lock()
+
+# Alertes de la boucle principale : envoyées dans l'ordre par sms_worker, la
+# boucle (bascule, connect_4g.sh) n'attend jamais le modem.
+SMS_QUEUE = queue.Queue()
+
+# Mode combiné (run_failover_pi.py) : send_sms.py est importé au lieu d'être
+# relancé dans un nouvel interpréteur à chaque alerte.
+COMBINED = os.environ.get("FAILOVERPI_COMBINED") == "1"
+
+# SMS en attente du port série (SMS_QUEUE + envois bloqués sur SMS_LOCK)
+SMS_PENDING = 0
+
+# SMS en échec ou émis pendant un reset du modem : (heure, texte), renvoyés au
+# retour du modem (voir on_modem_event) ; les plus anciens sont abandonnés.
+SMS_RETRY = deque(maxlen=20)
+
+
+def send_sms(message: str, queued_at: str = None):
     """
-    Envoie un SMS via send_sms.py.
+    Envoie un SMS via send_sms.py ; en cas d'échec (ou modem absent), il est
+    mis en attente jusqu'au retour du modem.
     """
-    log(f"[SMS] Préparation envoi : {message}")
+    global SMS_PENDING
+    if MODEM["lost_at"] is not None:
+        log(f"[SMS] Modem en cours de reset, SMS mis en attente : {message}")
+        SMS_RETRY.append((queued_at or datetime.now().strftime("%H:%M"), message))
+        publish()
+        return
+    text = message if queued_at is None else f"[{queued_at}] {message}"
+    log(f"[SMS] Préparation envoi : {text}")
+    with COUNTERS_LOCK:
+        SMS_PENDING += 1
+    with TIMINGS.span("sms_lock_wait"):
+        SMS_LOCK.acquire()
+    try:
+        with TIMINGS.span("send_sms"):
+            ok = _send_sms(text)
+    finally:
+        SMS_LOCK.release()
+        with COUNTERS_LOCK:
+            SMS_PENDING -= 1
+    count("sms_sent" if ok else "sms_failed")
+    if not ok:
+        SMS_RETRY.append((queued_at or datetime.now().strftime("%H:%M"), message))
+    publish()
+
+
+def queue_sms(message: str):
+    """Confie le SMS à sms_worker et rend la main aussitôt."""
+    global SMS_PENDING
+    with COUNTERS_LOCK:
+        SMS_PENDING += 1
+    SMS_QUEUE.put(message)
+
+
+def sms_worker():
+    """Envoie les SMS de SMS_QUEUE un par un, dans l'ordre des alertes."""
+    global SMS_PENDING
+    while True:
+        message = SMS_QUEUE.get()
+        with COUNTERS_LOCK:
+            SMS_PENDING -= 1
+        try:
+            send_sms(message)
+        except Exception as e:
+            log(f"[SMS] Erreur envoi: {e}")
+
+
+def _send_sms(message: str) -> bool:
+    """Lance send_sms.py, True si l'envoi a réussi."""
+    if COMBINED:
+        return _send_sms_inprocess(message)
     try:
         res = subprocess.run(
             ["python3", SMS_SCRIPT, message],
@@ -122,211 +368,895 @@ def send_sms(message: str):
         )
         if res.returncode == 0:
             log(f"[SMS] OK : {res.stdout.strip()}")
-        else:
-            log(
-                f"[SMS] ERREUR (code={res.returncode}) : {res.stdout.strip()}\n{res.stderr.strip()}"
-            )
+            return True
+        log(
+            f"[SMS] ERREUR (code={res.returncode}) : {res.stdout.strip()}\n{res.stderr.strip()}"
+        )
     except subprocess.TimeoutExpired:
         log("[SMS] ERREUR : Timeout lors de l'envoi du SMS.")
     except Exception as e:
         log(f"[SMS] Exception lors de l'envoi du SMS : {e}")
+    return False
+
+
+def _send_sms_inprocess(message: str) -> bool:
+    """Même envoi que send_sms.py, dans le processus courant (sortie capturée pour le log)."""
+    import send_sms
+
+    out = []
+    try:
+        send_sms.send(message, CONFIG.get(), say=lambda *a: out.append(" ".join(str(x) for x in a)))
+        log(f"[SMS] OK : {chr(10).join(out)}")
+        return True
+    except send_sms.SmsError as e:
+        log(f"[SMS] ERREUR : {chr(10).join(out)}\n{e}")
+    except Exception as e:
+        log(f"[SMS] Exception lors de l'envoi du SMS : {e}")
+    return False
 
 
 # ----------------------------------------------------------------------------
 # État des connexions
 # ----------------------------------------------------------------------------
-def check_status(gateway: str):
+# Table des liens (config.json "links", voir failoverpi/links.py), relue à chaque cycle
+
+# Dernier verdict des sondes par lien (voir failoverpi/probes.py)
+VERDICTS = {}
+
+# Pings de qualité (N paquets) en arrière-plan ; SAMPLES : résultats relevés ce cycle
+SAMPLERS = {}
+SAMPLES = {}
+
+
+def probe_link(link: dict, cfg: dict) -> bool:
+    """Quorum k-sur-n des sondes ICMP / DNS / TCP du lien ; détail des échecs journalisé au changement."""
+    name, iface = link["name"], link["interface"]
+    with TIMINGS.span(f"probe:{iface}"):
+        verdict = probes.run_quorum(
+            iface, link["probes"], cfg["probe_quorum"], cfg["probe_timeout"], cfg["probe_dns_name"]
+        )
+    for r in verdict["results"]:
+        if r["ok"]:
+            TIMINGS.record(f"probe:{iface}:{r['probe']}", r["ms"] / 1000)
+    prev = VERDICTS.get(name)
+    if not verdict["up"] and (prev is None or prev["up"]):
+        log(f"[PROBE] {name} KO ({probes.fmt_verdict(verdict)}, quorum {verdict['quorum']}) : {probes.fmt_failures(verdict)}")
+    VERDICTS[name] = verdict
+    return verdict["up"]
+
+
+def check_link(link: dict, cfg: dict) -> dict:
     """
-    Vérifie :
-      - Freebox LAN (ping gateway via eth0)
-      - Freebox Internet (ping 8.8.8.8 via eth0 si LAN OK)
-      - 4G Internet (ping 8.8.8.8 via wwan0)
-    Retourne (freebox_lan_ok, freebox_inet_ok, fourg_inet_ok)
+    Un lien : ping de la passerelle (LAN) s'il en a une, puis sondes Internet
+    si le LAN répond. La mesure de qualité part en fond et n'est relevée qu'au
+    cycle suivant ; elle tourne aussi pendant une coupure (cycles sans réponse),
+    pour qu'un lien revenu tienne recover_dwell avant d'y renvoyer le trafic.
+    Retourne {"lan": bool ou None, "up": bool}.
     """
-    # Freebox LAN
-    freebox_lan_ok = ping(gateway, iface="eth0", count=1, timeout=1)
+    name, iface = link["name"], link["interface"]
+    lan_ok = ping(link["gateway"], iface=iface, count=1, timeout=1) if link["gateway"] else None
 
-    # Freebox Internet
-    if freebox_lan_ok:
-        freebox_inet_ok = ping("8.8.8.8", iface="eth0", count=2, timeout=2)
-    else:
-        freebox_inet_ok = False
+    sampler = SAMPLERS.get(name)
+    if sampler is None or sampler.iface != iface:
+        sampler = SAMPLERS[name] = probes.PingSampler(iface)
+    SAMPLES[name] = sampler.collect()
+    sampler.start(probes.first_icmp_target(link["probes"]), cfg["quality_ping_count"])
+
+    if lan_ok is False:
+        VERDICTS.pop(name, None)
+        return {"lan": False, "up": False}
+    return {"lan": lan_ok, "up": probe_link(link, cfg)}
 
-    # 4G Internet
-    fourg_inet_ok = ping("8.8.8.8", iface="wwan0", count=2, timeout=2)
 
-    return freebox_lan_ok, freebox_inet_ok, fourg_inet_ok
+def check_status(links: list, cfg: dict) -> dict:
+    """
+    Sonde tous les liens en parallèle (un thread par lien, le plus prioritaire
+    dans le thread courant) ; un verdict tombe dès que le quorum est atteint
+    (ou ne peut plus l'être). Retourne {nom: {"lan": ..., "up": ...}}.
+    """
+    results = {}
+    threads = []
+    for link in links[1:]:
+        t = threading.Thread(
+            target=lambda l=link: results.update({l["name"]: check_link(l, cfg)}),
+            name=f"probe-{link['name']}", daemon=True,
+        )
+        t.start()
+        threads.append(t)
+    results[links[0]["name"]] = check_link(links[0], cfg)
+    for t in threads:
+        t.join()
+    return results
 
 
 # ----------------------------------------------------------------------------
-# Gestion des routes / interfaces
+# Qualité des liens (brownout)
 # ----------------------------------------------------------------------------
-def set_freebox_primary(gateway: str):
+# Fenêtre glissante perte / RTT / gigue des pings Internet, par lien
+QUALITY = {}
+
+# Lien dégradé (hystérésis + temps de séjour, seuils de config.json), par lien
+BROWNOUT = {}
+
+
+def update_quality(links: list, cfg: dict, now: float) -> dict:
     """
-    Rebasculer la route principale sur la Freebox (eth0),
-    remonter le Wi-Fi si besoin, supprimer default wwan0.
+    Ajoute les pings de qualité relevés ce cycle aux fenêtres et met à jour
+    l'état dégradé de chaque lien ; renvoie {nom: stats}.
     """
-    # Remonte le Wi-Fi (au cas où on l'a down pendant le failover)
-    rc, out, err = run_cmd("sudo ip link set wlan0 up", timeout=5)
-    log(f"[NET] ip link set wlan0 up (rc={rc}) {err}")
+    stats = {}
+    for link in links:
+        name = link["name"]
+        q = QUALITY.setdefault(name, quality.LinkQuality())
+        q.resize(cfg["quality_window"])
+        if SAMPLES.get(name):
+            q.add(*SAMPLES[name])
+        stats[name] = q.stats()
+    line = quality_line(links, stats)
+    for link in links:
+        b = BROWNOUT.setdefault(link["name"], quality.Brownout())
+        if b.update(stats[link["name"]], cfg, now):
+            if b.degraded:
+                log(f"[QUALITE] {link['label']} dégradée ({', '.join(b.reasons)}) : {line}")
+            else:
+                log(f"[QUALITE] Qualité {link['label']} bonne depuis {cfg['recover_dwell']}s : {line}")
+    return stats
 
-    # Route par défaut : Freebox
-    rc, out, err = run_cmd(
-        f"sudo ip route replace default via {gateway} dev eth0 metric 100", timeout=5
-    )
-    log(f"[NET] ip route replace default via {gateway} dev eth0 metric 100 (rc={rc}) {err}")
 
-    # Supprimer default via wwan0
-    rc, out, err = run_cmd("sudo ip route del default dev wwan0", timeout=5)
-    if rc != 0 and "No such process" not in err and "Cannot find device" not in err:
-        log(f"[NET] ip route del default dev wwan0 (rc={rc}) {err}")
+def quality_line(links: list, stats: dict) -> str:
+    return " / ".join(f"{l['label']} {quality.fmt_quality(stats.get(l['name']))}" for l in links)
+
+
+# ----------------------------------------------------------------------------
+# Consommation data (liens facturés au volume, voir failoverpi/usage.py)
+# ----------------------------------------------------------------------------
+USAGE = usage.UsageMeter(USAGE_FILE)
+
+
+def usage_sampler():
+    """Thread : compteurs rx / tx des liens "metered" lus toutes les usage_interval s."""
+    while True:
+        cfg = CONFIG.get()
+        interval = cfg["usage_interval"]
+        if interval <= 0:
+            time.sleep(60)
+            continue
+        now = time.time()
+        try:
+            links, _ = load_links(cfg)
+            USAGE.sample({l["name"]: l["interface"] for l in links if l["cost"] == "metered"}, now)
+            USAGE.save(now)
+        except Exception as e:
+            log(f"[DATA] Erreur de lecture des compteurs : {e}")
+        time.sleep(interval)
 
 
-def prepare_failover_4g():
+def update_usage(links: list, cfg: dict, now: float) -> tuple:
     """
-    Actions réseau lors de l'activation du failover 4G :
-      - couper wlan0 (éviter routes par défaut parasites)
-      - laisser connect_4g.sh gérer la route default wwan0.
+    Consommation des liens "metered" (jour, mois, période de facturation) et
+    seuils de forfait franchis ; renvoie ({nom: consommation}, SMS à envoyer).
     """
-    rc, out, err = run_cmd("sudo ip link set wlan0 down", timeout=5)
-    log(f"[NET] ip link set wlan0 down (rc={rc}) {err}")
+    today = date.fromtimestamp(now)
+    thresholds = [t for t in cfg["quota_alert_pct"] if isinstance(t, (int, float)) and t > 0]
+    out, alerts = {}, []
+    for link in links:
+        if link["cost"] != "metered":
+            continue
+        name, label = link["name"], link["label"]
+        used, start = USAGE.period(name, cfg["quota_reset_day"], today)
+        quota = link["quota_mb"] * usage.MB if link["quota_mb"] else None
+        pct = round(used * 100 / quota, 1) if quota else None
+        out[name] = {
+            "label": label, "today": USAGE.day(name, today), "month": USAGE.month(name, today),
+            "period": used, "since": start.isoformat(), "quota": quota, "pct": pct,
+            "months": USAGE.history(name, 6),
+        }
+        top = USAGE.crossed(name, pct, thresholds, start) if pct is not None else None
+        if top is None:
+            continue
+        detail = f"{usage.fmt_bytes(used)} / {usage.fmt_bytes(quota)} depuis le {start:%d/%m}"
+        log(f"[DATA] {label} : {top} % du forfait atteint ({detail})")
+        count("quota_alerts")
+        if top >= 100:
+            alerts.append(f"🚫 {label} : forfait data épuisé ({detail}), lien gardé en dernier recours.")
+        else:
+            alerts.append(f"📊 {label} : {top} % du forfait data consommé ({detail}).")
+    return out, alerts
 
 
 # ----------------------------------------------------------------------------
-# Lancement du script 4G
+# Gestion des routes / interfaces
 # ----------------------------------------------------------------------------
-def try_start_4g():
+# Métrique de la route par défaut posée par le monitor (comme connect_4g.sh) :
+# passe devant les routes DHCP (eth0 : 100 et plus)
+ROUTE_METRIC = 10
+
+
+def set_wlan(link: dict):
+    """wlan0 coupé quand un lien facturé au volume porte le trafic (éviter les routes par défaut parasites)."""
+    state = "down" if link["cost"] == "metered" else "up"
+    rc, out, err = run_cmd(f"sudo ip link set wlan0 {state}", timeout=5)
+    log(f"[NET] ip link set wlan0 {state} (rc={rc}) {err}")
+
+
+def set_primary(link: dict, links: list):
     """
-    Lance /home/xavier/connect_4g.sh et retourne True si rc == 0.
+    Route par défaut sur `link` ; celles posées sur les autres liens sont
+    retirées.
     """
-    log("[4G] Lancement du script de connexion 4G...")
+    set_wlan(link)
+
+    via = f"via {link['gateway']} " if link["gateway"] else ""
+    route = f"default {via}dev {link['interface']} metric {ROUTE_METRIC}"
+    rc, out, err = run_cmd(f"sudo ip route replace {route}", timeout=5)
+    log(f"[NET] ip route replace {route} (rc={rc}) {err}")
+
+    for other in links:
+        if other["interface"] == link["interface"]:
+            continue
+        rc, out, err = run_cmd(f"sudo ip route del default dev {other['interface']} metric {ROUTE_METRIC}", timeout=5)
+        if rc != 0 and "No such process" not in err and "Cannot find device" not in err:
+            log(f"[NET] ip route del default dev {other['interface']} (rc={rc}) {err}")
+
+
+# ----------------------------------------------------------------------------
+# Mode actif/actif (route_mode = "multipath", voir failoverpi/multipath.py)
+# ----------------------------------------------------------------------------
+# Route multichemin en place : modifiée par la boucle principale et par le
+# retrait rapide (netlink, sondes légères), d'où le verrou.
+MULTIPATH_LOCK = threading.Lock()
+MULTIPATH = {"links": [], "members": [], "weights": {}, "rules": {}, "sysctl": False, "watching": False}
+
+
+def _multipath_route_locked() -> str:
+    """Pose la route multichemin des membres courants (verrou tenu), renvoie le détail pour le log."""
+    cmd = multipath.route_command(MULTIPATH["members"], MULTIPATH["weights"], ROUTE_METRIC)
+    if cmd is None:
+        return "aucun lien"
+    rc, out, err = run_cmd(f"sudo {cmd}", timeout=5)
+    detail = multipath.fmt_weights(MULTIPATH["members"], MULTIPATH["weights"])
+    return detail if rc == 0 else f"{detail} (rc={rc}) {err}"
+
+
+def set_multipath(links: list, members: list, weights: dict):
+    """Règles par lien (tables, fwmark, adresse source) et route multichemin pondérée."""
+    with MULTIPATH_LOCK:
+        if not MULTIPATH["sysctl"]:
+            for sysctl in multipath.SYSCTLS:
+                rc, out, err = run_cmd(f"sudo sysctl -w {sysctl}", timeout=5)
+                log(f"[MULTIPATH] sysctl {sysctl} (rc={rc}) {err}")
+            MULTIPATH["sysctl"] = True
+
+        # Règles reposées seulement si le lien a changé (adresse, passerelle, table...) ;
+        # celles des liens retirés de la table sont supprimées
+        for rank in [r for r in MULTIPATH["rules"] if r >= len(links)]:
+            for cmd in multipath.cleanup_commands(rank + 1)[-2:]:
+                run_cmd(f"sudo {cmd}", timeout=5)
+            del MULTIPATH["rules"][rank]
+        for rank, link in enumerate(links):
+            addr = multipath.iface_addr(link["interface"])
+            key = (link["interface"], link["gateway"], addr,
+                   multipath.table_of(link, rank), multipath.fwmark_of(link, rank))
+            if MULTIPATH["rules"].get(rank) == key:
+                continue
+            for cmd in multipath.policy_commands(link, rank, addr):
+                rc, out, err = run_cmd(f"sudo {cmd}", timeout=5)
+                if rc != 0 and not cmd.startswith("ip rule del"):
+                    log(f"[MULTIPATH] {cmd} (rc={rc}) {err}")
+            MULTIPATH["rules"][rank] = key
+        MULTIPATH["links"] = links
+
+        same = [l["name"] for l in members] == [l["name"] for l in MULTIPATH["members"]]
+        if same and weights == MULTIPATH["weights"]:
+            return
+        MULTIPATH["members"], MULTIPATH["weights"] = members, weights
+        detail = _multipath_route_locked()
+    log(f"[MULTIPATH] Route multichemin : {detail}")
+
+
+def clear_multipath():
+    """Retour au mode failover : règles par lien retirées (la route est remplacée par set_primary)."""
+    with MULTIPATH_LOCK:
+        if not MULTIPATH["links"]:
+            return
+        for cmd in multipath.cleanup_commands(len(MULTIPATH["links"])):
+            run_cmd(f"sudo {cmd}", timeout=5)
+        MULTIPATH.update(links=[], members=[], weights={}, rules={})
+    CURRENT["multipath"] = None
+    log("[MULTIPATH] Mode failover : règles de routage par lien retirées")
+
+
+def drop_member(name: str, reason: str):
+    """Retire aussitôt un lien de la route multichemin (s'il en reste un autre)."""
+    t0 = time.perf_counter()
+    with MULTIPATH_LOCK:
+        members = MULTIPATH["members"]
+        link = next((l for l in members if l["name"] == name), None)
+        if link is None or len(members) < 2:
+            return
+        MULTIPATH["members"] = [l for l in members if l["name"] != name]
+        detail = _multipath_route_locked()
+        CURRENT["multipath"] = {l["name"]: MULTIPATH["weights"][l["name"]] for l in MULTIPATH["members"]}
+    log(f"[MULTIPATH] {link['label']} retiré ({reason}) en {(time.perf_counter() - t0) * 1000:.0f} ms : {detail}")
+    count("multipath_drops")
+    publish()
+
+
+def on_link_event(iface: str, running: bool):
+    """Netlink : porteuse perdue -> retrait ; interface revenue -> règles à reposer."""
+    with MULTIPATH_LOCK:
+        if running:
+            for rank in [r for r, key in MULTIPATH["rules"].items() if key[0] == iface]:
+                del MULTIPATH["rules"][rank]
+            return
+        names = [l["name"] for l in MULTIPATH["members"] if l["interface"] == iface]
+    for name in names:
+        drop_member(name, f"{iface} sans porteuse")
+
+
+def multipath_prober():
+    """Thread : sonde légère des liens de la route multichemin entre deux cycles."""
+    failures = {}
+    while True:
+        cfg = CONFIG.get()
+        interval = cfg["multipath_probe_interval"]
+        if cfg["route_mode"] != "multipath" or interval <= 0:
+            failures.clear()
+            time.sleep(5)
+            continue
+        with MULTIPATH_LOCK:
+            members = list(MULTIPATH["members"])
+        for link in members:
+            spec = multipath.fast_probe_spec(link["probes"])
+            if spec is None:
+                continue
+            r = probes.probe_once(link["interface"], spec, timeout=1, dns_name=cfg["probe_dns_name"])
+            if r.get("unsupported"):
+                continue
+            failures[link["name"]] = 0 if r["ok"] else failures.get(link["name"], 0) + 1
+            if failures[link["name"]] == max(1, cfg["multipath_fail_count"]):
+                drop_member(link["name"], f"{failures[link['name']]} échecs de suite sur {spec}")
+        time.sleep(interval)
+
+
+def start_multipath_watch():
+    """Retrait rapide (netlink + sondes légères), démarré au premier passage en multipath."""
+    if MULTIPATH["watching"]:
+        return
+    MULTIPATH["watching"] = True
+    if not multipath.LinkWatcher(on_link_event).start():
+        log("[MULTIPATH] Netlink indisponible : retrait sur perte de porteuse au cycle suivant")
+    threading.Thread(target=multipath_prober, name="multipath-probe", daemon=True).start()
+
+
+# ----------------------------------------------------------------------------
+# Modem 4G réinitialisé (uevents USB, voir failoverpi/hotplug.py)
+# ----------------------------------------------------------------------------
+# lost_at : début d'un reset observé (uevent "lost"), None sinon ; SMS et
+# montage 4G ne sont suspendus que pendant un reset observé, au plus
+# MODEM_RESET_MAX s (nœuds revenus sous d'autres noms, config erronée...).
+# redial : lien 4G actif au moment du reset, à remonter dès le retour du
+# modem ; recovering : (lien, début du reset) jusqu'au retour de la 4G
+MODEM = {"lost_at": None, "redial": None, "recovering": None}
+MODEM_RESET_MAX = 300
+
+
+def is_modem_link(link: dict, cfg: dict) -> bool:
+    return link["interface"] == (cfg["wwan_interface"] or "wwan0")
+
+
+def on_modem_event(event: str, detail: dict):
+    """ModemWatcher : modem disparu (reset USB) / revenu et prêt."""
+    cfg = CONFIG.get()
+    if event == "lost":
+        MODEM["lost_at"] = time.time()
+        links, _ = load_links(cfg)
+        active = [
+            l["name"] for l in links
+            if is_modem_link(l, cfg) and (LINKS.get(l["name"], {}).get("up") or CURRENT["route"] == l["name"])
+        ]
+        MODEM["redial"] = active[0] if active else None
+        MODEM["recovering"] = (active[0], time.time()) if active else None
+        usb = f", USB {detail['usb']}" if detail["usb"] else ""
+        log(f"[MODEM] Modem 4G disparu ({', '.join(detail['missing'])} absents{usb}, {detail['event']})")
+        record(ev.MODEM_LOST, "modem", "up", "down", missing=detail["missing"], usb=detail["usb"], active=active)
+        publish()
+        return
+
+    if MODEM["lost_at"] is None:
+        # Nœuds absents au démarrage (ou reset abandonné) : rien n'était suspendu
+        log("[MODEM] Nœuds du modem tous présents")
+        if SMS_RETRY:
+            threading.Thread(target=flush_sms, name="sms-flush", daemon=True).start()
+        return
+    MODEM["lost_at"] = None
+    if detail["down_s"] is not None:
+        TIMINGS.record("modem_reenumerate", detail["down_s"])
+    todo = f", re-numérotation {MODEM['redial']}" if MODEM["redial"] else ""
+    log(f"[MODEM] Modem 4G de retour après {detail['down_s']}s{todo}, {len(SMS_RETRY)} SMS en attente")
+    record(ev.MODEM_BACK, "modem", "down", "up", reenumerate_s=detail["down_s"], usb=detail["usb"])
+    if SMS_RETRY:
+        threading.Thread(target=flush_sms, name="sms-flush", daemon=True).start()
+    # Cycle immédiat : la 4G est remontée sans attendre check_interval ni min_4g_retry_delay
+    WAKE_UP.set()
+
+
+def flush_sms():
+    """Renvoie les SMS en attente, dans l'ordre, préfixés de leur heure d'origine."""
+    for _ in range(len(SMS_RETRY)):
+        if MODEM["lost_at"] is not None or not SMS_RETRY:
+            return
+        queued_at, message = SMS_RETRY.popleft()
+        send_sms(message, queued_at=queued_at)
+
+
+def start_modem_watch(cfg: dict):
+    """Suivi uevent du modem ; sans netlink, l'ancien comportement (retry différé) reste."""
+    watcher = hotplug.ModemWatcher(
+        lambda: hotplug.node_paths(CONFIG.get()), on_modem_event,
+        usb_id=cfg["modem_usb_id"], settle=cfg["modem_settle"],
+    )
+    if watcher.start():
+        missing = [p for p in hotplug.node_paths(cfg) if not os.path.exists(p)]
+        # Nœuds absents au démarrage : simple avertissement, SMS et 4G restent tentés
+        log("[MODEM] Suivi USB du modem actif" + (f" ({', '.join(missing)} absents)" if missing else ""))
+    else:
+        log("[MODEM] Uevents indisponibles : pas de suivi USB du modem")
+
+
+# ----------------------------------------------------------------------------
+# Montage d'un lien (connect_4g.sh, ...)
+# ----------------------------------------------------------------------------
+def bring_up(link: dict) -> bool:
+    """
+    Lance la commande bring_up du lien et retourne True si rc == 0.
+    """
+    tag = link["name"].upper()
+    cmd = link["bring_up"]
+    log(f"[{tag}] Lancement de la commande de montage : {cmd}")
     try:
         res = subprocess.run(
-            ["sudo", CONNECT_4G_SCRIPT],
+            cmd,
+            shell=True,
             capture_output=True,
             text=True,
             timeout=120,
         )
         if res.returncode == 0:
-            log("[4G] Connexion 4G active (ping OK).")
-            log(f"[4G] Script connect_4g.sh terminé (rc={res.returncode}).")
+            log(f"[{tag}] Lien {link['label']} monté (rc={res.returncode}).")
             return True
         else:
-            log("[4G] ERREUR : échec du démarrage réseau 4G")
-            log(f"[4G] Résultat connect_4g.sh (rc={res.returncode}) :\n{res.stdout}\n{res.stderr}")
+            log(f"[{tag}] ERREUR : échec du montage du lien {link['label']}")
+            log(f"[{tag}] Résultat (rc={res.returncode}) :\n{res.stdout}\n{res.stderr}")
             return False
     except subprocess.TimeoutExpired:
-        log("[4G] ERREUR : Timeout lors du script connect_4g.sh")
+        log(f"[{tag}] ERREUR : Timeout de la commande de montage")
         return False
     except Exception as e:
-        log(f"[4G] Exception lors du script connect_4g.sh : {e}")
+        log(f"[{tag}] Exception lors de la commande de montage : {e}")
         return False
 
 
+# ----------------------------------------------------------------------------
+# Dernier état connu (démarrage rapide)
+# ----------------------------------------------------------------------------
+def load_state() -> dict:
+    """État sauvegardé au dernier cycle avant l'arrêt ({} si absent)."""
+    try:
+        with open(STATE_FILE, "r") as f:
+            state = json.load(f)
+        return state if isinstance(state, dict) else {}
+    except Exception:
+        return {}
+
+
+def save_state(state: dict):
+    tmp = STATE_FILE + ".tmp"
+    try:
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp, STATE_FILE)
+    except Exception as e:
+        log(f"[BOOT] Erreur sauvegarde état: {e}")
+
+
+def system_uptime():
+    """Secondes depuis le boot du Pi (None si /proc/uptime illisible)."""
+    try:
+        with open("/proc/uptime") as f:
+            return float(f.read().split()[0])
+    except Exception:
+        return None
+
+
+def phase_done(name: str, start: float) -> float:
+    """Enregistre la durée d'une phase du cycle, renvoie le début de la suivante."""
+    now = time.perf_counter()
+    TIMINGS.record(f"phase:{name}", now - start)
+    return now
+
+
+def stats_dumper():
+    """Thread : écrit monitor_stats.json périodiquement ou sur SIGUSR1."""
+    while True:
+        STATS_DUMP.wait(STATS_DUMP_INTERVAL)
+        STATS_DUMP.clear()
+        TIMINGS.dump(STATS_FILE)
+
+
 # ----------------------------------------------------------------------------
 # Boucle principale
 # ----------------------------------------------------------------------------
 def main():
-    cfg = load_config(CONFIG_FILE)
-    gateway = cfg.get("gateway", "192.168.0.254")
-
+    started = time.monotonic()
     log("=== MONITOR FAILOVER DÉMARRÉ ===")
 
-    # SMS au démarrage du monitor (Raspberry reboot / service relancé)
-    send_sms("Le Raspberry Pi Failover vient de redemarrer.")
+    # Rechargement à chaud : les changements faits via /config sont pris
+    # en compte au cycle suivant, sans redémarrer le service.
+    CONFIG.on_change(on_config_change)
+    CONFIG.watch()
+
+    # Statistiques de durées : dump périodique + à la demande (SIGUSR1)
+    threading.Thread(target=stats_dumper, name="stats-dump", daemon=True).start()
+    threading.Thread(target=usage_sampler, name="usage", daemon=True).start()
+    start_modem_watch(CONFIG.get())
+    signal.signal(signal.SIGUSR1, lambda signum, frame: STATS_DUMP.set())
 
-    prev_freebox_inet = None
-    prev_any_conn = None
-    prev_4g_inet = None
+    # SMS au démarrage du monitor (Raspberry reboot / service relancé) : comme
+    # toutes les alertes, en arrière-plan, la première mesure n'attend pas le modem.
+    threading.Thread(target=sms_worker, name="sms", daemon=True).start()
+    queue_sms("Le Raspberry Pi Failover vient de redemarrer.")
+
+    links, errors = load_links(CONFIG.get())
+    for error in errors:
+        log(f"[CONFIG] Table links : {error}")
+
+    # Reprise du dernier état connu : une coupure Freebox pendant que le Pi
+    # était éteint est détectée (SMS + bascule) dès le premier cycle.
+    # Sans état sauvegardé, on part de la situation nominale (lien principal OK).
+    last = load_state()
+    if last:
+        # Sauvegardes antérieures à la table links : "freebox" / "4g" à la racine
+        prev_up = dict(last.get("links") or {k: last[k] for k in ("freebox", "4g") if k in last})
+        log(
+            "[BOOT] Dernier état connu : "
+            + " ".join(f"{l['label']}={'OK' if prev_up.get(l['name']) else 'KO'}" for l in links)
+            + f" (vu le {last.get('last_seen_text', '?')})"
+        )
+        prev_route = last.get("route") or next((l["name"] for l in links if prev_up.get(l["name"])), "none")
+    else:
+        prev_up = {links[0]["name"]: True}
+        prev_route = None
+    prev_any_conn = last.get("any", True)
 
-    last_4g_attempt = 0.0
+    applied_route = None      # lien sur lequel la route par défaut a été posée
+    brownout_link = None      # lien prioritaire écarté pendant le brownout
+    last_attempt = {}         # dernière tentative de montage, par lien
+    first_cycle = True
+    saved_state = None
+    last_state_save = 0.0
 
     while True:
-        freebox_lan_ok, freebox_inet_ok, fourg_inet_ok = check_status(gateway)
+        # Simple stat() si config.json n'a pas bougé
+        cfg = CONFIG.get()
+        links, _ = load_links(cfg)
+        by_name = {l["name"]: l for l in links}
+        primary = links[0]
+        check_interval = max(5, cfg["check_interval"])
+        min_retry_delay = cfg["min_4g_retry_delay"]
+
+        cycle_start = phase_start = time.perf_counter()
+        status = check_status(links, cfg)
+        phase_start = phase_done("check_status", phase_start)
+
+        # Qualité : un lien qui répond mais trop mal (perte, RTT, gigue) n'est
+        # quitté que si un lien moins prioritaire, lui, est dans les clous.
+        # Forfait data : près du quota, retour plus rapide sur un lien fixe
+        # (quota_recover_dwell) ; quota épuisé, le lien ne passe qu'en dernier recours.
+        now = time.time()
+        data, quota_alerts = update_usage(links, cfg, now)
+        CURRENT["usage"] = data
+        pct = {n: u["pct"] for n, u in data.items() if u["pct"] is not None}
+        if cfg["quota_failback_pct"] > 0 and pct.get(CURRENT["route"], 0) >= cfg["quota_failback_pct"]:
+            stats = update_quality(links, dict(cfg, recover_dwell=min(cfg["recover_dwell"], cfg["quota_recover_dwell"])), now)
+        else:
+            stats = update_quality(links, cfg, now)
+        health = {
+            n: {"up": st["up"], "degraded": BROWNOUT[n].degraded or pct.get(n, 0) >= 100}
+            for n, st in status.items()
+        }
+        route_link, skipped = choose_route(links, health)
+        route = route_link["name"] if route_link else "none"
+        brownout = bool(skipped)
+
+        # Multipath : tous les liens OK non dégradés (à défaut tous les liens OK), pondérés
+        multipath_mode = cfg["route_mode"] == "multipath"
+        members, weights = [], {}
+        if multipath_mode:
+            up = [l for l in links if health[l["name"]]["up"]]
+            members = [l for l in up if not health[l["name"]]["degraded"]] or up
+            weights = multipath.weights(members, stats, cfg, {n: 1 - p / 100 for n, p in pct.items()})
+            CURRENT["multipath"] = {l["name"]: weights[l["name"]] for l in members if weights[l["name"]]}
+
+        published = {}
+        if primary["gateway"]:
+            lan_ok = status[primary["name"]]["lan"]
+            published["lan"] = {
+                "up": lan_ok, "rtt_ms": RTT.get((primary["interface"], primary["gateway"])) if lan_ok else None,
+            }
+        for link in links:
+            name, up = link["name"], status[link["name"]]["up"]
+            v = VERDICTS.get(name)
+            published[name] = {
+                "label": link["label"], "up": up, "rtt_ms": v["rtt_ms"] if up else None,
+                "probes_ok": v["ok"] if v else 0, "probes_total": v["total"] if v else 0,
+                "loss_pct": stats[name]["loss_pct"], "jitter_ms": stats[name]["jitter_ms"],
+                "degraded": BROWNOUT[name].degraded,
+            }
+            if multipath_mode:
+                published[name]["weight"] = weights.get(name, 0)
+        for name in set(LINKS) - set(published):
+            LINKS.pop(name, None)
+        LINKS.update(published)
+        CURRENT["check_interval"] = check_interval
+        CURRENT["primary"] = primary["name"]
+
+        # Route active : bascules comptées (départ du lien principal / retour dessus)
+        route_prev = prev_route
+        if route != CURRENT["route"]:
+            if route not in (primary["name"], "none") and prev_route not in (None, route):
+                count("failovers")
+            elif route == primary["name"] and prev_route not in (None, primary["name"], "none"):
+                count("failbacks")
+            CURRENT["route"], CURRENT["route_since"] = route, round(now)
+            prev_route = route
+
+        publish()
+        for text in quota_alerts:
+            queue_sms(text)
 
         # Status global
-        status_line = (
-            f"[STATUS] Freebox LAN={'OK' if freebox_lan_ok else 'KO'} "
-            f"Internet={'OK' if freebox_inet_ok else 'KO'} / "
-            f"4G={'OK' if fourg_inet_ok else 'KO'}"
-        )
+        parts = []
+        for link in links:
+            st, v = status[link["name"]], VERDICTS.get(link["name"])
+            if st["lan"] is None:
+                part = f"{link['label']}={'OK' if st['up'] else 'KO'}"
+            else:
+                part = f"{link['label']} LAN={'OK' if st['lan'] else 'KO'} Internet={'OK' if st['up'] else 'KO'}"
+            parts.append(part + (f" ({probes.fmt_verdict(v)})" if v else ""))
+        status_line = "[STATUS] " + " / ".join(parts)
+        if any(BROWNOUT[n].degraded or (status[n]["up"] and quality.degraded_reasons(stats[n], cfg)) for n in by_name):
+            status_line += f" | {quality_line(links, stats)}"
         log(status_line)
 
-        any_conn = freebox_inet_ok or fourg_inet_ok
+        any_conn = route_link is not None
+
+        if first_cycle:
+            # Les durées des premiers états sont comptées à partir d'ici
+            if not last:
+                for name in list(by_name) + ["any"]:
+                    STATE_SINCE[name] = time.monotonic()
+            extra = {"lan": up_down(status[primary["name"]]["lan"])} if primary["gateway"] else {}
+            record(
+                ev.MONITOR_START, "monitor",
+                links={n: up_down(st["up"]) for n, st in status.items()},
+                last_seen=last.get("last_seen"), **extra,
+            )
 
         # --------------------------------------------------------------------
-        # Gestion des transitions Freebox Internet
+        # Route par défaut sur le lien choisi (premier cycle : routes remises
+        # à plat par le reboot, on l'applique même sans changement)
         # --------------------------------------------------------------------
-        if prev_freebox_inet is None:
-            prev_freebox_inet = freebox_inet_ok
-        else:
-            if prev_freebox_inet and not freebox_inet_ok:
-                # Perte Internet Freebox
-                log("Perte de connexion Internet Freebox")
-                send_sms("⚠️ La Freebox n’a plus d'accès à Internet.")
-
-            elif not prev_freebox_inet and freebox_inet_ok:
-                # Retour Internet Freebox
-                log("Connexion Internet Freebox rétablie")
-                send_sms("✅ La connexion Internet Freebox est rétablie.")
-                # Rebasculer la route sur la Freebox
-                set_freebox_primary(gateway)
-
-            prev_freebox_inet = freebox_inet_ok
+        if route != route_prev or first_cycle:
+            if route != route_prev:
+                before = by_name[route_prev]["label"] if route_prev in by_name else (route_prev or "?")
+                log(f"[NET] Trafic via {route_link['label'] if route_link else 'aucun lien'} (avant : {before})")
+            record(ev.ROUTE_CHANGE, "route", route_prev, route, primary=primary["name"])
+        if route_link is None:
+            applied_route = None
+        elif multipath_mode:
+            start_multipath_watch()
+            if applied_route != f"multipath:{route}":
+                set_wlan(route_link)
+                applied_route = f"multipath:{route}"
+            set_multipath(links, members, weights)
+        elif route != applied_route:
+            clear_multipath()
+            set_primary(route_link, links)
+            applied_route = route
 
         # --------------------------------------------------------------------
-        # Gestion des transitions 4G
+        # Transitions de chaque lien, du plus prioritaire au moins prioritaire
         # --------------------------------------------------------------------
-        if prev_4g_inet is None:
-            prev_4g_inet = fourg_inet_ok
-        else:
-            if not prev_4g_inet and fourg_inet_ok and not freebox_inet_ok:
-                # 4G vient de devenir OK alors que Freebox KO -> failover
-                log("Failover 4G actif (bascule sur 4G)")
-                prepare_failover_4g()
-                send_sms("📡 Connexion 4G établie (failover).")
+        just_up = set()
+        for link in links:
+            name, label = link["name"], link["label"]
+            # Lien sans état connu (ajouté à la table, pas de sauvegarde) : pas d'alerte
+            was_up, is_up = prev_up.setdefault(name, status[name]["up"]), status[name]["up"]
+            if was_up and not is_up:
+                log(f"Perte de connexion Internet {label}")
+                lan = status[name]["lan"]
+                extra = {} if lan is None else {"lan": up_down(lan)}
+                record(LOST_EVENTS.get(name, ev.LINK_LOST), name, "up", "down", **extra)
+                if link["sms_lost"]:
+                    queue_sms(link["sms_lost"])
+            elif not was_up and is_up:
+                just_up.add(name)
+                log(f"Connexion Internet {label} rétablie")
+                record(UP_EVENTS.get(name, ev.LINK_UP), name, "down", "up")
+                # Lien de secours qui prend le trafic : SMS de failover
+                text = link["sms_failover"] if route == name != primary["name"] else link["sms_restored"]
+                if text:
+                    queue_sms(text)
+            prev_up[name] = is_up
 
-            elif prev_4g_inet and not fourg_inet_ok:
-                # 4G vient de tomber
-                log("Connexion 4G (wwan0) perdue")
-                send_sms("📵 La connexion 4G (SIM7600E) est perdue.")
+        # --------------------------------------------------------------------
+        # Brownout : lien prioritaire joignable mais dégradé, trafic ailleurs
+        # --------------------------------------------------------------------
+        if brownout and not CURRENT["brownout"]:
+            CURRENT["brownout"] = True
+            top = by_name[skipped[0]]
+            brownout_link = top["name"]
+            reasons = quality.degraded_reasons(stats[top["name"]], cfg) or BROWNOUT[top["name"]].reasons or ["forfait data épuisé"]
+            log(
+                f"[QUALITE] Trafic sur {route_link['label']}, {top['label']} dégradée ({', '.join(reasons)}) : "
+                f"{quality_line(links, stats)}"
+            )
+            record(
+                ev.BROWNOUT_START, "brownout", "off", "on",
+                reasons=reasons, degraded=top["name"], route=route, quality=stats,
+            )
+            if top["name"] in just_up:
+                queue_sms(f"⚠️ {top['label']} rétablie mais dégradée : trafic maintenu sur {route_link['label']}.")
+            else:
+                queue_sms(f"⚠️ {top['label']} dégradée ({', '.join(reasons)}) : bascule sur {route_link['label']}.")
 
-            prev_4g_inet = fourg_inet_ok
+        elif CURRENT["brownout"] and not brownout:
+            CURRENT["brownout"] = False
+            top = by_name.get(brownout_link)
+            if top is None:
+                reason = "config"
+                log("[QUALITE] Fin du brownout : lien retiré de la table")
+            elif not status[top["name"]]["up"]:
+                # Coupure franche : gérée plus haut, le trafic reste sur le secours
+                reason = f"{top['name']}_down"
+                log(f"[QUALITE] Fin du brownout : {top['label']} sans Internet")
+            elif not BROWNOUT[top["name"]].degraded:
+                reason = "recovered"
+                log(f"[QUALITE] Retour sur {top['label']}, qualité rétablie : {quality_line(links, stats)}")
+                queue_sms(f"✅ Qualité {top['label']} rétablie : retour sur {top['label']}.")
+            else:
+                # Lien prioritaire dégradé mais secours KO / pire : mieux vaut lui que rien
+                backup_up = status.get(route_prev, {}).get("up")
+                reason = f"{route_prev}_degraded" if backup_up else f"{route_prev}_down"
+                backup = by_name[route_prev]["label"] if route_prev in by_name else route_prev
+                log(
+                    f"[QUALITE] Retour sur {top['label']} malgré la dégradation ({backup} "
+                    f"{'dégradée' if backup_up else 'KO'}) : {quality_line(links, stats)}"
+                )
+            record(ev.BROWNOUT_END, "brownout", "on", "off", reason=reason, degraded=brownout_link, quality=stats)
+            brownout_link = None
 
         # --------------------------------------------------------------------
         # Gestion "aucune connexion"
         # --------------------------------------------------------------------
-        if prev_any_conn is None:
-            prev_any_conn = any_conn
-        else:
-            if prev_any_conn and not any_conn:
-                # On vient de passer d'un état "quelque chose fonctionne" à "plus rien"
-                log("Aucune connexion disponible (Freebox + 4G KO)")
-                send_sms("❌ Aucune connexion disponible (ni Freebox, ni 4G).")
-            prev_any_conn = any_conn
+        if prev_any_conn and not any_conn:
+            # On vient de passer d'un état "quelque chose fonctionne" à "plus rien"
+            log(f"Aucune connexion disponible ({' + '.join(l['label'] for l in links)} KO)")
+            record(ev.NO_CONNECTION, "any", "up", "down")
+            queue_sms(no_connection_text(links))
+        elif not prev_any_conn and any_conn:
+            # Retour d'au moins une connexion
+            record(ev.CONNECTION_BACK, "any", "down", "up", via=route)
+        prev_any_conn = any_conn
+
+        phase_start = phase_done("transitions", phase_start)
 
         # --------------------------------------------------------------------
-        # Tentative d'activation 4G si Freebox HS et 4G HS
+        # Montage des liens KO (connect_4g.sh, ...) tant qu'aucun lien plus
+        # prioritaire ne répond
         # --------------------------------------------------------------------
-        if not freebox_inet_ok and not fourg_inet_ok:
+        # Modem revenu après un reset alors que sa 4G était active : remontée
+        # immédiate, même si un lien plus prioritaire répond (multipath)
+        if MODEM["lost_at"] is not None and time.time() - MODEM["lost_at"] >= MODEM_RESET_MAX:
+            log(f"[MODEM] Modem toujours incomplet {MODEM_RESET_MAX}s après le reset : SMS et montage 4G repris")
+            MODEM["lost_at"] = None
+            if SMS_RETRY:
+                threading.Thread(target=flush_sms, name="sms-flush", daemon=True).start()
+        redial = None
+        if MODEM["lost_at"] is None and MODEM["redial"]:
+            redial = by_name.get(MODEM["redial"])
+            MODEM["redial"] = None
+        todo = []
+        for link in links:
+            if status[link["name"]]["up"]:
+                break
+            todo.append(link)
+        if redial is not None and not status[redial["name"]]["up"]:
+            last_attempt.pop(redial["name"], None)
+            if redial not in todo:
+                todo.append(redial)
+        for link in todo:
+            name = link["name"]
+            if not link["bring_up"]:
+                continue
+            if MODEM["lost_at"] is not None and is_modem_link(link, cfg):
+                log(f"[{name.upper()}] Modem en cours de reset : montage à son retour.")
+                continue
+            tag = name.upper()
             now = time.time()
-            if now - last_4g_attempt >= MIN_4G_RETRY_DELAY:
-                log("[4G] Tentative d'activation de la connexion 4G (Freebox KO, 4G KO).")
-                last_4g_attempt = now
-                # Lance le script 4G
-                ok_4g = try_start_4g()
-                if not ok_4g:
-                    log("[4G] Nouvelle tentative échouée, on réessaiera plus tard.")
+            if now - last_attempt.get(name, 0.0) >= min_retry_delay:
+                reason = "modem réinitialisé" if link is redial else ", ".join(
+                    f"{l['label']} KO" for l in links[:links.index(link) + 1]
+                )
+                log(f"[{tag}] Tentative d'activation du lien {link['label']} ({reason}).")
+                last_attempt[name] = now
+                record(ev.LTE_ATTEMPT, name)
+                with TIMINGS.span(f"bring_up:{name}"):
+                    ok = bring_up(link)
+                if not ok:
+                    log(f"[{tag}] Nouvelle tentative échouée, on réessaiera plus tard.")
+                    record(ev.LTE_ATTEMPT_FAILED, name, elapsed=round(time.time() - now, 1))
             else:
-                remaining = int(MIN_4G_RETRY_DELAY - (now - last_4g_attempt))
+                remaining = int(min_retry_delay - (now - last_attempt[name]))
                 log(
-                    f"[4G] Dernier essai trop récent, on attend encore {remaining}s avant de relancer."
+                    f"[{tag}] Dernier essai trop récent, on attend encore {remaining}s avant de relancer."
                 )
 
+        phase_start = phase_done("bring_up", phase_start)
+
+        # Durée totale d'un reset modem : disparition USB -> 4G de nouveau OK
+        if MODEM["recovering"] and status.get(MODEM["recovering"][0], {}).get("up"):
+            name, reset_at = MODEM["recovering"]
+            MODEM["recovering"] = None
+            TIMINGS.record("modem_recovery", time.time() - reset_at)
+            log(f"[MODEM] {by_name[name]['label']} rétablie {time.time() - reset_at:.0f}s après le reset du modem")
+
+        # --------------------------------------------------------------------
+        # Premier cycle : temps boot -> décision, puis tâches différées
+        # --------------------------------------------------------------------
+        if first_cycle:
+            first_cycle = False
+            decision_s = time.monotonic() - started
+            uptime = system_uptime()
+            log(
+                f"[BOOT] Décision de routage ({route}) {decision_s:.1f}s après le démarrage du monitor"
+                + (f", {uptime:.0f}s après le boot du Pi" if uptime is not None else "")
+            )
+            record(
+                ev.BOOT_DECISION, "monitor", route=route,
+                start_to_decision_s=round(decision_s, 2),
+                boot_to_decision_s=None if uptime is None else round(uptime, 1),
+            )
+            # Rotation interrompue (coupure pendant la compression) : on la termine
+            try:
+                logrotate.recover(LOG_FILE, cfg["log_compression"])
+            except Exception as e:
+                log(f"[LOG] Erreur reprise rotation: {e}")
+
+        state = {"links": {n: st["up"] for n, st in status.items()}, "any": any_conn, "route": route}
+        if state != saved_state or time.time() - last_state_save >= STATE_HEARTBEAT:
+            last_state_save = time.time()
+            saved_state = state
+            save_state(dict(
+                state, last_seen=round(last_state_save),
+                last_seen_text=datetime.fromtimestamp(last_state_save).strftime("%d/%m/%Y %H:%M:%S"),
+            ))
+
+        rotate_logs(cfg)
+        try:
+            SLA.update()
+        except Exception as e:
+            log(f"[SLA] Erreur mise à jour: {e}")
+        phase_done("housekeeping", phase_start)
+        TIMINGS.record("cycle", time.perf_counter() - cycle_start)
+        publish()
+
         # --------------------------------------------------------------------
-        # Pause avant le prochain cycle
+        # Pause avant le prochain cycle (interrompue si la config change)
         # --------------------------------------------------------------------
-        time.sleep(CHECK_INTERVAL)
+        WAKE_UP.wait(check_interval)
+        WAKE_UP.clear()
 
 
 if __name__ == "__main__":
@@ -20,10 +20,11 @@ if __name__ == "__main__":
     # Port du dashboard (peut être surchargé par variable d'environnement)
     port = int(os.environ.get("DASH_PORT", config.get("port", 5123)))
 
-    # Lancement serveur Flask
+    # Lancement serveur Flask (threadé : long-poll, SSE et jobs ne bloquent pas l'UI)
     app.run(
         host="0.0.0.0",
         port=port,
         debug=False,
-        use_reloader=False
+        use_reloader=False,
+        threaded=True
     )
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# ============================================================================
+#  Failover-Pi : mode combiné (Pi Zero, 512 Mo)
+#
+#  Un seul interpréteur au lieu de trois :
+#    - boucle du monitor (monitor_failover.main, thread principal)
+#    - envoi SMS / modem (send_sms importé, plus de python3 par alerte)
+#    - dashboard Flask, importé seulement à la première requête HTTP
+#
+#  Service : failover-pi.service (remplace failover-monitor + failover-dashboard)
+#
+#  Comparaison mémoire avec le déploiement séparé :
+#    python3 /home/xavier/run_failover_pi.py --compare-rss
+# ============================================================================
+import os
+import sys
+import time
+import threading
+import subprocess
+
+# Avant tout import : monitor et dashboard envoient les SMS dans ce processus
+os.environ["FAILOVERPI_COMBINED"] = "1"
+
+import monitor_failover as monitor  # noqa: E402
+
+HOME = os.path.dirname(os.path.abspath(__file__))
+
+# Mesure dans un interpréteur neuf (déploiement séparé), imprime VmRSS en Ko
+RSS_PROBE = """
+import os
+{imports}
+for line in open("/proc/self/status"):
+    if line.startswith("VmRSS:"):
+        print(line.split()[1])
+os._exit(0)
+"""
+
+# Ce que charge chaque processus du déploiement séparé
+SPLIT_PROCESSES = (
+    ("failover-monitor", "import monitor_failover"),
+    ("failover-dashboard", "import dashboard\nimport werkzeug.serving"),
+    ("send_sms.py (par SMS)", "import send_sms"),
+)
+
+
+# ----------------------------------------------------------------------------
+# Mémoire
+# ----------------------------------------------------------------------------
+def rss_kb(pid="self"):
+    """Mémoire résidente (VmRSS) en Ko, None si /proc illisible."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except Exception:
+        pass
+    return None
+
+
+def fmt_mb(kb) -> str:
+    return "?" if kb is None else f"{kb / 1024:.1f} Mo"
+
+
+# ----------------------------------------------------------------------------
+# Dashboard chargé à la demande
+# ----------------------------------------------------------------------------
+class LazyDashboard:
+    """
+    Application WSGI servie dès le démarrage ; Flask, Jinja et les routes du
+    dashboard ne sont importés qu'à la première requête.
+    """
+
+    def __init__(self):
+        self._app = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        with self._lock:
+            if self._app is None:
+                before = rss_kb()
+                t0 = time.monotonic()
+                from dashboard import app
+                self._app = app
+                after = rss_kb()
+                monitor.log(
+                    f"[MEM] Dashboard chargé (1re requête) en {time.monotonic() - t0:.1f}s : "
+                    f"RSS {fmt_mb(before)} -> {fmt_mb(after)}"
+                )
+        return self._app
+
+    def __call__(self, environ, start_response):
+        return (self._app or self.load())(environ, start_response)
+
+
+def start_dashboard(port: int):
+    """Serveur HTTP threadé (comme run_dashboard.py) dans un thread de fond."""
+    from werkzeug.serving import make_server
+
+    server = make_server("0.0.0.0", port, LazyDashboard(), threaded=True)
+    threading.Thread(target=server.serve_forever, name="dashboard-http", daemon=True).start()
+
+
+# ----------------------------------------------------------------------------
+# --compare-rss
+# ----------------------------------------------------------------------------
+def compare_rss():
+    """
+    RSS à froid de chaque processus du déploiement séparé, mesurée dans des
+    interpréteurs neufs, contre ce processus une fois tout chargé.
+    """
+    env = dict(os.environ)
+    env.pop("FAILOVERPI_COMBINED", None)
+
+    split = []
+    for name, imports in SPLIT_PROCESSES:
+        try:
+            res = subprocess.run(
+                [sys.executable, "-c", RSS_PROBE.format(imports=imports)],
+                cwd=HOME, env=env, capture_output=True, text=True, timeout=120,
+            )
+            kb = int(res.stdout.split()[-1]) if res.returncode == 0 and res.stdout.split() else None
+        except Exception:
+            kb = None
+        split.append((name, kb))
+
+    import dashboard  # noqa: F401
+    import werkzeug.serving  # noqa: F401
+    try:
+        import send_sms  # noqa: F401
+    except ImportError:
+        pass
+    combined = rss_kb()
+
+    resident = sum(kb or 0 for name, kb in split[:2])
+    peak = resident + (split[2][1] or 0)
+    print("Déploiement séparé (RSS à froid) :")
+    for name, kb in split:
+        print(f"  {name:<24} {fmt_mb(kb)}")
+    print(f"  {'total permanent':<24} {fmt_mb(resident)} ({fmt_mb(peak)} pendant un SMS)")
+    print(f"Mode combiné, tout chargé : {fmt_mb(combined)}")
+    if combined is not None and resident:
+        print(f"Économie : {fmt_mb(resident - combined)} ({fmt_mb(peak - combined)} pendant un SMS)")
+
+
+# ----------------------------------------------------------------------------
+# Main
+# ----------------------------------------------------------------------------
+def main():
+    if "--compare-rss" in sys.argv[1:]:
+        compare_rss()
+        return
+
+    cfg = monitor.CONFIG.get()
+    port = int(os.environ.get("DASH_PORT", cfg.get("port", 5123)))
+    start_dashboard(port)
+    monitor.log(
+        f"[MEM] Mode combiné (monitor + SMS + dashboard sur :{port}) : RSS {fmt_mb(rss_kb())}, "
+        f"dashboard chargé à la première requête"
+    )
+
+    # Boucle du monitor dans le thread principal (signaux : SIGUSR1)
+    monitor.main()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,10 +2,12 @@
 import serial
 import time
 import sys
-import json
 import os
+import threading
 import unicodedata
 
+from failoverpi.config import load_config as _load_shared_config, get_recipients
+
 CONFIG_FILE = "/home/xavier/config.json"
 
 
@@ -14,10 +16,8 @@ CONFIG_FILE = "/home/xavier/config.json"
 # ============================================================
 def load_config():
     if not os.path.exists(CONFIG_FILE):
-        print("Config manquante :", CONFIG_FILE)
-        sys.exit(1)
-    with open(CONFIG_FILE, "r") as f:
-        return json.load(f)
+        fatal(f"Config manquante : {CONFIG_FILE}")
+    return _load_shared_config(CONFIG_FILE)
 
 
 # ============================================================
@@ -83,139 +83,159 @@ def send_at(ser, cmd, expected="OK", timeout=5):
     return (expected in resp), resp
 
 
-def fatal(msg):
-    print("ERREUR:", msg)
-    sys.exit(1)
+class SmsError(Exception):
+    """Échec d'envoi (message affiché tel quel, préfixé de "ERREUR:" en ligne de commande)."""
 
 
-# ============================================================
-#  MAIN
-# ============================================================
-if __name__ == "__main__":
+def fatal(msg):
+    raise SmsError(msg)
 
-    if len(sys.argv) < 2:
-        fatal("Usage: python3 send_sms.py 'message'")
 
-    raw_message = sys.argv[1]
+# Un seul dialogue AT à la fois sur le port série : utile quand monitor et
+# dashboard envoient depuis le même processus (run_failover_pi.py).
+MODEM_LOCK = threading.Lock()
 
-    config = load_config()
-    serial_port = config.get("serial_port", "/dev/ttyUSB3")
-    pin = config.get("sim_pin", "")
 
-    # Multi-numéros : alert_numbers[] prioritaire, sinon sms_phone
-    alert_numbers = config.get("alert_numbers", [])
-    if isinstance(alert_numbers, str):
-        alert_numbers = [alert_numbers]
-    alert_numbers = [n.strip() for n in alert_numbers if n and n.strip()]
+# ============================================================
+#  ENVOI
+# ============================================================
+def send(raw_message: str, config: dict | None = None, say=print):
+    """
+    Envoie raw_message à tous les destinataires de config.json.
+    Lève SmsError en cas d'échec ; say() reçoit le détail du dialogue modem.
+    """
+    config = config or load_config()
+    serial_port = config["serial_port"]
+    pin = config["sim_pin"]
 
-    if alert_numbers:
-        numbers = alert_numbers
-    else:
-        numbers = [config.get("sms_phone", "+33XXXXXXXXX").strip()]
+    # Multi-numéros : alert_numbers[], puis sms_recipients[], sinon sms_phone
+    numbers = get_recipients(config)
+    if not numbers:
+        fatal("Aucun numéro destinataire défini dans config.json")
 
     # Normalisation du message pour le modem
     norm_message = normalize_message(raw_message)
 
-    print("Numéros cibles :", ", ".join(numbers))
-    print("Port série modem :", serial_port)
-    print("Message brut   :", raw_message)
-    print("Message envoyé :", norm_message)
+    say("Numéros cibles :", ", ".join(numbers))
+    say("Port série modem :", serial_port)
+    say("Message brut   :", raw_message)
+    say("Message envoyé :", norm_message)
 
-    try:
-        ser = serial.Serial(
-            port=serial_port,
-            baudrate=115200,
-            timeout=5
-        )
-    except Exception as e:
-        fatal(f"Impossible d'ouvrir {serial_port} : {e}")
+    with MODEM_LOCK:
+        try:
+            ser = serial.Serial(
+                port=serial_port,
+                baudrate=115200,
+                timeout=5
+            )
+        except Exception as e:
+            fatal(f"Impossible d'ouvrir {serial_port} : {e}")
 
-    try:
-        print("Initialisation modem…")
-        print("Reset état modem (sortir d'un éventuel mode SMS)...")
+        try:
+            _send_all(ser, numbers, norm_message, pin, say)
+        finally:
+            try:
+                ser.close()
+            except Exception:
+                pass
 
-        # Petit reset de l'état : simple AT
-        ok, resp = send_at(ser, "AT", expected="OK", timeout=5)
-        print("Réponse AT :", resp.strip())
-        if not ok:
-            fatal("Modem ne répond pas correctement à 'AT'.")
-        else:
-            print("Modem OK après reset.")
-
-        # Vérifier l'état du PIN
-        ok, resp = send_at(ser, "AT+CPIN?", expected="OK", timeout=5)
-        print("Réponse AT+CPIN? :", resp.strip())
-
-        if "READY" in resp:
-            print("SIM déjà prête (READY). Aucun PIN à envoyer.")
-        elif "SIM PIN" in resp:
-            if not pin:
-                fatal("La SIM demande un PIN, mais aucun 'sim_pin' défini dans config.json")
-            print(f"Envoi du PIN SIM '{pin}' ...")
-            ok, resp_pin = send_at(ser, f'AT+CPIN="{pin}"', expected="OK", timeout=10)
-            print('Réponse AT+CPIN="xxxx" :', resp_pin.strip())
-            if not ok:
-                fatal("PIN incorrect ou refusé : " + resp_pin)
-            time.sleep(3)
-        else:
-            print("État SIM non reconnu, on poursuit quand même…")
 
-        # Mode texte + jeu de caractères SMS basique
-        ok, resp = send_at(ser, "AT+CMGF=1", expected="OK", timeout=5)
-        print("Réponse AT+CMGF=1 :", resp.strip())
-        if not ok:
-            fatal("Impossible de passer en mode texte SMS.")
+def _send_all(ser, numbers, norm_message, pin, say):
+    say("Initialisation modem…")
+    say("Reset état modem (sortir d'un éventuel mode SMS)...")
 
-        ok, resp = send_at(ser, 'AT+CSCS="GSM"', expected="OK", timeout=5)
-        print('Réponse AT+CSCS="GSM" :', resp.strip())
+    # Petit reset de l'état : simple AT
+    ok, resp = send_at(ser, "AT", expected="OK", timeout=5)
+    say("Réponse AT :", resp.strip())
+    if not ok:
+        fatal("Modem ne répond pas correctement à 'AT'.")
+    else:
+        say("Modem OK après reset.")
+
+    # Vérifier l'état du PIN
+    ok, resp = send_at(ser, "AT+CPIN?", expected="OK", timeout=5)
+    say("Réponse AT+CPIN? :", resp.strip())
+
+    if "READY" in resp:
+        say("SIM déjà prête (READY). Aucun PIN à envoyer.")
+    elif "SIM PIN" in resp:
+        if not pin:
+            fatal("La SIM demande un PIN, mais aucun 'sim_pin' défini dans config.json")
+        say(f"Envoi du PIN SIM '{pin}' ...")
+        ok, resp_pin = send_at(ser, f'AT+CPIN="{pin}"', expected="OK", timeout=10)
+        say('Réponse AT+CPIN="xxxx" :', resp_pin.strip())
         if not ok:
-            print("Avertissement : Impossible de fixer CSCS=\"GSM\" (on continue quand même).")
+            fatal("PIN incorrect ou refusé : " + resp_pin)
+        time.sleep(3)
+    else:
+        say("État SIM non reconnu, on poursuit quand même…")
 
-        # Envoi du SMS à chaque numéro
-        for phone in numbers:
-            print(f"Envoi SMS vers {phone} ...")
+    # Mode texte + jeu de caractères SMS basique
+    ok, resp = send_at(ser, "AT+CMGF=1", expected="OK", timeout=5)
+    say("Réponse AT+CMGF=1 :", resp.strip())
+    if not ok:
+        fatal("Impossible de passer en mode texte SMS.")
 
-            ok, resp = send_at(ser, f'AT+CMGS="{phone}"', expected=">", timeout=5)
-            print(f'Response AT+CMGS="{phone}" :', resp.strip())
-            if not ok:
-                fatal("Erreur entrée mode SMS pour " + phone + " : " + resp)
+    ok, resp = send_at(ser, 'AT+CSCS="GSM"', expected="OK", timeout=5)
+    say('Réponse AT+CSCS="GSM" :', resp.strip())
+    if not ok:
+        say("Avertissement : Impossible de fixer CSCS=\"GSM\" (on continue quand même).")
 
-            # Envoi du message + CTRL+Z
-            ser.write((norm_message + chr(26)).encode("ascii", errors="ignore"))
-            ser.flush()
+    # Envoi du SMS à chaque numéro
+    for phone in numbers:
+        say(f"Envoi SMS vers {phone} ...")
 
-            # Lecture robuste de la réponse (évite les crash OSError)
-            chunks = []
-            start = time.time()
-            try:
-                while True:
-                    try:
-                        chunk = ser.read(256).decode(errors="ignore")
-                    except OSError as e:
-                        print("Erreur lors de la lecture de la réponse (probable reset USB) :", e)
-                        break
+        ok, resp = send_at(ser, f'AT+CMGS="{phone}"', expected=">", timeout=5)
+        say(f'Response AT+CMGS="{phone}" :', resp.strip())
+        if not ok:
+            fatal("Erreur entrée mode SMS pour " + phone + " : " + resp)
+
+        # Envoi du message + CTRL+Z
+        ser.write((norm_message + chr(26)).encode("ascii", errors="ignore"))
+        ser.flush()
 
-                    if chunk:
-                        chunks.append(chunk)
-                        # On arrête si OK ou erreur CMS détectée
-                        if "OK" in chunk or "+CMS ERROR" in chunk:
-                            break
+        # Lecture robuste de la réponse (évite les crash OSError)
+        chunks = []
+        start = time.time()
+        try:
+            while True:
+                try:
+                    chunk = ser.read(256).decode(errors="ignore")
+                except OSError as e:
+                    say("Erreur lors de la lecture de la réponse (probable reset USB) :", e)
+                    break
 
-                    if time.time() - start > 20:
+                if chunk:
+                    chunks.append(chunk)
+                    # On arrête si OK ou erreur CMS détectée
+                    if "OK" in chunk or "+CMS ERROR" in chunk:
                         break
-            except Exception as e:
-                print("Exception pendant la lecture de la réponse :", e)
 
-            resp_send = "".join(chunks)
-            print("Réponse envoi :", resp_send.strip())
+                if time.time() - start > 20:
+                    break
+        except Exception as e:
+            say("Exception pendant la lecture de la réponse :", e)
+
+        resp_send = "".join(chunks)
+        say("Réponse envoi :", resp_send.strip())
 
-            if "+CMS ERROR" in resp_send:
-                fatal(f"Échec envoi SMS pour {phone}: {resp_send}")
-            else:
-                print(f"SMS envoyé (ou en cours) vers {phone} : {norm_message}")
+        if "+CMS ERROR" in resp_send:
+            fatal(f"Échec envoi SMS pour {phone}: {resp_send}")
+        else:
+            say(f"SMS envoyé (ou en cours) vers {phone} : {norm_message}")
 
-    finally:
-        try:
-            ser.close()
-        except Exception:
-            pass
+
+# ============================================================
+#  MAIN
+# ============================================================
+if __name__ == "__main__":
+
+    if len(sys.argv) < 2:
+        print("ERREUR:", "Usage: python3 send_sms.py 'message'")
+        sys.exit(1)
+
+    try:
+        send(sys.argv[1])
+    except SmsError as e:
+        print("ERREUR:", e)
+        sys.exit(1)
@@ -47,8 +47,12 @@ if [ -d "$REPO_DIR/home/xavier" ]; then
   rm -rf "$HOME_DIR/dashboard"
   cp -r "$REPO_DIR/home/xavier/dashboard" "$HOME_DIR/"
 
+  # Paquet commun (config partagée monitor / SMS / dashboard)
+  rm -rf "$HOME_DIR/failoverpi"
+  cp -r "$REPO_DIR/home/xavier/failoverpi" "$HOME_DIR/"
+
   # Copie des fichiers racine
-  for f in config.json connect_4g.sh monitor_failover.py run_dashboard.py send_sms.py status_history.json; do
+  for f in config.json connect_4g.sh monitor_failover.py run_dashboard.py run_failover_pi.py send_sms.py status_history.json; do
     SRC="$REPO_DIR/home/xavier/$f"
     DEST="$HOME_DIR/$f"
     [ ! -f "$SRC" ] && continue
@@ -71,10 +75,11 @@ fi
 # Fichiers système requis
 # ---------------------------------------------------------
 touch "$HOME_DIR/monitor.log"
+touch "$HOME_DIR/events.jsonl"
 
 # status_history.json si vide
 if [ ! -s "$HOME_DIR/status_history.json" ]; then
-  echo '{"times":[],"states":[]}' > "$HOME_DIR/status_history.json"
+  echo '{"times":[],"states":[],"epochs":[]}' > "$HOME_DIR/status_history.json"
 fi
 
 # Base utilisateurs si absente
@@ -87,7 +92,7 @@ fi
 # ---------------------------------------------------------
 chown -R "$TARGET_USER:$TARGET_USER" "$HOME_DIR"
 
-chmod +x "$HOME_DIR"/{connect_4g.sh,monitor_failover.py,run_dashboard.py,send_sms.py}
+chmod +x "$HOME_DIR"/{connect_4g.sh,monitor_failover.py,run_dashboard.py,run_failover_pi.py,send_sms.py}
 
 # ---------------------------------------------------------
 # Installation des services systemd
@@ -96,6 +101,8 @@ echo "-> Installation services systemd…"
 
 cp "$REPO_DIR/etc/systemd/system/failover-dashboard.service" "$SYSTEMD_DIR/"
 cp "$REPO_DIR/etc/systemd/system/failover-monitor.service" "$SYSTEMD_DIR/"
+# Mode combiné (Pi Zero) : installé, non activé
+cp "$REPO_DIR/etc/systemd/system/failover-pi.service" "$SYSTEMD_DIR/"
 
 # ---------------------------------------------------------
 # Dépendances
@@ -119,7 +126,7 @@ import secrets, base64
 print(base64.urlsafe_b64encode(secrets.token_bytes(32)).decode())
 EOF
 )
-  sed -i "s/your_generated_key/$NEW_KEY/" "$SYSTEMD_DIR/failover-dashboard.service"
+  sed -i "s/your_generated_key/$NEW_KEY/" "$SYSTEMD_DIR/failover-dashboard.service" "$SYSTEMD_DIR/failover-pi.service"
   echo "Nouvelle secret-key générée."
 fi
 
@@ -135,5 +142,8 @@ echo "=== Installation terminée ==="
 echo "Lance les services :"
 echo "  sudo systemctl start failover-dashboard"
 echo "  sudo systemctl start failover-monitor"
+echo "Pi Zero (un seul processus, moins de RAM) :"
+echo "  sudo systemctl disable --now failover-monitor failover-dashboard"
+echo "  sudo systemctl enable --now failover-pi"
 echo
 echo "Dashboard → http://<ip-du-pi>:5123/"